@@ -0,0 +1,95 @@
+# The sources of the dataset, from a subset of a (large) BibTeX file
+# instead of parsing the whole shared bibliography, the entries are located with a
+# regex and only the referenced ones (plus what they crossref) are parsed. The
+# resulting sources are cached, keyed on the content of the .bib files and the keys.
+# Sources are passed around as (genre, ID, fields) records, since pycldf's Source
+# objects cannot be unpickled.
+import hashlib
+import logging
+import pickle
+import re
+from pathlib import Path
+
+from stage_cache import hash_file
+
+log = logging.getLogger(__name__)
+
+BIB_CACHE_DIR = Path(".cache") / "bibliography"
+
+ENTRY_START = re.compile(r"^@\s*(\w+)\s*[{(]\s*([^,\s]*)", re.MULTILINE)
+CROSSREF = re.compile(r"crossref\s*=\s*[{\"]\s*([^}\"\s]+)", re.IGNORECASE)
+# not entries; kept in every subset
+SPECIAL_ENTRIES = ["string", "preamble", "comment"]
+
+
+def split_entries(text):
+    # the text of every entry by key, and the text of @string etc.
+    entries = {}
+    special = []
+    starts = list(ENTRY_START.finditer(text))
+    for match, end in zip(starts, [x.start() for x in starts[1:]] + [len(text)]):
+        chunk = text[match.start() : end]
+        if match.group(1).lower() in SPECIAL_ENTRIES:
+            special.append(chunk)
+        else:
+            entries.setdefault(match.group(2), chunk)  # the first of duplicates counts
+    return entries, special
+
+
+def bib_subset(text, keys=None):
+    # BibTeX with only the entries in keys (all if None), in their original order
+    if keys is None:
+        return text
+    entries, special = split_entries(text)
+    todo = [x for x in keys if x in entries]
+    found = set(todo)
+    while todo:
+        for ref in CROSSREF.findall(entries[todo.pop()]):
+            if ref in entries and ref not in found:
+                found.add(ref)
+                todo.append(ref)
+    return "".join(special + [chunk for key, chunk in entries.items() if key in found])
+
+
+def parse_sources(filename, keys=None):
+    import pybtex.database
+    from pycldf.sources import Source
+
+    if keys is not None:
+        keys = set(keys)
+    with open(filename, "r", encoding="utf-8") as f:
+        text = bib_subset(f.read(), keys)
+    bib = pybtex.database.parse_string(text, bib_format="bibtex")
+    res = []
+    for k, e in bib.entries.items():
+        if keys is None or k in keys:
+            source = Source.from_entry(k, e)
+            res.append((source.genre, source.id, dict(source)))
+    return res
+
+
+def make_sources(records):
+    from pycldf.sources import Source
+
+    return [Source(genre, id_, **fields) for genre, id_, fields in records]
+
+
+def load_sources(bibs, cache=True):
+    # bibs: (filename, keys or None for all entries) tuples; returns source records
+    h = hashlib.sha256()
+    for filename, keys in bibs:
+        keys = None if keys is None else sorted(keys)
+        h.update(f"{filename}:{hash_file(filename)}:{keys}\n".encode("utf-8"))
+    cache_file = BIB_CACHE_DIR / f"{h.hexdigest()}.pickle"
+    if cache and cache_file.is_file():
+        with open(cache_file, "rb") as f:
+            return pickle.load(f)
+    sources = []
+    for filename, keys in bibs:
+        sources.extend(parse_sources(filename, keys))
+    log.info(f"Parsed {len(sources)} sources")
+    if cache:
+        BIB_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(cache_file, "wb") as f:
+            pickle.dump(sources, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return sources
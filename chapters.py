@@ -0,0 +1,232 @@
+# Rendering the grammar chapters in raw/docs against the written dataset
+# the chapters cite data with cldfviz-style links, e.g.
+#   [Morpheme u1](MorphsetTable?#cldf:u1)
+#   [Example](ExampleTable?example_no=16#cldf:convrisamaj-04)
+#   [Morph](MorphTable?ids=pljne1,ipert#cldf:__all__)
+# Every link is replaced by the cited rows, looked up in one index of the dataset
+# (component -> ID -> row). The rendered chapters are cached in .cache/chapters, keyed
+# on the chapter text and the hashes of the rows it cites, so changing a row only
+# re-renders the chapters citing it; the others are copied from the cache.
+import hashlib
+import json
+import logging
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import parse_qsl
+
+import pandas as pd
+
+from stage_cache import hash_file
+
+log = logging.getLogger(__name__)
+
+DOCS_DIR = Path("raw") / "docs"
+CHAPTER_CACHE_DIR = Path(".cache") / "chapters"
+# the tables of the cited components
+COMPONENTS = {
+    "ExampleTable": "examples",
+    "FormTable": "forms",
+    "LexemeTable": "lexemes",
+    "MediaTable": "media",
+    "MorphTable": "morphs",
+    "MorphsetTable": "morphemes",
+    "StemTable": "stems",
+    "TextTable": "texts",
+    "WordformTable": "wordforms",
+}
+ALL = "__all__"
+REFERENCE = re.compile(
+    r"\[(?P<label>[^\]]*)\]\((?P<component>\w+Table)\?(?P<args>[^#)]*)#cldf:(?P<id>[^)]+)\)"
+)
+
+
+def reference_ids(match):
+    # the cited IDs of a link; __all__ cites the rows in the ids argument
+    if match["id"] != ALL:
+        return [match["id"]]
+    ids = dict(parse_qsl(match["args"])).get("ids", "")
+    return [x for x in ids.split(",") if x]
+
+
+def citations(text):
+    # (component, ID) of all rows cited in a chapter
+    return sorted(
+        {
+            (match["component"], id)
+            for match in REFERENCE.finditer(text)
+            for id in reference_ids(match)
+        }
+    )
+
+
+def row_hash(row):
+    return hashlib.sha256(
+        json.dumps(row, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+class ReferenceIndex:
+    # the rows of the dataset by component and ID; tables are read when first cited
+    def __init__(self, cldf_dir):
+        self.cldf_dir = Path(cldf_dir)
+        self.tables = {}
+
+    def table(self, component):
+        if component not in self.tables:
+            path = self.cldf_dir / f"{COMPONENTS.get(component, component)}.csv"
+            if not path.is_file():
+                self.tables[component] = {}
+            else:
+                df = pd.read_csv(path, dtype=str, keep_default_na=False)
+                self.tables[component] = {row["ID"]: row for row in df.to_dict("records")}
+        return self.tables[component]
+
+    def get(self, component, id):
+        return self.table(component).get(id)
+
+    def rows(self, cited):
+        # (component, ID) -> row, or None for unknown IDs
+        return {(component, id): self.get(component, id) for component, id in cited}
+
+
+def render_morph(row, args):
+    return f"*{row['Name']}*"
+
+
+def render_text(row, args):
+    return row["Name"]
+
+
+def interlinear(row):
+    words = row["Analyzed_Word"].split("\t")
+    glosses = row["Gloss"].split("\t")
+    widths = [max(len(w), len(g)) for w, g in zip(words, glosses)]
+    lines = [
+        row["Primary_Text"],
+        "  ".join(w.ljust(width) for w, width in zip(words, widths)).rstrip(),
+        "  ".join(g.ljust(width) for g, width in zip(glosses, widths)).rstrip(),
+        f"‘{row['Translated_Text']}’ ({row['ID']})",
+    ]
+    return lines
+
+
+def render_example(rows, args):
+    # one numbered example, or a list of subexamples
+    number = args.get("example_no", "")
+    res = [f"({number})" if number else ""]
+    for idx, row in enumerate(rows):
+        lines = interlinear(row)
+        if len(rows) > 1:
+            lines[0] = f"{chr(ord('a') + idx)}. {lines[0]}"
+        res.extend(f"    {line}" for line in lines)
+        res.append("")
+    return "\n" + "\n".join(res)
+
+
+RENDERERS = {
+    "MorphTable": render_morph,
+    "MorphsetTable": render_morph,
+    "StemTable": render_morph,
+    "LexemeTable": render_morph,
+    "WordformTable": render_morph,
+    "FormTable": render_morph,
+    "TextTable": render_text,
+}
+
+
+def render_chapter(text, rows):
+    # text: the chapter; rows: (component, ID) -> row of every cited row
+    # returns the rendered chapter and the links that could not be resolved
+    missing = []
+
+    def replace(match):
+        component = match["component"]
+        args = dict(parse_qsl(match["args"]))
+        cited = [rows.get((component, id)) for id in reference_ids(match)]
+        if not cited or None in cited:
+            missing.append(match[0])
+            return match["label"]
+        if component == "ExampleTable":
+            return render_example(cited, args)
+        render = RENDERERS.get(component)
+        if render is None:
+            missing.append(match[0])
+            return match["label"]
+        return ", ".join(render(row, args) for row in cited)
+
+    return REFERENCE.sub(replace, text), missing
+
+
+def render_job(job):
+    _, text, rows = job
+    return render_chapter(text, rows)
+
+
+def chapter_key(text, rows):
+    # the chapter text, the cited rows and this renderer
+    h = hashlib.sha256()
+    h.update(hash_file(__file__).encode("utf-8"))
+    h.update(text.encode("utf-8"))
+    for (component, id), row in sorted(rows.items()):
+        h.update(f"\n{component}:{id}:{row_hash(row) if row else 'missing'}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def render_chapters(cldf_dir, out_dir, docs_dir=DOCS_DIR, processes=1, cache=True):
+    # renders raw/docs/*.txt to out_dir/*.md, changed chapters in processes
+    # returns the names of the re-rendered chapters
+    index = ReferenceIndex(cldf_dir)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    jobs, keys = [], {}
+    chapters = sorted(Path(docs_dir).glob("*.txt"))
+    for path in chapters:
+        text = path.read_text(encoding="utf-8")
+        rows = index.rows(citations(text))
+        keys[path.stem] = chapter_key(text, rows)
+        if cache and (CHAPTER_CACHE_DIR / f"{keys[path.stem]}.md").is_file():
+            continue
+        jobs.append((path.stem, text, {k: v for k, v in rows.items() if v}))
+
+    if processes > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(render_job, jobs))
+    else:
+        results = [render_job(job) for job in jobs]
+    CHAPTER_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    for (name, _, _), (rendered, missing) in zip(jobs, results):
+        for link in missing:
+            log.warning(f"Unresolved reference in {name}: {link}")
+        tmp = CHAPTER_CACHE_DIR / f"{keys[name]}.md.tmp"
+        tmp.write_text(rendered, encoding="utf-8")
+        tmp.replace(CHAPTER_CACHE_DIR / f"{keys[name]}.md")
+
+    for name, key in keys.items():
+        (out_dir / f"{name}.md").write_text(
+            (CHAPTER_CACHE_DIR / f"{key}.md").read_text(encoding="utf-8"),
+            encoding="utf-8",
+        )
+    # chapters removed from raw/docs
+    for path in out_dir.glob("*.md"):
+        if path.stem not in keys:
+            path.unlink()
+    log.info(
+        f"Rendered {len(jobs)} of {len(keys)} chapters ({len(keys) - len(jobs)} unchanged)"
+    )
+    return [job[0] for job in jobs]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("cldf_dir", nargs="?", default="cldf")
+    parser.add_argument("out_dir", nargs="?", default="cldf_docs")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+    render_chapters(
+        args.cldf_dir, args.out_dir, processes=args.processes, cache=not args.no_cache
+    )
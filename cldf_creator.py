@@ -1,45 +1,42 @@
 # Prelude
 ## Import
-import argparse
+# only what defining the stages needs is imported here; pandas and the modules used by
+# single stages (bibliography, chapters, writing, ...) are imported in the functions
+# using them, so that e.g. invoke can start up quickly
 import logging
+import os
 import re
 import sys
-import time
+from functools import lru_cache
 from itertools import product
 from pathlib import Path
 from types import SimpleNamespace
 
-import pandas as pd
-import pybtex
-import yaml
-from cffconvert.cli.create_citation import create_citation
-from cffconvert.cli.validate_or_write_output import validate_or_write_output
-from cldf_ldd import add_columns, add_keys
-from cldf_ldd.components import tables as ldd_tables
-from cldfbench import CLDFSpec
-from cldfbench.cldf import CLDFWriter
 from clldutils import jsonlib
 from clldutils.loglib import get_colorlog
-from humidifier import get_values, humidify
-from pycldf.dataset import MD_SUFFIX
-from pycldf.sources import Source
-from pycldf.util import pkg_path
-from morphinder import identify_complex_stem_position
-from pylingdocs.cldf import tables as pld_tables
-from pylingdocs.preprocessing import preprocess_cldfviz
-from segments import Profile, Tokenizer
-from uniparser_yawarana import YawaranaAnalyzer
-from writio import load
+from humidifier import get_values
+from ids import humidify, humidify_series
+from lexicon import LexiconIndex, MorphIndex, filter_id, is_detrz
+from media_index import media_index
+from orthography import CompiledTokenizer
+from pipeline import Pipeline
+from profiling import count
+from records import Wordform, WordformPart, to_frame
+from stage_cache import CACHE_DIR, StageCache
 from yawarana_helpers import (
     find_detransitivizer,
     glossify,
     strip_form,
     trim_dic_suff,
 )
-from pylacoan.helpers import get_pos as _get_pos
-from uniparser_yawarana import pos_list
 
+
+# the part of speech of a gramm value, looked up for every token
+@lru_cache(maxsize=None)
 def get_pos(gramm):
+    from pylacoan.helpers import get_pos as _get_pos
+    from uniparser_yawarana import pos_list
+
     return _get_pos(gramm, pos_list)
 
 
@@ -48,14 +45,81 @@ log = get_colorlog(__name__, sys.stdout, level=logging.INFO)
 #################### PART 0: CONFIG ####################
 # the cell-internal separator used in all sorts of tables
 SEP = "; "
+# the inputs from other repositories can be relocated with environment variables,
+# e.g. to the fixtures of the benchmark (var/benchmark.py)
 # derivations and bound roots
-UP_DIR = Path("/home/florianm/Dropbox/development/uniparser-yawarana/data")
+UP_DIR = Path(
+    os.environ.get(
+        "YAWARANA_UP_DIR", "/home/florianm/Dropbox/development/uniparser-yawarana/data"
+    )
+)
 # all audio files
 AUDIO_PATH = Path(
-    "/home/florianm/Dropbox/research/cariban/yawarana/corpus/audio"
+    os.environ.get(
+        "YAWARANA_AUDIO_PATH",
+        "/home/florianm/Dropbox/research/cariban/yawarana/corpus/audio",
+    )
 )
+# annotated_dictionary.csv
+DICTIONARY_DIR = Path(os.environ.get("YAWARANA_DICTIONARY_DIR", "../dictionary"))
+# texts.csv
+CORPUS_DIR = Path(os.environ.get("YAWARANA_CORPUS_DIR", "../corpus"))
 # wordform audio files
 WORD_AUDIO_PATH = AUDIO_PATH / "wordforms"
+# different manually entered morph(eme)s
+MORPH_KINDS = ["derivation", "inflection", "misc"]
+# number of examples read and processed at a time
+EXAMPLE_CHUNKSIZE = 5000
+# derived stems, in UP_DIR / "derivations"
+DERIVATION_FILES = ["kavbz", "tavbz", "detrz", "macaus", "misc_derivations"]
+# changes to these invalidate all cached stages
+CODE_FILES = [
+    Path(__file__),
+    Path(__file__).parent / "lexicon.py",
+    Path(__file__).parent / "records.py",
+    Path(__file__).parent / "pipeline.py",
+    Path(__file__).parent / "stage_cache.py",
+    Path(__file__).parent / "profiling.py",
+    Path(__file__).parent / "ids.py",
+    Path(__file__).parent / "orthography.py",
+    Path(__file__).parent / "media_index.py",
+    Path(__file__).parent / "bibliography.py",
+    Path(__file__).parent / "validation.py",
+    Path(__file__).parent / "integrity.py",
+    Path(__file__).parent / "consistency_check.py",
+    Path(__file__).parent / "columnar.py",
+    Path(__file__).parent / "concordance.py",
+    Path(__file__).parent / "corpus_stats.py",
+    Path(__file__).parent / "chapters.py",
+    Path(__file__).parent / "registry.py",
+]
+# only roots with these POS are assumed to be treated as stems/lexemes (i.e., take inflectional morphology)
+STEM_POS_LIST = ["vt", "vi", "n", "postp", "pn", "adv"]
+# state of the wordform parser, carried from the dictionary to the corpus wordforms
+WORDFORM_STATE = [
+    "wf_dict",
+    "wf_morphs",
+    "inflections",
+    "wf_stems",
+    "productive_stems",
+    "productive_lexemes",
+    "tuple_lookup",
+    "lex_stem_tuples",
+]
+# lexical state that grows whenever a (productive) stem is parsed
+STEM_STATE = [
+    "lexicon",
+    "stemparts",
+    "derivations",
+    "derived_parts",
+    "complicated_stems",
+]
+# the columns of the part tables, which are CodedTables
+STEMPART_COLS = ["ID", "Stem_ID", "Morph_ID", "Gloss", "Index"]
+WF_STEM_COLS = ["ID", "Index", "Stem_ID", "Wordform_ID"]
+WF_MORPH_COLS = ["ID", "Index", "Morph_ID", "Wordform_ID", "Gloss_ID"]
+INFLECTION_COLS = ["ID", "Value_ID", "Wordformpart_ID", "Stem_ID"]
+EXAMPLEPART_COLS = ["ID", "Example_ID", "Wordform_ID", "Index"]
 
 
 def is_name(string):
@@ -72,6 +136,8 @@ def splitcol(df, col, sep="; "):
 
 
 def cread(filename):
+    import pandas as pd
+
     # use pandas to read csvs and not use NaN
     # use ID as index, split (inherently multivalued) translations
     df = pd.read_csv(filename, encoding="utf-8", keep_default_na=False)
@@ -82,6 +148,18 @@ def cread(filename):
     return df
 
 
+# like cread, but reading chunksize rows at a time
+def cread_chunks(filename, chunksize):
+    import pandas as pd
+
+    for df in pd.read_csv(
+        filename, encoding="utf-8", keep_default_na=False, chunksize=chunksize
+    ):
+        if "Translation" in df.columns:
+            splitcol(df, "Translation")
+        yield df
+
+
 # turn glosses into gloss IDs
 def id_glosses(gloss, sep=None):
     if isinstance(gloss, list):
@@ -103,99 +181,623 @@ def splitform(s):
     return s.split("-")
 
 
-def create(full=False):
-    start_time = time.perf_counter()
+# split a cliticized wordform record into its parts
+def split_cliticized(wf):
+    parts = []
+    for k, v in wf.items():
+        if "=" in v:
+            for idx, part in enumerate(v.split("=")):
+                if len(parts) <= idx:
+                    parts.append({})
+                parts[idx][k] = part
+    return parts
+
 
-    # for tokenizing into segments
+# for tokenizing into segments
+@lru_cache(maxsize=None)
+def get_tokenizer():
     phonemes = cread("etc/phonemes.csv")
-    prf = Profile(*phonemes.to_dict("records"))
-    t = Tokenizer(profile=prf)
-
-    def tokenize(s):
-        tokens = t(s, column="IPA").split(" ")
-        if "�" in tokens:
-            return []
-        return tokens
-
-    # time keeping purposes
-    def timer(msg):
-        toc = time.perf_counter()
-        print(f"{msg}: {toc - start_time:0.4f} seconds")
-
-    def ipaify(s):
-        return t(s, column="IPA", segment_separator="", separator=" ")
-
-    def add_to_morph_dic(morph):
-        for g in morph["Translation"]:
-            morph_tuple = (f'{morph["Form"].strip("-")}', glossify(g))
-            morph_dic.setdefault(morph_tuple, {})
-            morph_dic[morph_tuple][morph["Morpheme_ID"]] = morph["ID"]
-
-    # print current dataframes
-    def debug_dfs(key=None):
-        for k, data in vars(df).items():
-            if key and key != k:
+    return CompiledTokenizer(phonemes.to_dict("records"))
+
+
+def tokenize(s):
+    return get_tokenizer().tokenize(s)
+
+
+def ipaify(s):
+    return get_tokenizer().ipaify(s)
+
+
+# print current dataframes
+def debug_dfs(ctx, key=None):
+    for k, data in vars(ctx).items():
+        if key and key != k:
+            continue
+        print(data)
+        print(k)
+    sys.exit()
+
+
+# a function of a record (dict) for every row of df, which is faster than
+# df.apply(axis=1) with its row Series
+def apply_records(df, func):
+    import pandas as pd
+
+    if len(df) == 0:
+        return df.copy()
+    return pd.DataFrame([func(rec) for rec in df.to_dict("records")], index=df.index)
+
+
+def idify(data, columns, key):
+    import pandas as pd
+
+    columns = [(x, lambda y: y) if not isinstance(x, tuple) else x for x in columns]
+    vals = [
+        data[col].map(lambda x: func(x[0]) if isinstance(x, list) else func(x))
+        for col, func in columns
+    ]
+    texts = pd.Series(["-".join(x) for x in zip(*vals)], index=data.index, dtype=object)
+    return humidify_series(texts, key=key, unique=True)
+
+
+def add_to_morph_dic(morph_dic, morph):
+    for g in morph["Translation"]:
+        morph_tuple = (f'{morph["Form"].strip("-")}', glossify(g))
+        morph_dic.setdefault(morph_tuple, {})
+        morph_dic[morph_tuple][morph["Morpheme_ID"]] = morph["ID"]
+
+
+def add_morph_infl(morph_infl_dict, rec):
+    if rec["Value"]:
+        morph_infl_dict[rec["ID"]] = rec["Value"]
+
+
+def add_to_proc_dict(deriv_proc_dic, x):
+    if x["Parameter_ID"] == ["DETRZ"]:
+        process = "detrz"
+    else:
+        process = x["ID"]
+    deriv_proc_dic[x["ID"]] = {
+        "Form": x["Name"],
+        "Gloss": x["Translation"],
+        "Process": process,
+    }
+
+
+def add_to_stem_tuples(stem_tuples, stem):
+    for g in stem["Gloss"]:
+        stem_tuple = (f'{stem["Name"].strip("-")}', g)
+        stem_tuples.setdefault(stem_tuple, {})
+        stem_tuples[stem_tuple][stem["Lexeme_ID"]] = stem["ID"]
+
+
+#################### STEM PARSING ####################
+# base_stem, base_root: the IDs of the base of the stem (if any)
+def get_stempart_cands(ctx, base_stem, base_root, part, process):
+    count("get_stempart_cands")
+    cands = ctx.morph_index.by_form(part)
+    if len(cands) > 2 and process in ["kavbz", "tavbz", "macaus"]:
+        cands = filter_id(cands, process)
+    elif "DETRZ" in [x.Parameter_ID[0] for x in cands]:
+        cands = [x for x in cands if is_detrz(x)]
+    if len(cands) == 0:
+        # is the base a bound root?
+        bound_root_base = ctx.bound_root_index.match(
+            ids=[base_stem, base_root], form=part
+        )
+        if len(bound_root_base) == 1:
+            cands = bound_root_base
+        # or is it a complex form?
+    if len(cands) > 1 and base_stem in [x.ID for x in cands]:
+        cands = filter_id(cands, base_stem)
+    elif len(cands) > 1 and process in ctx.deriv_proc_dic:
+        cands = filter_id(cands, process)
+    return cands
+
+
+def process_stem(ctx, rec, process):
+    rec["Form"] = rec["Form"].split(SEP)
+    rec["ID"] = humidify(f'{strip_form(rec["Form"][0])}-{rec["Translation"][0]}')
+    if (
+        not ctx.lexicon.has_stem(rec["Base_Stem"])
+        and rec["Base_Stem"] not in ctx.derivations
+        and rec["Base_Root"] not in ctx.bound_root_index
+    ):
+        print(rec)
+        print(ctx.stems)
+        print(ctx.bound_root_morphs)
+        print(ctx.derivations)
+        raise ValueError(rec)
+    if not process:
+        process = rec["Affix_ID"]
+    rec["Morpho_Segments"] = []
+    for form in rec["Form"]:
+        stem_id = humidify(strip_form(form) + "-" + rec["Translation"][0])
+        parts = re.split(r"-|\+", form)
+        new_form = []
+        processes = []
+        for part in parts:
+            if part in ctx.derived_parts:
+                for subpart in ctx.derived_parts[part]:
+                    new_form.append(subpart["Part"])
+                    if subpart["Morph_ID"] in ctx.deriv_proc_dic:
+                        processes.append(subpart["Morph_ID"])
+                    else:
+                        processes.append(process)
+            else:
+                new_form.append(part)
+                processes.append(process)
+        form = "+".join(new_form)
+        parts = re.split(r"-|\+", form)
+        form = strip_form(form)
+        ctx.derived_parts[form] = []
+        # print(parts)
+        for idx, part in enumerate(parts):
+            if is_name(part):
                 continue
-            print(data)
-            print(k)
-        sys.exit()
-
-    # combine several dataframes in the namespace
-    def join_dfs(name, *keys):
-        setattr(df, name, pd.concat([vars(df)[key] for key in keys]).fillna(""))
-        for key in keys:
-            if key != name:
-                delattr(df, key)
-
-    def idify(data, columns, key):
-        columns = [(x, lambda y: y) if not isinstance(x, tuple) else x for x in columns]
-        def recid(x):
-            vals = []
-            for col, func in columns:
-                vals.append(func(x[col][0]) if isinstance(x[col], list) else func(x[col]))
-            return "-".join(vals)
-
-        return data.apply(lambda x: humidify(recid(x), key=key, unique=True), axis=1)
-
-    def add_morph_infl(rec):
-        if rec["Value"]:
-            morph_infl_dict[rec["ID"]] = rec["Value"]
-
-    def add_to_proc_dict(x):
-        if x["Parameter_ID"] == ["DETRZ"]:
-            process = "detrz"
+            cands = get_stempart_cands(
+                ctx, rec["Base_Stem"], rec.get("Base_Root"), part, processes[idx]
+            )
+            if len(cands) == 1:
+                hit = cands[0]
+                ctx.stemparts.append(
+                    {
+                        "ID": f"{stem_id}-{idx}",
+                        "Stem_ID": stem_id,
+                        "Morph_ID": hit.ID,
+                        "Index": idx,
+                        "Gloss": hit.Gloss[0],
+                    }
+                )
+                ctx.derived_parts[form].append(
+                    {"Morph_ID": hit.ID, "Index": idx, "Part": part}
+                )
+                if hit.ID == rec["Affix_ID"]:
+                    ctx.derivations[rec["ID"]] = {
+                        "ID": rec["ID"],
+                        "Process_ID": process,
+                        "Target_ID": rec["ID"],
+                        "Stempart_IDs": f"{stem_id}-{idx}",
+                    }
+                    if rec["Base_Stem"] in ctx.bound_root_index:
+                        ctx.derivations[rec["ID"]]["Root_ID"] = rec[
+                            "Base_Stem"
+                        ]  # these are not based on stems, but on roots that only occur bound
+                    else:
+                        ctx.derivations[rec["ID"]]["Source_ID"] = rec["Base_Stem"]
+            elif len(cands) == 0:
+                ctx.complicated_stems.append(rec.copy())
+                log.warning(f"Could not find stempart {part} for stem {form}")
+                # exit()
+            elif len(cands) > 1:
+                log.warning(f"Unable to disambiguate stem parts for {rec['Form']}")
+                print(to_frame(cands))
+                # exit()
+        rec["Morpho_Segments"].append(" ".join(parts))
+    rec["Gloss"] = glossify(rec["Translation"], segmented=True)
+    rec["Form"] = [x.replace("+", "") for x in rec["Form"]]
+    return rec
+
+
+#################### WORDFORM PARSING ####################
+# for every wordform, we want to know:
+# morphological structure, i.e. morphs (WordformParts)
+# inflectional values
+# a meaning
+# the part of speech
+# the wordform dict
+
+deriv_source_pos = {"anonmlz": ["adv", "postp"], "keprop": ["n"], "ninmlz": ["vt"]}
+
+semi_inflections = [
+    "rinmlz",
+    "tojpepurp",
+    "sapenmlz",
+    "jpenmlz",
+    "septcp",
+    "tanecncs",
+    "neinf",
+]  # todo: should these receive some different treatment?
+
+
+def build_productive_stem(ctx, source_stem, process, obj):
+    if process not in ctx.deriv_proc_dic:
+        log.warning(f"Unidentifiable process: {process}")
+        return None, None, None
+    suff_form = ctx.deriv_proc_dic[process]["Form"]
+    for part in splitform(obj):
+        cands = get_stempart_cands(
+            ctx, source_stem.Base_Stem, source_stem.Base_Root, part, process
+        )
+        if len(cands) == 1 and cands[0].Morpheme_ID == process:
+            suff_form = cands[0].Form
+    stem_form = f"{source_stem.Form}-{suff_form}".replace("--", "-")
+    stem_glosses = [
+        f"{x}-{y}"
+        for x, y in list(
+            product(source_stem.Gloss, ctx.deriv_proc_dic[process]["Gloss"])
+        )
+    ]
+    stem_id = humidify(f"{strip_form(stem_form)}-{stem_glosses[0]}", key="stems")
+    log.debug(
+        f"The stem {stem_form} '{', '.join(stem_glosses)}' ({stem_id}) is derived from {source_stem.Form} '{', '.join(source_stem.Gloss)}' ({source_stem.ID}) with {ctx.deriv_proc_dic[process]['Form']} ({process})"
+    )
+    return stem_form, stem_glosses, stem_id
+
+
+def resolve_productive_stem(ctx, lex_id, obj, gloss, pos):
+    lex, process = lex_id.rsplit("&", 1)
+    log.debug(
+        f"Uniparser lexeme: {lex_id}\nactual wordform: {obj} '{gloss}'\nuniparser process: {process}\nlexeme form: {lex}"
+    )
+    if "&" in lex:  # a productively derived stem, as put out by uniparser-morph
+        stem_id, sub_lex_id = resolve_productive_stem(ctx, lex, obj, gloss, pos)
+        cands = ctx.lexicon.by_id(sub_lex_id)
+    else:
+        cands = ctx.lexicon.by_name(lex)
+    if len(cands) > 1:
+        cands = [
+            x for x in cands if len(set(set(x.Gloss) & set(gloss.split("-")))) > 0
+        ]
+        print("reduced cands:")
+        print(to_frame(cands))
+    if len(cands) == 1:
+        source_lex = cands[0]
+    elif len(cands) > 1:
+        log.warning(
+            f"Could not disambiguate stem {lex}\n{to_frame(cands).to_string()}"
+        )
+        # exit()
+    elif len(cands) == 0:
+        log.warning(f"Found no candidates for stem {lex_id}")
+        # exit()
+        return None, None
+    stem_cands = ctx.lexicon.stems_of(source_lex.ID)
+    if len(stem_cands) > 1:
+        stem_cands = [x for x in stem_cands if x.Form in obj.split("-")]
+    if len(stem_cands) > 1:
+        log.warning(
+            f"Ambiguity in resolving productive derivation {obj}&{process}:"
+        )
+        print(to_frame(stem_cands))
+        return None, None
+    if len(stem_cands) == 0:
+        log.warning(
+            f"Unable to resolve productive derivation {obj}&{process} in form {obj} '{gloss}'."
+        )
+        # exit()
+        return None, None
+    if "&" not in lex:
+        source_stem = stem_cands[0]
+        # todo: do these need to find their way back in?
+        # if len(cands) == 0:
+        #     cands = df.bound_root_morphs[df.bound_root_morphs["Form"] == obj]
+        # if len(cands) > 1 and process in deriv_source_pos:
+        #     cands = cands[cands["POS"].isin(deriv_source_pos[process])]
+        if process in semi_inflections:
+            print("semi_inflection", process, "only gets", source_stem.ID, source_stem.Lexeme_ID)
+            # print(stem_cands)
+            # print("src", source_stem)
+            # print("obj", obj)
+            # print("what now?")
+            # exit()
+            # new_stem_form, new_stem_gloss, new_stem_id = build_productive_stem(
+            #     source_stem, process, obj
+            # )
+            return source_stem.ID, source_stem.Lexeme_ID
         else:
-            process = x["ID"]
-        deriv_proc_dic[x["ID"]] = {
-            "Form": x["Name"],
-            "Gloss": x["Translation"],
-            "Process": process,
-        }
+            new_stem_form, new_stem_gloss, new_stem_id = build_productive_stem(
+                ctx, source_stem, process, obj
+            )
+        if not new_stem_form:
+            return None, None
+        if new_stem_id not in ctx.productive_stems:
+            stemrec = {
+                "Form": new_stem_form,
+                "Base_Stem": source_stem.ID,
+                "Translation": new_stem_gloss,
+                "Affix_ID": process,
+                "POS": pos,
+            }
+            for part in splitform(new_stem_form):
+                res = get_stempart_cands(ctx, source_stem.ID, None, part, process)
+                if len(res) == 1 and res[0].Morpheme_ID == process:
+                    stemrec["Affix_ID"] = res[0].ID
+            parsed_stem = process_stem(
+                ctx,
+                stemrec,
+                process,
+            )
+            parsed_stem["Parameter_ID"] = parsed_stem["Translation"]
+            parsed_stem["Name"] = parsed_stem["Form"][0]
+            # process_stem gives the segments of every form as one string, but a
+            # productive stem has one form, and its segments are the list items
+            parsed_stem["Morpho_Segments"] = parsed_stem["Morpho_Segments"][0].split(" ")
+            ctx.productive_lexemes[new_stem_id] = parsed_stem
+            parsed_stem["Lexeme_ID"] = new_stem_id
+            ctx.productive_stems[new_stem_id] = parsed_stem
+            ctx.lexicon.add_stems([parsed_stem], searchable=False)
+        return new_stem_id, source_stem.Lexeme_ID
+    else:
+        return stem_id, sub_lex_id
+
+
+def lexeme2stem(ctx, lex, obj, pos):
+    if (lex, obj) in ctx.lex_stem_tuples:
+        count("lexeme2stem.hit")
+        return ctx.lex_stem_tuples[(lex, obj)]
+    count("lexeme2stem.miss")
+    cands = ctx.lexicon.stems_of(lex)
+    if len(cands) > 1:
+        cands = [x for x in cands if x.Form in splitform(obj)]
+    if len(cands) == 0:
+        if pos in STEM_POS_LIST:
+            log.warning(
+                f"lexeme2stem: could not identify stem for lexeme {lex} in form {obj}."
+            )
+        ctx.lex_stem_tuples[(lex, obj)] = lex
+        return lex
+    elif len(cands) == 1:
+        stem_id = cands[0].ID
+        ctx.lex_stem_tuples[(lex, obj)] = stem_id
+        return stem_id
+    else:
+        log.warning(
+            f"lexeme2stem: could not resolve stem for lexeme {lex} in form {obj}"
+        )
+        ctx.lex_stem_tuples[(lex, obj)] = lex
+        return lex
+
+
+def identify_part(ctx, obj, gloss, ids):
+    count("identify_part")
+    kinds = {}
+    if (obj, gloss) in ctx.morph_dic:
+        cands = ctx.morph_dic[(obj, gloss)]
+        kinds["morph"] = cands
+    if (obj, gloss) in ctx.stem_tuples:
+        cands = ctx.stem_tuples[(obj, gloss)]
+        kinds["stem"] = cands
+    for kind, cands in kinds.items():
+        if len(cands) == 1:
+            abstract_id = next(iter(cands))
+            concrete_id = cands[abstract_id]
+            if abstract_id not in ids:
+                log.warning(
+                    f"identify_part: {obj} '{gloss}' is clearly the {kind} {abstract_id}. IDs: {ids}"
+                )
+            kinds[kind] = concrete_id
+        for _id in ids:
+            if _id in cands:
+                kinds[kind] = cands[_id]
+    if kinds:
+        return kinds
+    raise ValueError(
+        f"Could not find any morph or stem {obj} '{gloss}'. IDs: {ids}"
+    )
+
+
+# find the morphs and stems making up a wordform
+def get_wordform_parts(ctx, obj, gloss, morpheme_ids):
+    wf_parts = []
+    for idx, (part, partgloss) in enumerate(zip(obj.split("-"), gloss.split("-"))):
+        if partgloss == "***":
+            continue
+        if (part, partgloss) in ctx.tuple_lookup:
+            parts = ctx.tuple_lookup[(part, partgloss)]
+        else:
+            parts = identify_part(ctx, part, partgloss, morpheme_ids)
+            if not parts:
+                raise ValueError(part, partgloss)
+        wf_parts.append(WordformPart(idx, partgloss, parts))
+    return wf_parts
+
+
+# the stem and parts of a (non-productive) wordform; this only reads from the lexicon
+def analyze_wordform(ctx, obj, gloss, lex_id, gramm, morpheme_ids):
+    stem_id = lexeme2stem(ctx, lex_id, obj, get_pos(gramm))
+    return stem_id, get_wordform_parts(ctx, obj, gloss, morpheme_ids)
+
+
+def add_wordform_parts(ctx, wf_id, stem_id, wf_parts):
+    for part in wf_parts:
+        idx, partgloss = part.Index, part.Gloss
+        for kind, part_id in part.Parts.items():
+            if kind == "stem":
+                ctx.wf_stems.append(
+                    {
+                        "ID": f"{wf_id}-{idx}",
+                        "Index": [idx],
+                        "Stem_ID": part_id,
+                        "Wordform_ID": wf_id,
+                    }
+                )
+            elif kind == "morph":
+                ctx.wf_morphs.append(
+                    {
+                        "ID": f"{wf_id}-{idx}",
+                        "Index": idx,
+                        "Morph_ID": part_id,
+                        "Wordform_ID": wf_id,
+                        "Gloss_ID": id_glosses(partgloss),
+                    }
+                )
+                if part_id in ctx.morph_infl_dict and ctx.lexicon.has_stem(stem_id):
+                    infl = ctx.morph_infl_dict[part_id]
+                    ctx.inflections.append(
+                        {
+                            "ID": f"{wf_id}-{idx}-{infl}",
+                            "Value_ID": infl,
+                            "Wordformpart_ID": [f"{wf_id}-{idx}"],
+                            "Stem_ID": stem_id,
+                        }
+                    )
+
+
+# todo: this should only add inflectional values if they are in the gramm argument
+# analysis: the result of analyze_wordform, if it has already been computed
+def process_wordform(
+    ctx, obj, gloss, lex_id, gramm, morpheme_ids, analysis=None, **kwargs
+):
+    log.debug(f"processing wordform {obj} '{gloss}'")
+    if gloss in ["***", "?", ""]:
+        return None
+    wf_id = humidify(f"{strip_form(obj)}-{gloss}", unique=False, key="wordforms")
+    if wf_id in ctx.wf_dict:
+        return wf_id
+    if morpheme_ids:
+        if not isinstance(morpheme_ids, list):
+            morpheme_ids = morpheme_ids.split(",")
+        if "&" in lex_id:
+            from morphinder import identify_complex_stem_position
+
+            stem_id, source_id = resolve_productive_stem(
+                ctx, lex_id, obj, gloss, get_pos(gramm)
+            )
+            if stem_id:
+                if stem_id in ctx.productive_stems:
+                    if gloss in ctx.productive_stems[stem_id]["Gloss"]:
+                        # todo: it would be great if I could figure out the positions of ANY productive stem in the wordform
+                        ctx.wf_stems.append(
+                            {
+                                "ID": f"{wf_id}-deriv-stem",
+                                "Index": [0, len(obj.split("-")) - 1],
+                                "Stem_ID": stem_id,
+                                "Wordform_ID": wf_id,
+                            }
+                        )
+                    else:
+                        stemform = ctx.productive_stems[stem_id]["Form"][0]
+                        if stemform in obj:
+                            ctx.wf_stems.append(
+                                {
+                                    "ID": f"{wf_id}-deriv-stem",
+                                    "Index": identify_complex_stem_position(
+                                        obj, stemform
+                                    ),
+                                    "Stem_ID": stem_id,
+                                    "Wordform_ID": wf_id,
+                                }
+                            )
+                        else:
+                            log.warning(
+                                f"The form {obj} '{gloss}' contains the stem {stemform} '{', '.join(ctx.productive_stems[stem_id]['Gloss'])}'; can it know about its wordformstem?"
+                            )
+                            # exit()
+            else:
+                log.error(f"Could not find stem ID for wordform {obj} '{gloss}")
+            if source_id:
+                morpheme_ids.append(source_id)
+            else:
+                log.warning(
+                    f"Unable to find derivational source for {obj} '{gloss}'"
+                )
+                # exit()
+        elif "+" in lex_id:
+            print(
+                "UH OH",
+                "lex_id",
+                lex_id,
+                "obj",
+                obj,
+                "gloss",
+                gloss,
+                get_pos(gramm),
+            )
+            exit()
+        else:
+            if analysis is None:
+                analysis = analyze_wordform(ctx, obj, gloss, lex_id, gramm, morpheme_ids)
+            elif isinstance(analysis, Exception):
+                raise analysis
+            stem_id, wf_parts = analysis
+        if "&" in lex_id:
+            wf_parts = get_wordform_parts(ctx, obj, gloss, morpheme_ids)
+        add_wordform_parts(ctx, wf_id, stem_id, wf_parts)
+
+    kwargs.setdefault("Parameter_ID", [gloss])
+    ctx.wf_dict[wf_id] = Wordform(
+        ID=wf_id,
+        Form=obj.replace("-", "").replace("∅", ""),
+        Morpho_Segments=obj.split("-"),
+        **kwargs,
+    )
+    return wf_id
+
+
+def add_formparts(formparts, rec):
+    for idx, wfid in enumerate(rec["Wordform_ID"].split(",")):
+        formparts.append(
+            {
+                "ID": f'{rec["ID"]}-{idx}',
+                "Form_ID": rec["ID"],
+                "Wordform_ID": wfid,
+                "Index": idx,
+            }
+        )
+
+
+def resolve_wf_data(wordformparts, wordformstems, rec):
+    partcands = wordformparts[
+        (wordformparts["Wordform_ID"] == rec["Wordform_ID"])
+        & (wordformparts["Index"] == rec["Part_Index"])
+    ]
+    stemcands = wordformstems[
+        (wordformstems["Wordform_ID"] == rec["Lexeme_Wordform"])
+    ]
+    if len(partcands) == 1:
+        wfpart = partcands.iloc[0]["ID"]
+    else:
+        wfpart = ""
+        # print("part", rec["Wordform_ID"])
+    if len(stemcands) == 1:
+        wfstem = stemcands.iloc[0]["Stem_ID"]
+    else:
+        wfstem = ""
+        # print("stem", rec["Lexeme_Wordform"])
+    rec["Stem_ID"] = wfstem
+    rec["Wordformpart_ID"] = [wfpart]
+    return rec
+
+
+#################### STAGES ####################
+# every stage reads from and writes to the shared ctx namespace; see pipeline.py
+# stages minting IDs in the same humidifier namespace (ids) have to require each other
+pipeline = Pipeline(code_files=CODE_FILES)
+
+
+#################### PART 1.1: SIMPLE LEXICAL DATA ####################
+@pipeline.stage(
+    files=[
+        f"etc/{kind}_{table}.csv"
+        for kind in MORPH_KINDS
+        for table in ["morphemes", "morphs"]
+    ],
+    provides=["morphs", "morphemes", "morph_dic", "morph_infl_dict", "deriv_proc_dic"],
+)
+def morphemes(ctx):
+    import pandas as pd
 
     # dictionary of derivational morphs for later enjoyment
-    deriv_proc_dic = {}
+    ctx.deriv_proc_dic = {}
     # keep a running dict of all morphs, used for identifying parts of forms and stems
-    morph_dic = {}
-    # namespace for storing dataframes
-    df = SimpleNamespace()
+    ctx.morph_dic = {}
     # mapping morpheme IDs to inflectional values
-    morph_infl_dict = {}
-
-    #################### PART 1.1: SIMPLE LEXICAL DATA ####################
+    ctx.morph_infl_dict = {}
+    kind_morphs = {}
+    kind_morphemes = {}
     # load inflectional, derivational and "misc" morph(eme)s
-    for kind in [
-        "derivation",
-        "inflection",
-        "misc",
-    ]:  # different manually entered morph(eme)s
+    for kind in MORPH_KINDS:
         morphemes = cread(f"etc/{kind}_morphemes.csv")
         morphs = cread(f"etc/{kind}_morphs.csv")
         if (
             kind == "inflection"
         ):  # copy inflectional values from the morpheme to the morph table
-            morphemes.apply(add_morph_infl, axis=1)
-            morphs["Value"] = morphs["Morpheme_ID"].map(morph_infl_dict).fillna("")
-            morphs.apply(add_morph_infl, axis=1)
+            for rec in morphemes.to_dict("records"):
+                add_morph_infl(ctx.morph_infl_dict, rec)
+            morphs["Value"] = morphs["Morpheme_ID"].map(ctx.morph_infl_dict).fillna("")
+            for rec in morphs.to_dict("records"):
+                add_morph_infl(ctx.morph_infl_dict, rec)
         morphs["Name"] = morphs["Form"]  # todo: necessary?
         morphs["Language_ID"] = "yab"
         morphemes["Language_ID"] = "yab"
@@ -203,32 +805,67 @@ def create(full=False):
         morph_meanings = dict(zip(morphemes["ID"], morphemes["Translation"]))
         morphs["Translation"] = morphs["Morpheme_ID"].map(morph_meanings)
         morphs["Parameter_ID"] = morphs["Translation"]
-        morphs.apply(add_to_morph_dic, axis=1)
+        for rec in morphs.to_dict("records"):
+            add_to_morph_dic(ctx.morph_dic, rec)
         morphs["Gloss"] = morphs["Translation"].apply(glossify)
-        setattr(df, f"{kind}_morphs", morphs)
-        setattr(df, f"{kind}_morphemes", morphemes)
+        kind_morphs[kind] = morphs
+        kind_morphemes[kind] = morphemes
+
+    for rec in kind_morphemes["derivation"].to_dict("records"):
+        add_to_proc_dict(ctx.deriv_proc_dic, rec)
+    # root morph(eme)s are added by the roots stage
+    ctx.morphs = pd.concat([kind_morphs[x] for x in ["inflection", "derivation", "misc"]])
+    ctx.morphemes = pd.concat(
+        [kind_morphemes[x] for x in ["inflection", "derivation", "misc"]]
+    )
 
-    df.derivation_morphemes.apply(add_to_proc_dict, axis=1)
+
+@pipeline.stage(
+    requires=["morphemes"],
+    files=[
+        UP_DIR / "bound_roots.csv",
+        DICTIONARY_DIR / "annotated_dictionary.csv",
+        "etc/manual_roots.csv",
+    ],
+    provides=[
+        "morphs",
+        "morphemes",
+        "morph_dic",
+        "bound_roots",
+        "bound_root_morphs",
+        "lexemes",
+        "stems",
+        "stemparts",
+        "morph_index",
+        "bound_root_index",
+        "lexicon",
+    ],
+    ids=["morphemes", "morphs", "morpheme", "stems"],
+)
+def roots(ctx):
+    import pandas as pd
+
+    from registry import CodedTable
 
     # bound roots; they don't occur as stems
-    df.bound_roots = cread(UP_DIR / "bound_roots.csv")
-    df.bound_roots["Language_ID"] = "yab"
-    df.bound_roots["Parameter_ID"] = df.bound_roots["Translation"]
-    df.bound_roots["Gloss"] = df.bound_roots["Translation"].apply(glossify)
-    df.bound_roots["ID"] = idify(
-        df.bound_roots, ["Name", "Translation"], key="morphemes"
+    ctx.bound_roots = cread(UP_DIR / "bound_roots.csv")
+    ctx.bound_roots["Language_ID"] = "yab"
+    ctx.bound_roots["Parameter_ID"] = ctx.bound_roots["Translation"]
+    ctx.bound_roots["Gloss"] = ctx.bound_roots["Translation"].apply(glossify)
+    ctx.bound_roots["ID"] = idify(
+        ctx.bound_roots, ["Name", "Translation"], key="morphemes"
     )
-    splitcol(df.bound_roots, "Form")
-    df.bound_root_morphs = df.bound_roots.explode("Form")
-    df.bound_root_morphs["Morpheme_ID"] = df.bound_root_morphs["ID"]
-    df.bound_root_morphs["Name"] = df.bound_root_morphs["Form"]
-    df.bound_root_morphs["ID"] = idify(
-        df.bound_root_morphs, ["Name", "Translation"], key="morphs"
+    splitcol(ctx.bound_roots, "Form")
+    ctx.bound_root_morphs = ctx.bound_roots.explode("Form")
+    ctx.bound_root_morphs["Morpheme_ID"] = ctx.bound_root_morphs["ID"]
+    ctx.bound_root_morphs["Name"] = ctx.bound_root_morphs["Form"]
+    ctx.bound_root_morphs["ID"] = idify(
+        ctx.bound_root_morphs, ["Name", "Translation"], key="morphs"
     )
 
     # enriched LIFT export from MCMM
     dic = pd.read_csv(
-        "../dictionary/annotated_dictionary.csv",
+        DICTIONARY_DIR / "annotated_dictionary.csv",
         keep_default_na=False,
     )
     dic_roots = dic[dic["Translation_Root"] != ""].copy()  # keep only roots
@@ -251,21 +888,21 @@ def create(full=False):
     manual_roots["Gloss"] = manual_roots["Translation"]
 
     # build a dataframe containing root morphemes
-    df.roots = pd.concat([dic_roots, manual_roots])
-    df.roots["Language_ID"] = "yab"
+    root_table = pd.concat([dic_roots, manual_roots])
+    root_table["Language_ID"] = "yab"
     # process roots
     for split_col in ["Form"]:
-        splitcol(df.roots, split_col)
-    df.roots["Name"] = df.roots["Form"].apply(
+        splitcol(root_table, split_col)
+    root_table["Name"] = root_table["Form"].apply(
         lambda x: x[0]
     )  # main allomorph is label for root
     # create IDs
-    df.roots["temp"] = df.roots["ID"]
-    df.roots["ID"] = idify(df.roots, ["Name", "Gloss"], key="morpheme")
-    df.roots["ID"] = df.roots.apply(lambda x: x["ID"] if not x["temp"] or len(x["temp"]) > 20 else x["temp"],axis=1)
-    df.roots["Parameter_ID"] = df.roots["Translation"]
-    df.roots["Gloss"] = df.roots["Gloss"].apply(glossify)
-    df.roots = df.roots[
+    root_table["temp"] = root_table["ID"]
+    root_table["ID"] = idify(root_table, ["Name", "Gloss"], key="morpheme")
+    root_table["ID"] = root_table.apply(lambda x: x["ID"] if not x["temp"] or len(x["temp"]) > 20 else x["temp"],axis=1)
+    root_table["Parameter_ID"] = root_table["Translation"]
+    root_table["Gloss"] = root_table["Gloss"].apply(glossify)
+    root_table = root_table[
         [
             "ID",
             "Language_ID",
@@ -281,25 +918,27 @@ def create(full=False):
     ]
 
     # roots["Description"] = roots["Parameter_ID"] # todo: needed?
-    # only roots with these POS are assumed to be treated as stems/lexemes (i.e., take inflectional morphology)
-    stem_pos_list = ["vt", "vi", "n", "postp", "pn", "adv"]
-    df.root_lex = df.roots[df.roots["POS"].isin(stem_pos_list)].copy()
+    root_lex = root_table[root_table["POS"].isin(STEM_POS_LIST)].copy()
 
-    df.root_lex = df.root_lex[~(df.root_lex["Translation"].apply(is_name))]
+    root_lex = root_lex[~(root_lex["Translation"].apply(is_name))]
 
-    df.stems = df.root_lex.explode("Form")
-    df.root_lex["Main_Stem"] = df.root_lex["ID"]
-    df.stems["Lexeme_ID"] = df.stems["ID"]
-    df.stems["ID"] = idify(df.stems, ["Form", "Gloss"], key="stems")
+    ctx.stems = root_lex.explode("Form")
+    root_lex["Main_Stem"] = root_lex["ID"]
+    ctx.stems["Lexeme_ID"] = ctx.stems["ID"]
+    ctx.stems["ID"] = idify(ctx.stems, ["Form", "Gloss"], key="stems")
+    # derived lexemes are added by the derivations stage
+    ctx.lexemes = root_lex
 
     # all roots are also morphs
-    df.root_morphs = df.roots.explode("Form")
-    df.root_morphs["Morpheme_ID"] = df.root_morphs["ID"]
-    df.root_morphs["ID"] = idify(df.root_morphs, ["Form", "Gloss"], key="morphs")
-    df.root_morphs.apply(add_to_morph_dic, axis=1)
-    df.root_morphs["Name"] = df.root_morphs["Form"]
-
-    stemparts = [
+    root_morphs = root_table.explode("Form")
+    root_morphs["Morpheme_ID"] = root_morphs["ID"]
+    root_morphs["ID"] = idify(root_morphs, ["Form", "Gloss"], key="morphs")
+    for rec in root_morphs.to_dict("records"):
+        add_to_morph_dic(ctx.morph_dic, rec)
+    root_morphs["Name"] = root_morphs["Form"]
+
+    ctx.stemparts = CodedTable(STEMPART_COLS)
+    ctx.stemparts.extend(
         {
             "ID": x["ID"],
             "Stem_ID": x["ID"],
@@ -307,23 +946,36 @@ def create(full=False):
             "Gloss": x["Gloss"][0],
             "Index": 0,
         }
-        for i, x in df.stems.iterrows()
-    ]
-
-    join_dfs(
-        "morphs", "inflection_morphs", "derivation_morphs", "misc_morphs", "root_morphs"
+        for i, x in ctx.stems.iterrows()
     )
 
-    join_dfs(
-        "morphemes",
-        "inflection_morphemes",
-        "derivation_morphemes",
-        "misc_morphemes",
-        "roots",
-    )
+    ctx.morphs = pd.concat([ctx.morphs, root_morphs]).fillna("")
+    ctx.morphemes = pd.concat([ctx.morphemes, root_table]).fillna("")
+
+    # hash indices for resolving stem parts to morphs
+    ctx.morph_index = MorphIndex(ctx.morphs)
+    ctx.bound_root_index = MorphIndex(ctx.bound_root_morphs)
+    # lexemes and stems; derived and productive stems are added as they are created
+    ctx.lexicon = LexiconIndex()
+    ctx.lexicon.add_stems(ctx.stems)
 
-    #################### PART 1.2: COMPLEX LEXICAL DATA ####################
-    derivations = {}
+
+#################### PART 1.2: COMPLEX LEXICAL DATA ####################
+@pipeline.stage(
+    requires=["roots"],
+    files=[UP_DIR / f"derivations/{x}.csv" for x in DERIVATION_FILES]
+    + ["etc/phonemes.csv"],
+    provides=["stems", "lexemes", "stem_tuples"] + STEM_STATE,
+    ids=["default", "stems", "glosses"],
+)
+def derivations(ctx):
+    import pandas as pd
+
+    # derivations of complex stems
+    ctx.derivations = {}
+    ctx.complicated_stems = []  # not fully parsable stems
+    ctx.derived_parts = {}  # mapping stem forms to stemparts
+    ctx.stem_tuples = {}  # a dict mapping object-gloss tuples to stem IDs
 
     # derived stems
     kavbz = cread(UP_DIR / "derivations/kavbz.csv")
@@ -340,494 +992,84 @@ def create(full=False):
     kavbz["POS"] = "vt"
     macaus["POS"] = "vt"
 
-    complicated_stems = []  # not fully parsable stems
-    derived_parts = {}  # mapping stem forms to stemparts
-
-    def get_stempart_cands(rec, part, process):
-        cands = df.morphs[df.morphs["Form"].str.strip("-") == part]
-        if len(cands) > 2 and process == "kavbz":
-            cands = cands[cands["ID"] == "kavbz"]
-        elif len(cands) > 2 and process == "tavbz":
-            cands = cands[cands["ID"] == "tavbz"]
-        elif len(cands) > 2 and process == "macaus":
-            cands = cands[cands["ID"] == "macaus"]
-        elif (
-            len(cands) > 1
-            and process == "detrz"
-            and "DETRZ" in list(cands["Parameter_ID"].apply(lambda x: x[0]))
-        ):
-            cands = cands[cands["Parameter_ID"].apply(lambda x: x == ["DETRZ"])]
-        elif "DETRZ" in list(cands["Parameter_ID"].apply(lambda x: x[0])):
-            cands = cands[cands["Parameter_ID"].apply(lambda x: x == ["DETRZ"])]
-        if len(cands) == 0:
-            # is the base a bound root?
-            bound_root_base = df.bound_root_morphs[
-                (df.bound_root_morphs["ID"] == rec["Base_Stem"])
-                | (df.bound_root_morphs["ID"] == rec.get("Base_Root"))
-                | (df.bound_root_morphs["Form"] == part)
-            ]
-            if len(bound_root_base) == 1:
-                cands = bound_root_base
-            # or is it a complex form?
-        if len(cands) > 1 and rec["Base_Stem"] in list(cands["ID"]):
-            cands = cands[cands["ID"] == rec["Base_Stem"]]
-        elif len(cands) > 1 and process in deriv_proc_dic:
-            cands = cands[cands["ID"] == process]
-        return cands
-
-    def process_stem(rec, process):
-        rec["Form"] = rec["Form"].split(SEP)
-        rec["ID"] = humidify(f'{strip_form(rec["Form"][0])}-{rec["Translation"][0]}')
-        if (
-            rec["Base_Stem"] not in list(df.stems["ID"])
-            and rec["Base_Stem"] not in derivations
-            and rec["Base_Root"] not in list(df.bound_root_morphs["ID"])
-        ):
-            print(rec)
-            print(df.stems)
-            print(df.bound_root_morphs)
-            print(derivations)
-            raise ValueError(rec)
-        if not process:
-            process = rec["Affix_ID"]
-        rec["Morpho_Segments"] = []
-        for form in rec["Form"]:
-            stem_id = humidify(strip_form(form) + "-" + rec["Translation"][0])
-            parts = re.split(r"-|\+", form)
-            new_form = []
-            processes = []
-            for part in parts:
-                if part in derived_parts:
-                    for subpart in derived_parts[part]:
-                        new_form.append(subpart["Part"])
-                        if subpart["Morph_ID"] in deriv_proc_dic:
-                            processes.append(subpart["Morph_ID"])
-                        else:
-                            processes.append(process)
-                else:
-                    new_form.append(part)
-                    processes.append(process)
-            form = "+".join(new_form)
-            parts = re.split(r"-|\+", form)
-            form = strip_form(form)
-            derived_parts[form] = []
-            # print(parts)
-            for idx, part in enumerate(parts):
-                if is_name(part):
-                    continue
-                cands = get_stempart_cands(rec, part, processes[idx])
-                if len(cands) == 1:
-                    hit = cands.iloc[0]
-                    stemparts.append(
-                        {
-                            "ID": f"{stem_id}-{idx}",
-                            "Stem_ID": stem_id,
-                            "Morph_ID": hit["ID"],
-                            "Index": idx,
-                            "Gloss": hit["Gloss"][0],
-                        }
-                    )
-                    derived_parts[form].append(
-                        {"Morph_ID": hit["ID"], "Index": idx, "Part": part}
-                    )
-                    if hit["ID"] == rec["Affix_ID"]:
-                        derivations[rec["ID"]] = {
-                            "ID": rec["ID"],
-                            "Process_ID": process,
-                            "Target_ID": rec["ID"],
-                            "Stempart_IDs": f"{stem_id}-{idx}",
-                        }
-                        if rec["Base_Stem"] in list(df.bound_root_morphs["ID"]):
-                            derivations[rec["ID"]]["Root_ID"] = rec[
-                                "Base_Stem"
-                            ]  # these are not based on stems, but on roots that only occur bound
-                        else:
-                            derivations[rec["ID"]]["Source_ID"] = rec["Base_Stem"]
-                elif len(cands) == 0:
-                    complicated_stems.append(rec.copy())
-                    log.warning(f"Could not find stempart {part} for stem {form}")
-                    # exit()
-                elif len(cands) > 1:
-                    log.warning(f"Unable to disambiguate stem parts for {rec['Form']}")
-                    print(cands)
-                    # exit()
-            rec["Morpho_Segments"].append(" ".join(parts))
-        rec["Gloss"] = glossify(rec["Translation"], segmented=True)
-        rec["Form"] = [x.replace("+", "") for x in rec["Form"]]
-        return rec
-
     # add columns ID, Morpho_Segments, Gloss
-    tavbz = tavbz.apply(lambda x: process_stem(x, "tavbz"), axis=1)
-    kavbz = kavbz.apply(lambda x: process_stem(x, "kavbz"), axis=1)
-    macaus = macaus.apply(lambda x: process_stem(x, "macaus"), axis=1)
-    detrz = detrz.apply(lambda x: process_stem(x, "detrz"), axis=1)
-    miscderiv = miscderiv.apply(lambda x: process_stem(x, None), axis=1)
-
-    df.derived_lex = pd.concat([tavbz, kavbz, detrz, macaus, miscderiv])
-    df.derived_lex["Language_ID"] = "yab"
-    df.derived_lex["Lexeme_ID"] = df.derived_lex["ID"]
-    df.derived_lex["Parameter_ID"] = df.derived_lex["Translation"]
-    df.derived_lex["Name"] = df.derived_lex["Form"].apply(lambda x: strip_form(x[0]))
-
-    df.derived_stems = df.derived_lex.explode(["Form", "Morpho_Segments"])
-    df.derived_lex["Main_Stem"] = df.derived_lex["ID"]
-    df.derived_stems["Lexeme_ID"] = df.derived_stems["ID"]
-    df.derived_stems["ID"] = idify(df.derived_stems, [("Form", lambda x: x.replace("-", "")), "Gloss"], key="stems")
-    df.stems["Morpho_Segments"] = df.stems["Form"]
-    join_dfs("stems", "stems", "derived_stems")
-
-    join_dfs("lexemes", "root_lex", "derived_lex")
-    df.lexemes = df.lexemes.set_index("ID", drop=False)
-    df.stems["Gloss_ID"] = df.stems["Gloss"].apply(id_glosses)
-    df.stems["Name"] = df.stems["Form"].apply(strip_form)
-    df.stems["Description"] = df.stems["Translation"]
-    df.stems["Language_ID"] = "yab"
-    df.stems["Segments"] = df.stems["Name"].apply(tokenize)
-    splitcol(df.stems, "Morpho_Segments", sep=" ")
-
-    stem_tuples = {}  # a dict mapping object-gloss tuples to stem IDs
-
-    def add_to_stem_tuplest(stem):
-        for g in stem["Gloss"]:
-            stem_tuple = (f'{stem["Name"].strip("-")}', g)
-            stem_tuples.setdefault(stem_tuple, {})
-            stem_tuples[stem_tuple][stem["Lexeme_ID"]] = stem["ID"]
-
-    df.stems.apply(add_to_stem_tuplest, axis=1)
-
-    #################### PART 2: ATTESTED DATA ####################
-    df.speakers = cread("etc/speakers.csv")
-    df.speakers["ID"] = df.speakers["Name"].apply(
+    tavbz = apply_records(tavbz, lambda x: process_stem(ctx, x, "tavbz"))
+    kavbz = apply_records(kavbz, lambda x: process_stem(ctx, x, "kavbz"))
+    macaus = apply_records(macaus, lambda x: process_stem(ctx, x, "macaus"))
+    detrz = apply_records(detrz, lambda x: process_stem(ctx, x, "detrz"))
+    miscderiv = apply_records(miscderiv, lambda x: process_stem(ctx, x, None))
+
+    derived_lex = pd.concat([tavbz, kavbz, detrz, macaus, miscderiv])
+    derived_lex["Language_ID"] = "yab"
+    derived_lex["Lexeme_ID"] = derived_lex["ID"]
+    derived_lex["Parameter_ID"] = derived_lex["Translation"]
+    derived_lex["Name"] = derived_lex["Form"].apply(lambda x: strip_form(x[0]))
+
+    derived_stems = derived_lex.explode(["Form", "Morpho_Segments"])
+    derived_lex["Main_Stem"] = derived_lex["ID"]
+    derived_stems["Lexeme_ID"] = derived_stems["ID"]
+    derived_stems["ID"] = idify(derived_stems, [("Form", lambda x: x.replace("-", "")), "Gloss"], key="stems")
+    ctx.stems["Morpho_Segments"] = ctx.stems["Form"]
+    ctx.stems = pd.concat([ctx.stems, derived_stems]).fillna("")
+
+    ctx.lexemes = pd.concat([ctx.lexemes, derived_lex]).fillna("")
+    ctx.lexemes = ctx.lexemes.set_index("ID", drop=False)
+    ctx.stems["Gloss_ID"] = ctx.stems["Gloss"].apply(id_glosses)
+    ctx.stems["Name"] = ctx.stems["Form"].apply(strip_form)
+    ctx.stems["Description"] = ctx.stems["Translation"]
+    ctx.stems["Language_ID"] = "yab"
+    ctx.stems["Segments"] = get_tokenizer().tokenize_series(ctx.stems["Name"])
+    splitcol(ctx.stems, "Morpho_Segments", sep=" ")
+    ctx.lexicon.add_lexemes(ctx.lexemes)
+    ctx.lexicon.add_stems(ctx.stems)
+
+    for rec in ctx.stems.to_dict("records"):
+        add_to_stem_tuples(ctx.stem_tuples, rec)
+
+
+#################### PART 2: ATTESTED DATA ####################
+@pipeline.stage(files=["etc/speakers.csv"], provides=["speakers"], ids=["speakers"])
+def speakers(ctx):
+    ctx.speakers = cread("etc/speakers.csv")
+    ctx.speakers["ID"] = ctx.speakers["Name"].apply(
         lambda x: humidify(x, key="speakers", unique=True)
     )
 
-    # for every wordform, we want to know:
-    # morphological structure, i.e. morphs (WordformParts)
-    # inflectional values
-    # a meaning
-    # the part of speech
-    # the wordform dict
-    wf_dict = {}
-    wf_morphs = []
-    inflections = []
-    wf_stems = []
-    productive_stems = {}
-    productive_lexemes = {}
-    tuple_lookup = {}
-
-    deriv_source_pos = {"anonmlz": ["adv", "postp"], "keprop": ["n"], "ninmlz": ["vt"]}
-
-    def build_productive_stem(source_stem, process, obj):
-        if process not in deriv_proc_dic:
-            log.warning(f"Unidentifiable process: {process}")
-            return None, None, None
-        suff_form = deriv_proc_dic[process]["Form"]
-        for part in splitform(obj):
-            cands = get_stempart_cands(source_stem, part, process)
-            if len(cands) == 1 and cands.iloc[0]["Morpheme_ID"] == process:
-                suff_form = cands.iloc[0]["Form"]
-        stem_form = f"{source_stem.Form}-{suff_form}".replace("--", "-")
-        stem_glosses = [
-            f"{x}-{y}"
-            for x, y in list(
-                product(source_stem.Gloss, deriv_proc_dic[process]["Gloss"])
-            )
-        ]
-        stem_id = humidify(f"{strip_form(stem_form)}-{stem_glosses[0]}", key="stems")
-        log.debug(
-            f"The stem {stem_form} '{', '.join(stem_glosses)}' ({stem_id}) is derived from {source_stem.Form} '{', '.join(source_stem.Gloss)}' ({source_stem.ID}) with {deriv_proc_dic[process]['Form']} ({process})"
-        )
-        return stem_form, stem_glosses, stem_id
-
-    semi_inflections = [
-        "rinmlz",
-        "tojpepurp",
-        "sapenmlz",
-        "jpenmlz",
-        "septcp",
-        "tanecncs",
-        "neinf",
-    ]  # todo: should these receive some different treatment?
-
-    def resolve_productive_stem(lex_id, obj, gloss, pos):
-        lex, process = lex_id.rsplit("&", 1)
-        log.debug(
-            f"Uniparser lexeme: {lex_id}\nactual wordform: {obj} '{gloss}'\nuniparser process: {process}\nlexeme form: {lex}"
-        )
-        if "&" in lex:  # a productively derived stem, as put out by uniparser-morph
-            stem_id, sub_lex_id = resolve_productive_stem(lex, obj, gloss, pos)
-            cands = df.lexemes[df.lexemes["ID"] == sub_lex_id]
-        else:
-            cands = df.lexemes[df.lexemes["Name"] == lex]
-        if len(cands) > 1:
-            cands = cands[
-                cands.apply(
-                    lambda x: len(set(set(x["Gloss"]) & set(gloss.split("-")))) > 0,
-                    axis=1,
-                )
-            ]
-            print("reduced cands:")
-            print(cands)
-        if len(cands) == 1:
-            source_lex = cands.iloc[0]
-        elif len(cands) > 1:
-            log.warning(f"Could not disambiguate stem {lex}\n{cands.to_string()}")
-            # exit()
-        elif len(cands) == 0:
-            log.warning(f"Found no candidates for stem {lex_id}")
-            # exit()
-            return None, None
-        stem_cands = df.stems[df.stems["Lexeme_ID"] == source_lex.name]
-        if len(stem_cands) > 1:
-            stem_cands = stem_cands[stem_cands["Form"].isin(obj.split("-"))]
-        if len(stem_cands) > 1:
-            log.warning(
-                f"Ambiguity in resolving productive derivation {obj}&{process}:"
-            )
-            print(stem_cands)
-            return None, None
-        if len(stem_cands) == 0:
-            log.warning(
-                f"Unable to resolve productive derivation {obj}&{process} in form {obj} '{gloss}'."
-            )
-            # exit()
-            return None, None
-        if "&" not in lex:
-            source_stem = stem_cands.iloc[0]
-            # todo: do these need to find their way back in?
-            # if len(cands) == 0:
-            #     cands = df.bound_root_morphs[df.bound_root_morphs["Form"] == obj]
-            # if len(cands) > 1 and process in deriv_source_pos:
-            #     cands = cands[cands["POS"].isin(deriv_source_pos[process])]
-            if process in semi_inflections:
-                print("semi_inflection", process, "only gets", source_stem["ID"], source_stem["Lexeme_ID"])
-                # print(stem_cands)
-                # print("src", source_stem)
-                # print("obj", obj)
-                # print("what now?")
-                # exit()
-                # new_stem_form, new_stem_gloss, new_stem_id = build_productive_stem(
-                #     source_stem, process, obj
-                # )
-                return source_stem["ID"], source_stem["Lexeme_ID"]
-            else:
-                new_stem_form, new_stem_gloss, new_stem_id = build_productive_stem(
-                    source_stem, process, obj
-                )
-            if not new_stem_form:
-                return None, None
-            if new_stem_id not in productive_stems:
-                stemrec = {
-                    "Form": new_stem_form,
-                    "Base_Stem": source_stem.ID,
-                    "Translation": new_stem_gloss,
-                    "Affix_ID": process,
-                    "POS": pos,
-                }
-                for part in splitform(new_stem_form):
-                    res = get_stempart_cands(stemrec, part, process)
-                    if len(res) == 1 and res.iloc[0]["Morpheme_ID"] == process:
-                        stemrec["Affix_ID"] = res.iloc[0]["ID"]
-                parsed_stem = process_stem(
-                    stemrec,
-                    process,
-                )
-                parsed_stem["Parameter_ID"] = parsed_stem["Translation"]
-                parsed_stem["Name"] = parsed_stem["Form"][0]
-                productive_lexemes[new_stem_id] = parsed_stem
-                parsed_stem["Lexeme_ID"] = new_stem_id
-                productive_stems[new_stem_id] = parsed_stem
-            return new_stem_id, source_stem.Lexeme_ID
-        else:
-            return stem_id, sub_lex_id
-
-    lex_stem_tuples = {}
-
-    def lexeme2stem(lex, obj, pos):
-        if (lex, obj) in lex_stem_tuples:
-            return lex_stem_tuples[(lex, obj)]
-        cands = df.stems[df.stems["Lexeme_ID"] == lex]
-        if len(cands) > 1:
-            cands = cands[cands["Form"].isin(splitform(obj))]
-        if len(cands) == 0:
-            if pos in stem_pos_list:
-                log.warning(
-                    f"lexeme2stem: could not identify stem for lexeme {lex} in form {obj}."
-                )
-            lex_stem_tuples[(lex, obj)] = lex
-            return lex
-        elif len(cands) == 1:
-            stem_id = cands.iloc[0]["ID"]
-            lex_stem_tuples[(lex, obj)] = stem_id
-            return stem_id
-        else:
-            log.warning(
-                f"lexeme2stem: could not resolve stem for lexeme {lex} in form {obj}"
-            )
-            lex_stem_tuples[(lex, obj)] = lex
-            return lex
-
-    def identify_part(obj, gloss, ids):
-        kinds = {}
-        if (obj, gloss) in morph_dic:
-            cands = morph_dic[(obj, gloss)]
-            kinds["morph"] = cands
-        if (obj, gloss) in stem_tuples:
-            cands = stem_tuples[(obj, gloss)]
-            kinds["stem"] = cands
-        for kind, cands in kinds.items():
-            if len(cands) == 1:
-                abstract_id = next(iter(cands))
-                concrete_id = cands[abstract_id]
-                if abstract_id not in ids:
-                    log.warning(
-                        f"identify_part: {obj} '{gloss}' is clearly the {kind} {abstract_id}. IDs: {ids}"
-                    )
-                kinds[kind] = concrete_id
-            for _id in ids:
-                if _id in cands:
-                    kinds[kind] = cands[_id]
-        if kinds:
-            return kinds
-        raise ValueError(
-            f"Could not find any morph or stem {obj} '{gloss}'. IDs: {ids}"
-        )
 
-    # todo: this should only add inflectional values if they are in the gramm argument
-    def process_wordform(obj, gloss, lex_id, gramm, morpheme_ids, **kwargs):
-        log.debug(f"processing wordform {obj} '{gloss}'")
-        if gloss in ["***", "?", ""]:
-            return None
-        wf_id = humidify(f"{strip_form(obj)}-{gloss}", unique=False, key="wordforms")
-        if wf_id in wf_dict:
-            return wf_id
-        if morpheme_ids:
-            if not isinstance(morpheme_ids, list):
-                morpheme_ids = morpheme_ids.split(",")
-            if "&" in lex_id:
-                stem_id, source_id = resolve_productive_stem(
-                    lex_id, obj, gloss, get_pos(gramm)
-                )
-                if stem_id:
-                    if stem_id in productive_stems:
-                        if gloss in productive_stems[stem_id]["Gloss"]:
-                            # todo: it would be great if I could figure out the positions of ANY productive stem in the wordform
-                            wf_stems.append(
-                                {
-                                    "ID": f"{wf_id}-deriv-stem",
-                                    "Index": [0, len(obj.split("-")) - 1],
-                                    "Stem_ID": stem_id,
-                                    "Wordform_ID": wf_id,
-                                }
-                            )
-                        else:
-                            stemform = productive_stems[stem_id]["Form"][0]
-                            if stemform in obj:
-                                wf_stems.append(
-                                    {
-                                        "ID": f"{wf_id}-deriv-stem",
-                                        "Index": identify_complex_stem_position(
-                                            obj, stemform
-                                        ),
-                                        "Stem_ID": stem_id,
-                                        "Wordform_ID": wf_id,
-                                    }
-                                )
-                            else:
-                                log.warning(
-                                    f"The form {obj} '{gloss}' contains the stem {stemform} '{', '.join(productive_stems[stem_id]['Gloss'])}'; can it know about its wordformstem?"
-                                )
-                                # exit()
-                else:
-                    log.error(f"Could not find stem ID for wordform {obj} '{gloss}")
-                if source_id:
-                    morpheme_ids.append(source_id)
-                else:
-                    log.warning(
-                        f"Unable to find derivational source for {obj} '{gloss}'"
-                    )
-                    # exit()
-            elif "+" in lex_id:
-                print(
-                    "UH OH",
-                    "lex_id",
-                    lex_id,
-                    "obj",
-                    obj,
-                    "gloss",
-                    gloss,
-                    get_pos(gramm),
-                )
-                exit()
-            else:
-                stem_id = lexeme2stem(lex_id, obj, get_pos(gramm))
-            for idx, (part, partgloss) in enumerate(
-                zip(obj.split("-"), gloss.split("-"))
-            ):
-                if partgloss == "***":
-                    continue
-                if (part, partgloss) in tuple_lookup:
-                    parts = tuple_lookup[(part, partgloss)]
-                else:
-                    parts = identify_part(part, partgloss, morpheme_ids)
-                    if not parts:
-                        raise ValueError(part, partgloss)
-                for kind, part_id in parts.items():
-                    if kind == "stem":
-                        wf_stems.append(
-                            {
-                                "ID": f"{wf_id}-{idx}",
-                                "Index": [idx],
-                                "Stem_ID": part_id,
-                                "Wordform_ID": wf_id,
-                            }
-                        )
-                    elif kind == "morph":
-                        wf_morphs.append(
-                            {
-                                "ID": f"{wf_id}-{idx}",
-                                "Index": idx,
-                                "Morph_ID": part_id,
-                                "Wordform_ID": wf_id,
-                                "Gloss_ID": id_glosses(partgloss),
-                            }
-                        )
-                        if part_id in morph_infl_dict and (
-                            stem_id in list(df.stems["ID"])
-                            or stem_id in productive_stems
-                        ):
-                            infl = morph_infl_dict[part_id]
-                            inflections.append(
-                                {
-                                    "ID": f"{wf_id}-{idx}-{infl}",
-                                    "Value_ID": infl,
-                                    "Wordformpart_ID": [f"{wf_id}-{idx}"],
-                                    "Stem_ID": stem_id,
-                                }
-                            )
+## Out-of-context wordforms
+@pipeline.stage(
+    requires=["derivations"],
+    files=[UP_DIR / "../annotation/parsed_dictionary_wordforms.csv"],
+    dirs=[(WORD_AUDIO_PATH, "*")],
+    provides=WORDFORM_STATE + STEM_STATE + ["forms", "wf_audios"],
+    ids=["wordforms", "stems", "default", "glosses", "wf_audio"],
+)
+def dictionary_wordforms(ctx):
+    import pandas as pd
 
-        wf_dict[wf_id] = {
-            "ID": wf_id,
-            "Form": obj.replace("-", "").replace("∅", ""),
-            "Parameter_ID": [gloss],
-            "Language_ID": "yab",
-            "Morpho_Segments": obj.split("-"),
-            **kwargs,
-        }
-        return wf_id
+    from registry import CodedTable
+
+    ctx.wf_dict = {}
+    ctx.wf_morphs = CodedTable(WF_MORPH_COLS)
+    ctx.inflections = CodedTable(INFLECTION_COLS)
+    ctx.wf_stems = CodedTable(WF_STEM_COLS)
+    ctx.productive_stems = {}
+    ctx.productive_lexemes = {}
+    ctx.tuple_lookup = {}
+    ctx.lex_stem_tuples = {}
 
     wf_audios = []
     f_audios = []
     dic_forms = []
-    ## Out-of-context wordforms
     dic_wordforms = cread(UP_DIR / "../annotation/parsed_dictionary_wordforms.csv")
+    # all files, looked up by their exact names (like checking that the file exists)
+    word_audio = media_index(WORD_AUDIO_PATH, cache=ctx.use_cache)
     dic_wordforms.rename(columns={"Lexeme_ID": "Lexeme_IDs"}, inplace=True)
     for wf in dic_wordforms.to_dict("records"):
         kwargs = {}
         if wf["Audio"]:
             filename = wf["Audio"].split("/")[-1]
-            audio_path = WORD_AUDIO_PATH / filename
-            if audio_path.is_file():
+            if filename in word_audio:
                 if "=" not in wf["Gloss"]:
                     kwargs["Media_ID"] = filename.replace(".wav", "")
                     wf_audios.append(
@@ -857,18 +1099,10 @@ def create(full=False):
                 "Parameter_ID": wf["Gloss"],
                 "Media_ID": filename.replace(".wav", ""),
             }
-            def split_cliticized(wf):
-                parts = []
-                for k, v in wf.items():
-                    if "=" in v:
-                        for idx, part in enumerate(v.split("=")):
-                            if len(parts) <= idx:
-                                parts.append({})
-                            parts[idx][k] = part
-                return parts
             # create multiple wordform IDs
             wf_ids = {
                 process_wordform(
+                    ctx,
                     x["Analysis"],
                     x["Gloss"],
                     x["Lexeme_IDs"],
@@ -883,6 +1117,7 @@ def create(full=False):
             dic_forms.append(form_dic)
         else:
             process_wordform(
+                ctx,
                 wf["Analysis"],
                 wf["Gloss"],
                 wf["Lexeme_IDs"],
@@ -893,111 +1128,186 @@ def create(full=False):
                 Parameter_ID=wf["Translation"] or wf["Gloss"],
                 **kwargs,
             )
+    ctx.wf_audios = wf_audios
+
+    # # Multiword forms
+    # pn_v_forms = cread(
+    #     "/home/florianm/Dropbox/research/cariban/yawarana/corpus/annotation/output/multiword.csv"
+    # )
+    # pn_v_forms.rename(columns={"Gloss": "Parameter_ID"}, inplace=True)
+    # pn_v_forms = pd.concat([pn_v_forms, pd.DataFrame.from_dict(dic_forms)])
 
-    # in-context wordforms
+    pn_v_forms = pd.DataFrame.from_dict(dic_forms)
+    pn_v_forms["Language_ID"] = "yab"
+    pn_v_forms = pn_v_forms.fillna("")
+    # formparts = []
+    # pn_v_forms.apply(lambda x: add_formparts(formparts, x), axis=1)
+    # df.formparts = formparts
+    ctx.forms = pn_v_forms
+
+
+#################### PARALLEL EXAMPLE ANALYSIS ####################
+# the columns of the examples holding one value per word
+EXAMPLE_COLS = ["Analyzed_Word", "Gloss", "Lexeme_IDs", "Gramm", "Morpheme_IDs"]
+# the columns of the written examples table (Media_ID is added by the media stage);
+# of these, the lists are kept as tab-separated strings until the table is written
+EXAMPLE_TABLE_COLS = [
+    "ID",
+    "Language_ID",
+    "Primary_Text",
+    "Analyzed_Word",
+    "Gloss",
+    "Translated_Text",
+    "Comment",
+    "Part_Of_Speech",
+    "Original_Translation",
+    "Text_ID",
+    "Sentence_Number",
+    "Speaker_ID",
+]
+EXAMPLE_LIST_COLS = ["Analyzed_Word", "Gloss", "Part_Of_Speech"]
+# the lexicon snapshot read by the analysis processes, see init_analysis
+analysis_ctx = None
+
+
+def wordform_key(wf):
+    return (wf["Analysis"], wf["Gloss"], wf["Lexeme_IDs"], wf["Gramm"], wf["Morpheme_IDs"])
+
+
+# the wordforms in an example, with cliticized words split up
+def example_wordforms(ex):
+    for obj, gloss, lex_id, gramm, morpheme_ids in zip(*[ex[col] for col in EXAMPLE_COLS]):
+        wf = {
+            "Analysis": obj,
+            "Gloss": gloss,
+            "Lexeme_IDs": lex_id,
+            "Gramm": gramm,
+            "Morpheme_IDs": morpheme_ids,
+        }
+        if "=" in gloss:
+            yield from split_cliticized(wf)
+        else:
+            yield wf
 
-    ex_audios = []
-    exampleparts = []
-    split_cols = ["Analyzed_Word", "Gloss", "Lexeme_IDs", "Gramm", "Morpheme_IDs"]
 
-    if full:
-        df.examples = cread("raw/full_examples.csv")
-    else:
-        df.examples = cread("raw/examples.csv")
-    df.examples.rename(columns={"Record_Number": "Sentence_Number"}, inplace=True)
+def init_analysis(snapshot):
+    global analysis_ctx
+    analysis_ctx = snapshot
+
 
-    df.examples["Language_ID"] = "yab"
-    df.examples["Primary_Text"] = df.examples["Primary_Text"].apply(
-        lambda x: x.replace("#", "")
+# analyze the wordforms of some examples against the lexicon snapshot
+# productive derivations change the lexicon and are left to process_wordform
+def analyze_examples(records):
+    ctx = analysis_ctx
+    analyses = {}
+    for ex in records:
+        for wf in example_wordforms(ex):
+            try:
+                key = wordform_key(wf)
+            except KeyError:
+                continue
+            if (
+                key in analyses
+                or wf["Gloss"] in ["***", "?", ""]
+                or not wf["Morpheme_IDs"]
+                or "&" in wf["Lexeme_IDs"]
+                or "+" in wf["Lexeme_IDs"]
+            ):
+                continue
+            try:
+                analyses[key] = analyze_wordform(
+                    ctx,
+                    wf["Analysis"],
+                    wf["Gloss"],
+                    wf["Lexeme_IDs"],
+                    wf["Gramm"],
+                    wf["Morpheme_IDs"].split(","),
+                )
+            except Exception as e:  # raised when (and if) the wordform is processed
+                analyses[key] = e
+    return analyses, ctx.lex_stem_tuples
+
+
+# a process pool for analyzing example wordforms, see analyze_in_parallel
+def analysis_pool(ctx, processes):
+    from concurrent.futures import ProcessPoolExecutor
+
+    snapshot = SimpleNamespace(
+        morph_dic=ctx.morph_dic,
+        stem_tuples=ctx.stem_tuples,
+        tuple_lookup=ctx.tuple_lookup,
+        lexicon=ctx.lexicon,
+        lex_stem_tuples=dict(ctx.lex_stem_tuples),
     )
-    df.examples = df.examples[~(df.examples["Primary_Text"] == "")]
-    df.examples["Part_Of_Speech"] = df.examples["Gramm"].apply(
-        lambda y: "\t".join([get_pos(x) if get_pos(x) else "?" for x in y.split("\t")])
+    return ProcessPoolExecutor(
+        max_workers=processes, initializer=init_analysis, initargs=(snapshot,)
     )
-    splitcol(df.examples, "Part_Of_Speech", sep="\t")
 
-    examples_with_audio = []
-    for col in split_cols:
-        splitcol(df.examples, col, sep="\t")
-    for ex in df.examples.to_dict("records"):
-        g_shift = 0  # to keep up to date with how many g-words there are in total
-        for idx, (obj, gloss, stem_id, gramm, morpheme_ids) in enumerate(
-            zip(*[ex[col] for col in split_cols])
-        ):
-            if "=" in gloss:
-                f_id = humidify(strip_form(obj) + "-" + gloss)
-                # print(morpheme_ids)
-                res = split_cliticized(
-                    {
-                        "ID": f_id,
-                        "Gramm": gramm,
-                        "Analysis": obj,
-                        "Gloss": gloss,
-                        "Lexeme_IDs": stem_id,
-                        "Morpheme_IDs": morpheme_ids,
-                    }
-                )
-                wf_ids = {
-                    process_wordform(
-                        gwf["Analysis"],
-                        gwf["Gloss"],
-                        gwf["Lexeme_IDs"],
-                        gwf["Gramm"],
-                        gwf["Morpheme_IDs"],
-                        Part_Of_Speech=get_pos(gwf["Gramm"]),
-                    ): gwf
-                    for gwf in res
-                }
-                for wf_id, form in wf_ids.items():
-                    if wf_id and gloss != "?":
-                        exampleparts.append(
-                            {
-                                "ID": f'{ex["ID"]}-{idx+g_shift}',
-                                "Example_ID": ex["ID"],
-                                "Wordform_ID": wf_id,
-                                "Index": idx + g_shift,
-                            }
-                        )
-                    elif gloss not in ["***", "?"]:
-                        log.warning(
-                            f"Unidentifiable wordform {obj} '{gloss}' in {ex['ID']}"
-                        )
-                    g_shift += 1
-                g_shift -= 1
-            else:
-                wf_id = process_wordform(
-                    obj,
-                    gloss,
-                    stem_id,
-                    gramm,
-                    morpheme_ids,
-                    Part_Of_Speech=get_pos(gramm),
-                )
-                if wf_id and gloss != "?":
-                    exampleparts.append(
-                        {
-                            "ID": f'{ex["ID"]}-{idx+g_shift}',
-                            "Example_ID": ex["ID"],
-                            "Wordform_ID": wf_id,
-                            "Index": idx + g_shift,
-                        }
-                    )
-                elif gloss not in ["***", "?"]:
-                    log.warning(
-                        f"Unidentifiable wordform {obj} '{gloss}' in {ex['ID']}"
-                    )
-        file_path = AUDIO_PATH / f'{ex["ID"]}.wav'
-        if file_path.is_file():
-            ex_audios.append(
-                {
-                    "ID": ex["ID"],
-                    "Name": ex["ID"],
-                    "Media_Type": "audio/wav",
-                    "Download_URL": ex["ID"] + ".wav",
-                }
-            )
-            examples_with_audio.append(ex["ID"])
 
+# analyze example wordforms in the pool, with the examples sharded by text
+# the results are only looked up, IDs are still created while going through the examples in order
+def analyze_in_parallel(executor, ctx, examples, processes):
+    shards = {}
+    for ex in examples:
+        shards.setdefault(ex["Text_ID"], []).append(ex)
+    shards = list(shards.values())
+    log.info(f"Analyzing {len(shards)} texts in {processes} processes")
+    analyses = {}
+    for shard_analyses, lex_stem_tuples in executor.map(
+        analyze_examples,
+        shards,
+        chunksize=max(1, len(shards) // (processes * 4)),
+    ):
+        analyses.update(shard_analyses)
+        ctx.lex_stem_tuples.update(lex_stem_tuples)
+    return analyses
+
+
+# read the examples in chunks of rows, ready for processing; the columns with one value
+# per word are split in the records of a chunk (split_example), not in the chunk
+def read_examples(filename, chunksize=EXAMPLE_CHUNKSIZE):
+    for examples in cread_chunks(filename, chunksize):
+        examples.rename(columns={"Record_Number": "Sentence_Number"}, inplace=True)
+
+        examples["Language_ID"] = "yab"
+        examples["Primary_Text"] = examples["Primary_Text"].apply(
+            lambda x: x.replace("#", "")
+        )
+        examples = examples[~(examples["Primary_Text"] == "")]
+        examples["Part_Of_Speech"] = examples["Gramm"].apply(
+            lambda y: "\t".join([get_pos(x) if get_pos(x) else "?" for x in y.split("\t")])
+        )
+        yield examples
+
+
+# the per-word values of an example record as lists
+def split_example(ex):
+    for col in EXAMPLE_COLS:
+        ex[col] = ex[col].split("\t")
+    return ex
+
+
+## In-context wordforms
+@pipeline.stage(
+    requires=["dictionary_wordforms", "speakers"],
+    files=lambda ctx: [ctx.examples_file],
+    dirs=[(AUDIO_PATH, "*")],
+    provides=WORDFORM_STATE
+    + STEM_STATE
+    + ["examples", "exampleparts", "ex_audios", "examples_with_audio"],
+    ids=["wordforms", "stems", "default", "glosses", "speakers"],
+)
+def examples(ctx):
+    import pandas as pd
+
+    from registry import CodedTable, SplitTable
+
+    ex_audios = []
+    exampleparts = CodedTable(EXAMPLEPART_COLS)
+    split_cols = EXAMPLE_COLS
+    examples_with_audio = []
+    audio = media_index(AUDIO_PATH, cache=ctx.use_cache)
+    chunks = []
     # todo: remove this at some point
     speaker_fix = {
         "IrDI": "IrDi",
@@ -1007,152 +1317,195 @@ def create(full=False):
         "CaME": "CaMe",
         "GrME": "GrMe",
     }
-    df.examples["Speaker_ID"] = df.examples["Speaker_ID"].replace(speaker_fix)
-    df.examples["Speaker_ID"] = df.examples["Speaker_ID"].apply(
-        lambda x: humidify(x, key="speakers")
-    )
+    # the analysis processes are started once and get the lexicon snapshot once
+    executor = analysis_pool(ctx, ctx.processes) if ctx.processes > 1 else None
+    # (object, gloss) -> wordform ID: the ID only depends on these, and a known wordform
+    # is not processed again, so repeated tokens are only looked up
+    known = {}
+
+    def token_wordform(obj, gloss, lex_id, gramm, morpheme_ids, analyses):
+        key = (obj, gloss)
+        if key not in known:
+            known[key] = process_wordform(
+                ctx,
+                obj,
+                gloss,
+                lex_id,
+                gramm,
+                morpheme_ids,
+                analysis=analyses.get((obj, gloss, lex_id, gramm, morpheme_ids)),
+                Part_Of_Speech=get_pos(gramm),
+            )
+        return known[key]
 
-    found_texts = set(list(df.examples["Text_ID"]))
+    try:
+        for chunk in read_examples(ctx.examples_file):
+            records = [split_example(ex) for ex in chunk.to_dict("records")]
+            if executor:
+                analyses = analyze_in_parallel(executor, ctx, records, ctx.processes)
+            else:
+                analyses = {}
+            for ex in records:
+                g_shift = 0  # to keep up to date with how many g-words there are in total
+                for idx, (obj, gloss, stem_id, gramm, morpheme_ids) in enumerate(
+                    zip(*[ex[col] for col in split_cols])
+                ):
+                    if "=" in gloss:
+                        f_id = humidify(strip_form(obj) + "-" + gloss)
+                        # print(morpheme_ids)
+                        res = split_cliticized(
+                            {
+                                "ID": f_id,
+                                "Gramm": gramm,
+                                "Analysis": obj,
+                                "Gloss": gloss,
+                                "Lexeme_IDs": stem_id,
+                                "Morpheme_IDs": morpheme_ids,
+                            }
+                        )
+                        wf_ids = {
+                            token_wordform(*wordform_key(gwf), analyses): gwf
+                            for gwf in res
+                        }
+                        for wf_id, form in wf_ids.items():
+                            if wf_id and gloss != "?":
+                                exampleparts.append(
+                                    {
+                                        "ID": f'{ex["ID"]}-{idx+g_shift}',
+                                        "Example_ID": ex["ID"],
+                                        "Wordform_ID": wf_id,
+                                        "Index": idx + g_shift,
+                                    }
+                                )
+                            elif gloss not in ["***", "?"]:
+                                log.warning(
+                                    f"Unidentifiable wordform {obj} '{gloss}' in {ex['ID']}"
+                                )
+                            g_shift += 1
+                        g_shift -= 1
+                    else:
+                        wf_id = token_wordform(
+                            obj, gloss, stem_id, gramm, morpheme_ids, analyses
+                        )
+                        if wf_id and gloss != "?":
+                            exampleparts.append(
+                                {
+                                    "ID": f'{ex["ID"]}-{idx+g_shift}',
+                                    "Example_ID": ex["ID"],
+                                    "Wordform_ID": wf_id,
+                                    "Index": idx + g_shift,
+                                }
+                            )
+                        elif gloss not in ["***", "?"]:
+                            log.warning(
+                                f"Unidentifiable wordform {obj} '{gloss}' in {ex['ID']}"
+                            )
+                if f'{ex["ID"]}.wav' in audio:
+                    ex_audios.append(
+                        {
+                            "ID": ex["ID"],
+                            "Name": ex["ID"],
+                            "Media_Type": "audio/wav",
+                            "Download_URL": ex["ID"] + ".wav",
+                        }
+                    )
+                    examples_with_audio.append(ex["ID"])
 
-    texts = {}
-    text_list = cread("../corpus/texts.csv")
+            chunk["Speaker_ID"] = chunk["Speaker_ID"].replace(speaker_fix)
+            chunk["Speaker_ID"] = chunk["Speaker_ID"].apply(
+                lambda x: humidify(x, key="speakers")
+            )
+            # only the written columns, unsplit, are kept
+            chunks.append(chunk[[x for x in EXAMPLE_TABLE_COLS if x in chunk.columns]])
+    finally:
+        if executor:
+            executor.shutdown()
+    ctx.examples = SplitTable(pd.concat(chunks), EXAMPLE_LIST_COLS, sep="\t")
+    ctx.exampleparts = exampleparts
+    ctx.ex_audios = ex_audios
+    ctx.examples_with_audio = examples_with_audio
+
+
+## Texts
+@pipeline.stage(files=[CORPUS_DIR / "texts.csv"], provides=["texts"])
+def texts(ctx):
+    # all texts; only the ones with examples are written
+    ctx.texts = {}
+    text_list = cread(CORPUS_DIR / "texts.csv")
     for text in text_list.to_dict("records"):
         # if text["id"] in text_metadata: # todo clean up this entire mess
         #     text.update(**text_metadata[text["id"]])
-        if text["id"] in found_texts:
-            texts[text["id"]] = text
+        ctx.texts[text["id"]] = text
 
-    df.texts = []
-    for text_id, text_data in texts.items():
-        metadata = {x: text_data[x] for x in ["genre", "tags"] if x in text_data}
-        df.texts.append(
-            {
-                "ID": text_id,
-                "Name": text_data["title_es"],
-                "Description": text_data["summary"],
-                "Comment": "; ".join(text_data.get("comments", [])),
-                "Type": text_data["genre"],
-                "Metadata": metadata,
-            }
-        )
-
-    df.wordforms = pd.DataFrame.from_dict(wf_dict.values()).set_index("ID", drop=False)
-    df.wordforms = list(wf_dict.values())
-    df.wordformstems = pd.DataFrame.from_dict(wf_stems)
-    df.wordformparts = pd.DataFrame.from_dict(wf_morphs)
-    df.inflections = inflections
-    df.exampleparts = exampleparts
-
-    # # Multiword forms
-    # pn_v_forms = cread(
-    #     "/home/florianm/Dropbox/research/cariban/yawarana/corpus/annotation/output/multiword.csv"
-    # )
-    # pn_v_forms.rename(columns={"Gloss": "Parameter_ID"}, inplace=True)
-    # pn_v_forms = pd.concat([pn_v_forms, pd.DataFrame.from_dict(dic_forms)])
-
-    pn_v_forms = pd.DataFrame.from_dict(dic_forms)
-    pn_v_forms["Language_ID"] = "yab"
-    pn_v_forms = pn_v_forms.fillna("")
-    formparts = []
-
-    def add_formparts(rec):
-        for idx, wfid in enumerate(rec["Wordform_ID"].split(",")):
-            formparts.append(
-                {
-                    "ID": f'{rec["ID"]}-{idx}',
-                    "Form_ID": rec["ID"],
-                    "Wordform_ID": wfid,
-                    "Index": idx,
-                }
-            )
-
-    # pn_v_forms.apply(add_formparts, axis=1)
-    # df.formparts = formparts
-    df.forms = pn_v_forms
-
-    # pn_v_infl = cread(
-    #     "/home/florianm/Dropbox/research/cariban/yawarana/corpus/annotation/output/inflections.csv"
-    # )
-
-    def resolve_wf_data(rec):
-        partcands = df.wordformparts[
-            (df.wordformparts["Wordform_ID"] == rec["Wordform_ID"])
-            & (df.wordformparts["Index"] == rec["Part_Index"])
-        ]
-        stemcands = df.wordformstems[
-            (df.wordformstems["Wordform_ID"] == rec["Lexeme_Wordform"])
-        ]
-        if len(partcands) == 1:
-            wfpart = partcands.iloc[0]["ID"]
-        else:
-            wfpart = ""
-            # print("part", rec["Wordform_ID"])
-        if len(stemcands) == 1:
-            wfstem = stemcands.iloc[0]["Stem_ID"]
-        else:
-            wfstem = ""
-            # print("stem", rec["Lexeme_Wordform"])
-        rec["Stem_ID"] = wfstem
-        rec["Wordformpart_ID"] = [wfpart]
-        return rec
-
-    # df.pnvinfl = pn_v_infl.apply(resolve_wf_data, axis=1)
-    # df.pnvinfl = df.pnvinfl[df.pnvinfl["Stem_ID"] != ""]
-    df.inflections = pd.DataFrame.from_dict(df.inflections)
 
-    # combine dataframes
-    df.derivations = pd.DataFrame.from_dict(derivations.values())
-    df.derivations.fillna("", inplace=True)
-    df.stemparts = pd.DataFrame.from_dict(stemparts)
-
-    df.stemparts["Gloss_ID"] = df.stemparts["Gloss"].apply(id_glosses)
-    splitcol(df.derivations, "Stempart_IDs")
-    join_dfs("morphs", "morphs", "bound_root_morphs")
-    join_dfs("morphemes", "morphemes", "bound_roots")
-    # join_dfs("inflections", "inflections", "pnvinfl")
-    splitcol(df.morphemes, "Tags", sep=",")
-
-    df.productive_lexemes = pd.DataFrame.from_dict(productive_lexemes.values())
-    df.productive_lexemes["Language_ID"] = "yab"
-    join_dfs("lexemes", "lexemes", "productive_lexemes")
+## Media (& refs)
+@pipeline.stage(
+    requires=["dictionary_wordforms", "examples"], provides=["media", "examples"]
+)
+def media(ctx):
+    ctx.media = ctx.wf_audios + ctx.ex_audios
+    examples = ctx.examples.df
+    examples["Media_ID"] = examples["ID"].where(
+        examples["ID"].isin(set(ctx.examples_with_audio)), ""
+    )
 
-    df.productive_stems = pd.DataFrame.from_dict(productive_stems.values())
-    df.productive_stems["Language_ID"] = "yab"
 
-    join_dfs("stems", "stems", "productive_stems")
-    df.stems.rename(columns={"POS": "Part_Of_Speech"}, inplace=True)
+@pipeline.stage(
+    files=["etc/refs.json", "etc/car.bib", "etc/misc.bib"], provides=["sources"]
+)
+def bibliography(ctx):
+    from bibliography import load_sources
 
-    df.examples["Media_ID"] = df.examples.apply(
-        lambda x: x["ID"] if x["ID"] in examples_with_audio else "", axis=1
+    # only the referenced entries of the shared Cariban bibliography
+    found_refs = jsonlib.load("etc/refs.json")
+    ctx.sources = load_sources(
+        [("etc/car.bib", found_refs), ("etc/misc.bib", None)], cache=ctx.use_cache
     )
 
-    df.lexemes.rename(columns={"POS": "Part_Of_Speech"}, inplace=True)
-    df.morphs["Segments"] = df.morphs["Form"].apply(strip_form).apply(tokenize)
 
-    df.derivationalprocesses = cread("etc/derivationalprocesses.csv")
-    df.derivationalprocesses["Language_ID"] = "yab"
+@pipeline.stage(
+    files=[
+        f"etc/{x}.csv"
+        for x in [
+            "derivationalprocesses",
+            "pos",
+            "contributors",
+            "values",
+            "categories",
+            "phonemes",
+        ]
+    ],
+    provides=[
+        "derivationalprocesses",
+        "partsofspeech",
+        "contributors",
+        "inflectionalvalues",
+        "inflectionalcategories",
+        "phonemes",
+        "languages",
+    ],
+)
+def etc_tables(ctx):
+    ctx.derivationalprocesses = cread("etc/derivationalprocesses.csv")
+    ctx.derivationalprocesses["Language_ID"] = "yab"
 
     ## POS
-    df.partsofspeech = cread("etc/pos.csv")
-    df.partsofspeech["Language_ID"] = "yab"
-    ## Texts
+    ctx.partsofspeech = cread("etc/pos.csv")
+    ctx.partsofspeech["Language_ID"] = "yab"
     ## Contributors
-    df.contributors = cread("etc/contributors.csv")
-    df.contributors["Name"] = df.contributors.apply(
+    ctx.contributors = cread("etc/contributors.csv")
+    ctx.contributors["Name"] = ctx.contributors.apply(
         lambda x: x["First"] + " " + x["Given"], axis=1
     )
-    ## Inflection
-    values = cread("etc/values.csv")
-    values["Gloss_ID"] = values["Gloss"].apply(lambda x: id_glosses(x, sep=""))
-    df.inflectionalvalues = values
-    df.inflectionalcategories = cread("etc/categories.csv")
-    ## Media (& refs)
-    df.media = wf_audios + ex_audios
+    ## Inflection; gloss IDs are assigned when writing, after all other glosses
+    ctx.inflectionalvalues = cread("etc/values.csv")
+    ctx.inflectionalcategories = cread("etc/categories.csv")
 
+    phonemes = cread("etc/phonemes.csv")
     phonemes["Language_ID"] = "yab"
-    df.phonemes = phonemes.rename(columns={"IPA": "Name"})
+    ctx.phonemes = phonemes.rename(columns={"IPA": "Name"})
     ## Tags?
-    df.languages = [
+    ctx.languages = [
         {
             "ID": "yab",
             "Name": "Yawarana",
@@ -1162,12 +1515,120 @@ def create(full=False):
         }
     ]
 
-    df.glosses = [
+
+# combine the stage results into the tables to be written, in writing order
+def get_tables(ctx):
+    import pandas as pd
+
+    tables = {}
+
+    # combine dataframes
+    morphs = pd.concat([ctx.morphs, ctx.bound_root_morphs]).fillna("")
+    morphemes = pd.concat([ctx.morphemes, ctx.bound_roots]).fillna("")
+    # df.inflections = pd.concat([df.inflections, df.pnvinfl]).fillna("")
+    splitcol(morphemes, "Tags", sep=",")
+
+    productive_lexemes = pd.DataFrame.from_dict(ctx.productive_lexemes.values())
+    productive_lexemes["Language_ID"] = "yab"
+    lexemes = pd.concat([ctx.lexemes, productive_lexemes]).fillna("")
+
+    productive_stems = pd.DataFrame.from_dict(ctx.productive_stems.values())
+    productive_stems["Language_ID"] = "yab"
+    stems = pd.concat([ctx.stems, productive_stems]).fillna("")
+    stems.rename(columns={"POS": "Part_Of_Speech"}, inplace=True)
+
+    lexemes.rename(columns={"POS": "Part_Of_Speech"}, inplace=True)
+    morphs["Segments"] = get_tokenizer().tokenize_series(
+        morphs["Form"].apply(strip_form)
+    )
+
+    tables["stems"] = stems
+    tables["morphs"] = morphs
+    tables["morphemes"] = morphemes
+    tables["lexemes"] = lexemes
+    tables["speakers"] = ctx.speakers
+    tables["examples"] = ctx.examples
+
+    found_texts = set(ctx.examples.df["Text_ID"])
+    tables["texts"] = []
+    for text_id, text_data in ctx.texts.items():
+        if text_id not in found_texts:
+            continue
+        metadata = {x: text_data[x] for x in ["genre", "tags"] if x in text_data}
+        tables["texts"].append(
+            {
+                "ID": text_id,
+                "Name": text_data["title_es"],
+                "Description": text_data["summary"],
+                "Comment": "; ".join(text_data.get("comments", [])),
+                "Type": text_data["genre"],
+                "Metadata": metadata,
+            }
+        )
+
+    tables["wordforms"] = [wf.to_dict() for wf in ctx.wf_dict.values()]
+    tables["wordformstems"] = ctx.wf_stems.to_frame()
+    tables["wordformparts"] = ctx.wf_morphs.to_frame()
+    # pn_v_infl = cread(
+    #     "/home/florianm/Dropbox/research/cariban/yawarana/corpus/annotation/output/inflections.csv"
+    # )
+    # df.pnvinfl = pn_v_infl.apply(
+    #     lambda x: resolve_wf_data(tables["wordformparts"], tables["wordformstems"], x), axis=1
+    # )
+    # df.pnvinfl = df.pnvinfl[df.pnvinfl["Stem_ID"] != ""]
+    tables["inflections"] = ctx.inflections.to_frame()
+    # the example parts are decoded row by row when they are checked and written
+    tables["exampleparts"] = ctx.exampleparts
+    tables["forms"] = ctx.forms
+
+    derivations = pd.DataFrame.from_dict(ctx.derivations.values())
+    derivations.fillna("", inplace=True)
+    stemparts = ctx.stemparts.to_frame()
+    stemparts["Gloss_ID"] = stemparts["Gloss"].apply(id_glosses)
+    splitcol(derivations, "Stempart_IDs")
+    tables["derivations"] = derivations
+    tables["stemparts"] = stemparts
+
+    tables["derivationalprocesses"] = ctx.derivationalprocesses
+    tables["partsofspeech"] = ctx.partsofspeech
+    tables["contributors"] = ctx.contributors
+    values = ctx.inflectionalvalues.copy()
+    values["Gloss_ID"] = values["Gloss"].apply(lambda x: id_glosses(x, sep=""))
+    tables["inflectionalvalues"] = values
+    tables["inflectionalcategories"] = ctx.inflectionalcategories
+    tables["media"] = ctx.media
+    tables["phonemes"] = ctx.phonemes
+    tables["languages"] = ctx.languages
+
+    tables["glosses"] = [
         {"ID": gloss_id, "Name": gloss}
         for gloss, gloss_id in get_values("glosses").items()
     ]
-    ## Compile: meanings
-    # Writing the CLDF dataset
+    return tables
+
+
+# the rows of a table, one at a time; DataFrames are not copied into records first,
+# and lists, CodedTables and SplitTables are iterated as they are
+def iter_records(data):
+    import pandas as pd
+
+    if not isinstance(data, pd.DataFrame):
+        yield from data
+        return
+    columns = list(data.columns)
+    for row in data.itertuples(index=False, name=None):
+        yield dict(zip(columns, row))
+
+
+def add_schema(cldf, tables):
+    # add components and columns for the tables to cldf (a pycldf Dataset)
+    # returns the component (URL or CLDF name) of every table, in writing order
+    from cldf_ldd import add_columns, add_keys
+    from cldf_ldd.components import tables as ldd_tables
+    from pycldf.dataset import MD_SUFFIX
+    from pycldf.util import pkg_path
+    from pylingdocs.cldf import tables as pld_tables
+
     cldf_names = {}
     for component_filename in pkg_path("components").iterdir():
         component = jsonlib.load(component_filename)
@@ -1196,9 +1657,79 @@ def create(full=False):
         ],
         "morphemes": [{"name": "Tags", "datatype": "string", "separator": ","}]
     }
-    spec = CLDFSpec(dir="cldf", module="Generic", metadata_fname="metadata.json")
-    if full:
-        spec = CLDFSpec(dir="full", module="Generic", metadata_fname="metadata.json")
+    components = {}
+    for table in ldd_tables + pld_tables:
+        handle = table["url"].replace(".csv", "")
+        if handle in tables:
+            cldf.add_component(table)
+            for col in additional_columns.get(handle, []):
+                cldf.add_columns(table["url"], col)
+            components[handle] = table["url"]
+
+    # now only native CLDF components should be left over
+    for handle in tables:  # examples.csv
+        if handle in components:
+            continue
+        if handle not in cldf_names:
+            log.warning(f"Leftover dataframe {handle}")
+            continue
+        cldf.add_component(cldf_names[handle])
+        for col in additional_columns.get(handle, []):
+            cldf.add_columns(cldf_names[handle], col)
+        components[handle] = cldf_names[handle]
+
+    add_columns(cldf)
+    add_keys(cldf)
+    return components
+
+
+## Compile: meanings
+# Writing the CLDF dataset
+@pipeline.stage(
+    requires=[
+        "roots",
+        "derivations",
+        "speakers",
+        "dictionary_wordforms",
+        "examples",
+        "texts",
+        "media",
+        "bibliography",
+        "etc_tables",
+    ],
+    files=["etc/description.md", "etc/foreign_keys.csv"],
+    outputs=lambda ctx: [ctx.out_dir],
+)
+def writing(ctx):
+    from cldfbench import CLDFSpec
+    from cldfbench.cldf import CLDFWriter
+    from pycldf import Generic
+
+    from bibliography import make_sources
+    from columnar import write_columnar
+    from consistency_check import check as check_consistency
+    from integrity import check_integrity
+    from validation import validate
+
+    tables = get_tables(ctx)
+    # check the tables against the schema before writing anything
+    schema = Generic.in_dir(ctx.out_dir)
+    components = add_schema(schema, tables)
+    fkeys = cread("etc/foreign_keys.csv")
+    if not check_integrity(
+        schema,
+        {schema[c].url.string: tables[handle] for handle, c in components.items()},
+        extra_keys=fkeys.itertuples(index=False, name=None),
+        log=log,
+    ):
+        raise ValueError("The tables have broken references or malformed cells")
+    # unmerged variants and duplicates
+    for finding in check_consistency(tables):
+        log.warning(finding)
+
+    spec = CLDFSpec(dir=ctx.out_dir, module="Generic", metadata_fname="metadata.json")
+    # the writer gets row iterators instead of lists: when the writer is closed,
+    # every table is streamed to its CSV file on its own, then the metadata is written
     with CLDFWriter(spec) as writer:
         # metadata
 
@@ -1216,46 +1747,17 @@ def create(full=False):
             open("etc/description.md", "r").read(),
         )
 
-        tables = vars(df)
-        for table in ldd_tables + pld_tables:
-            handle = table["url"].replace(".csv", "")
-            if handle in tables:
-                log.debug(f"Writing {handle}")
-                writer.cldf.add_component(table)
-                for col in additional_columns.get(handle, []):
-                    writer.cldf.add_columns(table["url"], col)
-                data = tables.pop(handle)
-                if not isinstance(data, list):
-                    data = data.to_dict("records")
-                for rec in data:
-                    writer.objects[table["url"]].append(rec)
-
-        # now only native CLDF components should be left over
-        for handle, data in tables.items():  # examples.csv
-            if handle not in cldf_names:
-                log.warning(f"Leftover dataframe {handle}")
-                continue
-            writer.cldf.add_component(cldf_names[handle])
-            for col in additional_columns.get(handle, []):
-                writer.cldf.add_columns(cldf_names[handle], col)
-            if not isinstance(data, list):
-                data = data.to_dict("records")
-            for rec in data:
-                writer.objects[cldf_names[handle]].append(rec)
-
-        add_columns(writer.cldf)
-        found_refs = jsonlib.load("etc/refs.json")
-        bib = pybtex.database.parse_file("etc/car.bib", bib_format="bibtex")
-        car_sources = [
-            Source.from_entry(k, e) for k, e in bib.entries.items() if k in found_refs
-        ]
-        bib2 = pybtex.database.parse_file("etc/misc.bib", bib_format="bibtex")
-        misc_sources = [Source.from_entry(k, e) for k, e in bib2.entries.items()]
-        writer.cldf.add_sources(*car_sources)
-        writer.cldf.add_sources(*misc_sources)
-
+        for handle, component in add_schema(writer.cldf, tables).items():
+            log.debug(f"Writing {handle}")
+            writer.objects[component] = iter_records(tables[handle])
+        writer.cldf.add_sources(*make_sources(ctx.sources))
         ds = writer.cldf
-        add_keys(ds)
+
+    # Parquet and Arrow copies of the tables, for faster loading
+    try:
+        write_columnar(ds)
+    except ImportError:
+        log.warning("pyarrow is not installed, the tables are only written as CSV")
 
     # # use cffconvert to easily create citation string for CLDF metadata
     # # todo: fix and use this for repo
@@ -1270,5 +1772,112 @@ def create(full=False):
     #     citation = f.read().strip()
     # log.info(f"Citation: {citation}")
 
-    ds.validate(log=log)
-    sys.exit()
+    # an invalid dataset is not cached; unchanged tables are not validated again
+    return validate(ds, log=log, processes=ctx.processes, cache=ctx.use_cache)
+
+
+# the corpus statistics are written next to the dataset, e.g. to cldf_stats
+def stats_dir(ctx):
+    out_dir = Path(ctx.out_dir)
+    return out_dir.with_name(f"{out_dir.name}_stats")
+
+
+# Corpus statistics, from the written tables
+@pipeline.stage(requires=["writing"], outputs=lambda ctx: [stats_dir(ctx)])
+def statistics(ctx):
+    # scipy is only needed here
+    try:
+        from corpus_stats import corpus_statistics, write_statistics
+    except ImportError:
+        log.warning("scipy is not installed, no corpus statistics are written")
+        return False
+    write_statistics(corpus_statistics(ctx.out_dir), stats_dir(ctx))
+
+
+# the rendered grammar chapters are written next to the dataset, e.g. to cldf_docs
+def docs_dir(ctx):
+    out_dir = Path(ctx.out_dir)
+    return out_dir.with_name(f"{out_dir.name}_docs")
+
+
+def chapter_files(ctx):
+    from chapters import DOCS_DIR
+
+    return sorted(DOCS_DIR.glob("*.txt"))
+
+
+# Grammar chapters, with the cited rows of the written tables; see chapters.py
+@pipeline.stage(
+    requires=["writing"],
+    files=chapter_files,
+    outputs=lambda ctx: [docs_dir(ctx)],
+)
+def chapters(ctx):
+    from chapters import render_chapters
+
+    render_chapters(
+        ctx.out_dir, docs_dir(ctx), processes=ctx.processes, cache=ctx.use_cache
+    )
+
+
+# only: run just these stages; start: run this stage and everything after it
+# stages that are not run are loaded from the cache
+# processes: analyze the example wordforms and validate the tables in this many processes
+# examples_file, out_dir: instead of the corpus files and output directory for (not) full
+# observer: wraps every stage run, see Pipeline.run
+# profile: write a JSON profile of the build (to this path, if it is not True); with
+# cprofile, also cProfile statistics, and with trace_memory, traced Python allocations
+# (both run the stages one at a time)
+# sqlite: also write an SQLite database of the dataset (to <out_dir>.sqlite, or this path)
+def create(
+    full=False,
+    use_cache=True,
+    only=None,
+    start=None,
+    workers=4,
+    processes=1,
+    examples_file=None,
+    out_dir=None,
+    observer=None,
+    profile=None,
+    cprofile=False,
+    trace_memory=False,
+    sqlite=None,
+):
+    ctx = SimpleNamespace(
+        full=full,
+        processes=processes,
+        use_cache=use_cache,
+        out_dir=out_dir or ("full" if full else "cldf"),
+        examples_file=examples_file
+        or ("raw/full_examples.csv" if full else "raw/examples.csv"),
+    )
+    cache = StageCache(CACHE_DIR / ctx.out_dir, enabled=use_cache)
+    profiler = None
+    if profile or cprofile or trace_memory:
+        from profiling import Profiler, combine
+
+        profiler = Profiler(memory=trace_memory, cprofile=cprofile)
+        observer = combine(observer, profiler.stage)
+        if cprofile or trace_memory:
+            # only one cProfile profiler can be active (Python 3.12+), and the traced
+            # peaks are process-wide, so the stages run one at a time
+            workers = 1
+    pipeline.run(
+        ctx, cache, only=only, start=start, workers=workers, observer=observer
+    )
+    if profiler:
+        profiler.write(
+            None if profile in [None, True] else profile, name=Path(ctx.out_dir).name
+        )
+    if sqlite:
+        from pycldf import Dataset
+
+        from database import write_database
+
+        out_dir = Path(ctx.out_dir)
+        write_database(
+            Dataset.from_metadata(out_dir / "metadata.json"),
+            out_dir.with_name(f"{out_dir.name}.sqlite") if sqlite is True else sqlite,
+        )
+    return ctx
@@ -0,0 +1,133 @@
+# A columnar mirror of the written dataset, which loads much faster than the CSVs
+# every table is written as Parquet (<out_dir>/parquet/<table>.parquet) and as an Arrow
+# IPC file (<out_dir>/arrow/<table>.arrow), which can be memory-mapped, e.g. with
+# pyarrow.ipc.open_file(pyarrow.memory_map(path)).read_all(). Values are those pycldf
+# reads from the CSVs: list-valued columns are lists (empty cells empty lists), other
+# empty cells are null; but decimals are floats, and JSON and URI columns strings.
+# Columns referencing other tables are dictionary-encoded.
+import logging
+from pathlib import Path
+
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+FORMATS = ["parquet", "arrow"]
+# XSD datatypes (csvw datatype bases) with Arrow counterparts, all else is a string
+INTEGER_TYPES = {
+    "integer",
+    "int",
+    "long",
+    "short",
+    "byte",
+    "nonNegativeInteger",
+    "positiveInteger",
+    "nonPositiveInteger",
+    "negativeInteger",
+    "unsignedLong",
+    "unsignedInt",
+    "unsignedShort",
+    "unsignedByte",
+}
+FLOAT_TYPES = {"decimal", "double", "float", "number"}
+BOOLEAN_TYPES = {"boolean"}
+
+
+def datatype(col):
+    return col.datatype.base if col.datatype else "string"
+
+
+def reference_columns(table):
+    # single columns of foreign keys
+    return {
+        fk.columnReference[0]
+        for fk in table.tableSchema.foreignKeys
+        if len(fk.columnReference) == 1
+    }
+
+
+def converter(col):
+    base = datatype(col)
+    if base in INTEGER_TYPES:
+        return int
+    if base in FLOAT_TYPES:
+        return float
+    if base in BOOLEAN_TYPES:
+        return lambda x: x.lower() in ["true", "1"]
+    return str
+
+
+def column_values(col, cells):
+    # the values of the raw CSV cells, as pycldf would read them
+    convert = converter(col)
+    if col.separator:
+        return [
+            [convert(x) if x else None for x in cell.split(col.separator)]
+            if cell
+            else []
+            for cell in cells
+        ]
+    return [convert(cell) if cell else None for cell in cells]
+
+
+def arrow_type(col, dictionary=False):
+    import pyarrow as pa
+
+    base = datatype(col)
+    if base in INTEGER_TYPES:
+        value_type = pa.int64()
+    elif base in FLOAT_TYPES:
+        value_type = pa.float64()
+    elif base in BOOLEAN_TYPES:
+        value_type = pa.bool_()
+    elif dictionary:
+        value_type = pa.dictionary(pa.int32(), pa.string())
+    else:
+        value_type = pa.string()
+    if col.separator:
+        return pa.list_(value_type)
+    return value_type
+
+
+def to_arrow(ds, table):
+    # the written CSV of a table (a pycldf table) as a pyarrow Table
+    import pyarrow as pa
+
+    path = Path(ds.directory) / table.url.string
+    df = pd.read_csv(path, dtype=str, keep_default_na=False, encoding="utf-8")
+    references = reference_columns(table)
+    fields, arrays = [], []
+    for col in table.tableSchema.columns:
+        if col.name not in df.columns:
+            continue
+        field = pa.field(
+            col.name, arrow_type(col, dictionary=col.name in references)
+        )
+        fields.append(field)
+        arrays.append(pa.array(column_values(col, df[col.name]), type=field.type))
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+
+def write_columnar(ds, formats=FORMATS):
+    # writes the mirror of every table of ds (a written pycldf Dataset); returns the paths
+    import pyarrow.parquet as pq
+    from pyarrow import ipc
+
+    res = []
+    for fmt in formats:
+        (Path(ds.directory) / fmt).mkdir(exist_ok=True)
+    for table in ds.tables:
+        data = to_arrow(ds, table)
+        name = Path(table.url.string).stem
+        for fmt in formats:
+            path = Path(ds.directory) / fmt / f"{name}.{fmt}"
+            if fmt == "parquet":
+                pq.write_table(data, path)
+            elif fmt == "arrow":
+                with ipc.new_file(path, data.schema) as writer:
+                    writer.write_table(data)
+            else:
+                raise ValueError(f"Unknown format {fmt}")
+            res.append(path)
+    log.info(f"Wrote {len(ds.tables)} tables as {', '.join(formats)}")
+    return res
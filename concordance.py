@@ -0,0 +1,233 @@
+# A concordance of the examples: which morphs, stems, inflectional values etc. occur where
+# every wordform token in the examples (exampleparts) gets a position; positions of an
+# example are consecutive, in the order of the tokens. The postings of a term are the
+# sorted positions of the tokens it occurs in, as an int32 array. Terms are written
+# kind:ID, with these kinds:
+#   wordform, morph, morpheme, gloss, stem, lexeme, value (inflectional values)
+# Queries combine terms with AND (or just a space), OR, NOT and parentheses, on the
+# level of examples; term+term matches consecutive tokens, e.g.
+#   "stem:sane-mother AND NOT value:pert" or "morph:keprop+lexeme:jra-neg"
+import re
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+KINDS = ["wordform", "morph", "morpheme", "gloss", "stem", "lexeme", "value"]
+CONTEXT = 5  # words to the left and the right in KWIC lines
+TOKEN = re.compile(r"\(|\)|[^\s()]+")
+
+
+def read_table(cldf_dir, name, columns):
+    path = Path(cldf_dir) / f"{name}.csv"
+    if not path.is_file():
+        return pd.DataFrame(columns=columns)
+    return pd.read_csv(path, dtype=str, keep_default_na=False, usecols=columns)
+
+
+def explode(df, col, sep):
+    # rows for the items of a list-valued column
+    df = df.assign(**{col: df[col].str.split(sep)}).explode(col)
+    return df[df[col] != ""]
+
+
+def postings(pairs, tokens):
+    # pairs: DataFrame with Key and Wordform_ID; tokens: Wordform_ID and Position
+    # returns key -> sorted unique positions of the wordforms of the key
+    hits = pairs.merge(tokens, on="Wordform_ID")[["Key", "Position"]]
+    hits = hits.drop_duplicates().sort_values(["Key", "Position"])
+    keys, starts = np.unique(hits["Key"].to_numpy(), return_index=True)
+    positions = hits["Position"].to_numpy(dtype=np.int32)
+    return dict(zip(keys, np.split(positions, starts[1:])))
+
+
+class Concordance:
+    def __init__(self, cldf_dir="cldf"):
+        examples = read_table(cldf_dir, "examples", ["ID", "Translated_Text"])
+        parts = read_table(
+            cldf_dir, "exampleparts", ["Example_ID", "Wordform_ID", "Index"]
+        )
+        wordforms = read_table(cldf_dir, "wordforms", ["ID", "Form"])
+        wf_parts = read_table(
+            cldf_dir, "wordformparts", ["ID", "Wordform_ID", "Morph_ID", "Gloss_ID"]
+        )
+        wf_stems = read_table(cldf_dir, "wordformstems", ["Wordform_ID", "Stem_ID"])
+        morphs = read_table(cldf_dir, "morphs", ["ID", "Morpheme_ID"])
+        stems = read_table(cldf_dir, "stems", ["ID", "Lexeme_ID"])
+        inflections = read_table(cldf_dir, "inflections", ["Value_ID", "Wordformpart_ID"])
+
+        # token positions, example by example
+        self.example_ids = examples["ID"].to_numpy()
+        self.translations = examples["Translated_Text"].to_numpy()
+        example_idx = pd.Series(np.arange(len(examples)), index=examples["ID"])
+        parts = parts[parts["Example_ID"].isin(example_idx.index)].copy()
+        parts["Example"] = example_idx[parts["Example_ID"]].to_numpy()
+        parts["Index"] = parts["Index"].astype(int)
+        parts = parts.sort_values(["Example", "Index"], ignore_index=True)
+        parts["Position"] = np.arange(len(parts), dtype=np.int32)
+        self.token_example = parts["Example"].to_numpy(dtype=np.int32)
+        forms = dict(zip(wordforms["ID"], wordforms["Form"]))
+        self.token_form = parts["Wordform_ID"].map(forms).fillna("").to_numpy()
+        # the first position of every example, and one past the last
+        self.example_start = np.searchsorted(
+            self.token_example, np.arange(len(examples) + 1)
+        )
+        tokens = parts[["Wordform_ID", "Position"]]
+
+        # the wordforms every term occurs in
+        morph_parts = wf_parts.merge(
+            morphs.rename(columns={"ID": "Morph_ID"}), on="Morph_ID", how="left"
+        )
+        stem_wfs = wf_stems.merge(
+            stems.rename(columns={"ID": "Stem_ID"}), on="Stem_ID", how="left"
+        )
+        values = explode(inflections, "Wordformpart_ID", ",").merge(
+            wf_parts.rename(columns={"ID": "Wordformpart_ID"}), on="Wordformpart_ID"
+        )
+        pairs = {
+            "wordform": wordforms.rename(columns={"ID": "Key"}).assign(
+                Wordform_ID=wordforms["ID"]
+            ),
+            "morph": morph_parts.rename(columns={"Morph_ID": "Key"}),
+            "morpheme": morph_parts.rename(columns={"Morpheme_ID": "Key"}),
+            "gloss": explode(wf_parts, "Gloss_ID", ",").rename(columns={"Gloss_ID": "Key"}),
+            "stem": stem_wfs.rename(columns={"Stem_ID": "Key"}),
+            "lexeme": stem_wfs.rename(columns={"Lexeme_ID": "Key"}),
+            "value": values.rename(columns={"Value_ID": "Key"}),
+        }
+        self.postings = {
+            kind: postings(
+                pairs[kind][["Key", "Wordform_ID"]].dropna().drop_duplicates(), tokens
+            )
+            for kind in KINDS
+        }
+
+    def positions(self, term):
+        # the positions of a term (kind:ID)
+        kind, _, key = term.partition(":")
+        if kind not in self.postings:
+            raise ValueError(f"Unknown term {term}, use one of {', '.join(KINDS)}:ID")
+        return self.postings[kind].get(key, np.array([], dtype=np.int32))
+
+    def sequence(self, terms, gap=0):
+        # (start, end) positions of the terms in this order, at most gap tokens apart
+        # (within an example)
+        starts = ends = self.positions(terms[0])
+        for term in terms[1:]:
+            following = self.positions(term)
+            new_starts, new_ends = [], []
+            for dist in range(1, gap + 2):
+                found = np.isin(ends + dist, following)
+                new_starts.append(starts[found])
+                new_ends.append(ends[found] + dist)
+            starts, ends = np.concatenate(new_starts), np.concatenate(new_ends)
+            same = self.token_example[starts] == self.token_example[ends]
+            starts, ends = starts[same], ends[same]
+        hits = np.unique(np.stack([starts, ends], axis=1), axis=0)
+        return hits.reshape(-1, 2).astype(np.int32)
+
+    def parse(self, query):
+        # a tree of (operator, operands) tuples; terms are ("TERMS", [term, ...])
+        tokens = TOKEN.findall(query)
+        if not tokens:
+            raise ValueError("Empty query")
+        state = SimpleNamespace(pos=0)
+
+        def peek():
+            return tokens[state.pos] if state.pos < len(tokens) else None
+
+        def take():
+            state.pos += 1
+            return tokens[state.pos - 1]
+
+        def expression():
+            res = conjunction()
+            while peek() == "OR":
+                take()
+                res = ("OR", res, conjunction())
+            return res
+
+        def conjunction():
+            res = negation()
+            while peek() not in [None, "OR", ")"]:
+                if peek() == "AND":
+                    take()
+                res = ("AND", res, negation())
+            return res
+
+        def negation():
+            if peek() == "NOT":
+                take()
+                return ("NOT", negation())
+            if peek() == "(":
+                take()
+                res = expression()
+                if peek() != ")":
+                    raise ValueError(f"Missing ) in {query}")
+                take()
+                return res
+            if peek() in [None, ")", "AND", "OR"]:
+                raise ValueError(f"Expected a term in {query}")
+            return ("TERMS", take().split("+"))
+
+        res = expression()
+        if peek() is not None:
+            raise ValueError(f"Unexpected {peek()} in {query}")
+        return res
+
+    def evaluate(self, node, gap=0):
+        # returns the matching example indices and the (start, end) hits in them
+        if node[0] == "TERMS":
+            hits = self.sequence(node[1], gap=gap)
+            return np.unique(self.token_example[hits[:, 0]]), hits
+        if node[0] == "NOT":
+            examples, _ = self.evaluate(node[1], gap)
+            rest = np.setdiff1d(np.arange(len(self.example_ids)), examples)
+            return rest, np.empty((0, 2), dtype=np.int32)
+        left, left_hits = self.evaluate(node[1], gap)
+        right, right_hits = self.evaluate(node[2], gap)
+        if node[0] == "AND":
+            examples = np.intersect1d(left, right)
+        else:
+            examples = np.union1d(left, right)
+        hits = np.concatenate([left_hits, right_hits])
+        hits = hits[np.isin(self.token_example[hits[:, 0]], examples)]
+        return examples, np.unique(hits, axis=0).reshape(-1, 2)
+
+    def examples(self, query, gap=0):
+        # the IDs of the examples matching the query
+        examples, _ = self.evaluate(self.parse(query), gap)
+        return list(self.example_ids[examples])
+
+    def kwic(self, query, context=CONTEXT, gap=0):
+        # keyword-in-context lines for the hits of the query, in order of the examples
+        _, hits = self.evaluate(self.parse(query), gap)
+        rows = []
+        for start, end in hits:
+            example = self.token_example[start]
+            first, last = self.example_start[example], self.example_start[example + 1]
+            rows.append(
+                {
+                    "Example_ID": self.example_ids[example],
+                    "Left": " ".join(self.token_form[max(first, start - context) : start]),
+                    "Keyword": " ".join(self.token_form[start : end + 1]),
+                    "Right": " ".join(self.token_form[end + 1 : min(last, end + 1 + context)]),
+                    "Translated_Text": self.translations[example],
+                }
+            )
+        return pd.DataFrame(
+            rows, columns=["Example_ID", "Left", "Keyword", "Right", "Translated_Text"]
+        )
+
+
+def format_kwic(lines):
+    # aligned on the keywords
+    if len(lines) == 0:
+        return ""
+    width = lines["Left"].str.len().max()
+    key_width = lines["Keyword"].str.len().max()
+    return "\n".join(
+        f"{row.Example_ID}\t{row.Left:>{width}}  {row.Keyword:<{key_width}}  {row.Right}"
+        for row in lines.itertuples()
+    )
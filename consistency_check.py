@@ -1,19 +1,21 @@
-import pandas as pd
-from pathlib import Path
-from writio import load
-from itertools import combinations
+import bisect
+from collections import defaultdict
 
+import pandas as pd
 
 # yawarana-specific formal alternations
 reduced = ["j", "n"]
 vowels = "aeiouïë"
+# variation in vowels is rampant, ignore them altogether
+NEUTRAL_VOWELS = str.maketrans({vowel: "V" for vowel in vowels})
+
+
+def neutralize(form):
+    return form.translate(NEUTRAL_VOWELS)
 
 
 def distance(a, b):
-    # variation in vowels is rampant, ignore them altogether
-    for vowel in vowels:
-        a = a.replace(vowel, "V")
-        b = b.replace(vowel, "V")
+    a, b = neutralize(a), neutralize(b)
     # syllable reduction?
     for x, y in [(a, b), (b, a)]:
         if x[-1] in reduced:
@@ -29,24 +31,99 @@ def distance(a, b):
     return 20
 
 
-# potential variants
-var_cands = ["morphemes", "lexemes"]
-for file in var_cands:
-    df = load(f"cldf/{file}.csv")
+def variant_pairs(names):
+    # the index pairs (i < j) of names with distance 0, in the order of
+    # itertools.combinations; instead of comparing all pairs, the names are grouped by
+    # their normalization keys: the neutralized form itself, the form without
+    # initial y, and forms starting with a reduced form without its final j/n
+    keys = [neutralize(x) for x in names]
+    by_key = defaultdict(list)
+    for idx, key in enumerate(keys):
+        by_key[key].append(idx)
+    ordered = sorted((key, idx) for idx, key in enumerate(keys))
+    pairs = set()
+
+    def add(i, j):
+        if i != j:
+            pairs.add((min(i, j), max(i, j)))
+
+    for idx, key in enumerate(keys):
+        if not key:
+            continue
+        for other in by_key[key]:  # same form
+            add(idx, other)
+        if key[0] == "y":  # y-initial
+            for other in by_key.get(key[1:], []):
+                add(idx, other)
+        if key[-1] in reduced:  # syllable reduction: others starting with the rest
+            prefix = key[:-1]
+            start = bisect.bisect_left(ordered, (prefix,))
+            for other_key, other in ordered[start:]:
+                if not other_key.startswith(prefix):
+                    break
+                add(idx, other)
+    return sorted(pairs)
+
+
+def flatten(value):
+    # in-memory tables have lists where the written ones have "; "-separated strings
+    if isinstance(value, (list, tuple)):
+        return "; ".join(str(x) for x in value)
+    return value
+
+
+def get_cols(df, cols):
+    return pd.DataFrame(
+        {col: df[col].map(flatten) if col in df.columns else "" for col in cols},
+        index=df.index,
+    )
+
+
+def find_variants(df, name):
+    # potential unmerged variants: same meaning, forms with distance 0
+    res = []
+    df = get_cols(df, ["Name", "Parameter_ID", "Part_Of_Speech"])
     dupe_meanings = df[
         df.duplicated(subset=["Parameter_ID", "Part_Of_Speech"], keep=False)
     ]
     for meaning, cands in dupe_meanings.groupby("Parameter_ID"):
-        for a, b in combinations(cands["Name"], 2):
-            dist = distance(a, b)
-            if dist < 3 and dist < len(a):
-                print(f"Unmerged variants in {file}: {a} ~ {b} '{meaning}'")
-
-# potential duplicates
-for file in ["morphs", "stems"]:
-    df = load(f"cldf/{file}.csv")
-    dupes = df[df.duplicated(subset=["Name", "Parameter_ID"], keep=False)]
-    if len(dupes) > 0:
-        print(f"Duplicate {file}:")
-        print(dupes)
-        print("")
+        names = list(cands["Name"])
+        for i, j in variant_pairs(names):
+            if len(names[i]) > 0:
+                res.append(f"Unmerged variants in {name}: {names[i]} ~ {names[j]} '{meaning}'")
+    return res
+
+
+def find_duplicates(df):
+    keys = get_cols(df, ["Name", "Parameter_ID"])
+    return df[keys.duplicated(keep=False)]
+
+
+# tables: table name -> DataFrame, either the in-memory tables (cldf_creator.get_tables)
+# or the written ones; returns the findings
+def check(tables):
+    res = []
+    # potential variants
+    for name in ["morphemes", "lexemes"]:
+        if name in tables:
+            res.extend(find_variants(tables[name], name))
+    # potential duplicates
+    for name in ["morphs", "stems"]:
+        if name in tables:
+            dupes = find_duplicates(tables[name])
+            if len(dupes) > 0:
+                res.append(f"Duplicate {name}:\n{dupes}")
+    return res
+
+
+if __name__ == "__main__":
+    from writio import load
+
+    tables = {
+        name: load(f"cldf/{name}.csv")
+        for name in ["morphemes", "lexemes", "morphs", "stems"]
+    }
+    for finding in check(tables):
+        print(finding)
+        if finding.startswith("Duplicate"):
+            print("")
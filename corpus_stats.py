@@ -0,0 +1,168 @@
+# Corpus statistics of the written dataset, for the sketch grammar
+# token counts of morphs and stems per text and speaker, morph-stem co-occurrences
+# (in the same wordform token) and inflectional values per part of speech. IDs are
+# mapped to integer codes and counted in sparse matrices: wordforms by morphs, stems
+# and values (which are small, as they come from the lexicon) are weighted with the
+# token counts of the wordforms in the texts and speakers.
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from concordance import explode, read_table
+
+log = logging.getLogger(__name__)
+
+
+class Codes:
+    # integer codes for the distinct values of a column
+    def __init__(self, values):
+        self.labels = pd.Index(pd.unique(pd.Series(values, dtype=str)))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __call__(self, values):
+        return self.labels.get_indexer(pd.Series(values, dtype=str))
+
+
+def incidence(rows, cols, row_codes, col_codes):
+    # a sparse count matrix; repeated (row, col) pairs are summed, unknown values dropped
+    rows, cols = row_codes(rows), col_codes(cols)
+    known = (rows >= 0) & (cols >= 0)
+    return sparse.csr_matrix(
+        (np.ones(known.sum(), dtype=np.int64), (rows[known], cols[known])),
+        shape=(len(row_codes), len(col_codes)),
+        dtype=np.int64,
+    )
+
+
+def long_table(matrix, row_codes, col_codes, row_name, col_name):
+    # the nonzero cells of a matrix, most frequent first
+    matrix = matrix.tocoo()
+    df = pd.DataFrame(
+        {
+            row_name: row_codes.labels[matrix.row],
+            col_name: col_codes.labels[matrix.col],
+            "Count": matrix.data,
+        }
+    )
+    df = df[df["Count"] > 0]
+    return df.sort_values(
+        ["Count", row_name, col_name], ascending=[False, True, True], ignore_index=True
+    )
+
+
+def corpus_statistics(cldf_dir="cldf"):
+    # returns table name -> long table of counts
+    examples = read_table(cldf_dir, "examples", ["ID", "Text_ID", "Speaker_ID"])
+    parts = read_table(cldf_dir, "exampleparts", ["Example_ID", "Wordform_ID"])
+    wordforms = read_table(cldf_dir, "wordforms", ["ID", "Part_Of_Speech"])
+    wf_parts = read_table(cldf_dir, "wordformparts", ["ID", "Wordform_ID", "Morph_ID"])
+    wf_stems = read_table(cldf_dir, "wordformstems", ["Wordform_ID", "Stem_ID"])
+    inflections = read_table(cldf_dir, "inflections", ["Value_ID", "Wordformpart_ID"])
+
+    wf_codes = Codes(wordforms["ID"])
+    morph_codes = Codes(wf_parts["Morph_ID"][wf_parts["Morph_ID"] != ""])
+    stem_codes = Codes(wf_stems["Stem_ID"])
+    text_codes = Codes(examples["Text_ID"])
+    speaker_codes = Codes(examples["Speaker_ID"])
+    pos_codes = Codes(wordforms["Part_Of_Speech"])
+
+    # wordforms by morphs and stems: how often a morph (stem) occurs in a wordform
+    wf_morphs = incidence(
+        wf_parts["Wordform_ID"], wf_parts["Morph_ID"], wf_codes, morph_codes
+    )
+    wf_stems = incidence(
+        wf_stems["Wordform_ID"], wf_stems["Stem_ID"], wf_codes, stem_codes
+    )
+    # wordform tokens per text and speaker
+    parts = parts.merge(
+        examples.rename(columns={"ID": "Example_ID"}), on="Example_ID", how="left"
+    )
+    wf_texts = incidence(parts["Wordform_ID"], parts["Text_ID"], wf_codes, text_codes)
+    wf_speakers = incidence(
+        parts["Wordform_ID"], parts["Speaker_ID"], wf_codes, speaker_codes
+    )
+    wf_tokens = np.asarray(wf_texts.sum(axis=1)).ravel()
+    tokens = sparse.diags(wf_tokens, dtype=np.int64)
+    wf_pos = incidence(wordforms["ID"], wordforms["Part_Of_Speech"], wf_codes, pos_codes)
+    # inflectional values by wordform, through the wordform parts
+    values = explode(inflections, "Wordformpart_ID", ",").merge(
+        wf_parts.rename(columns={"ID": "Wordformpart_ID"}), on="Wordformpart_ID"
+    )
+    value_codes = Codes(values["Value_ID"])
+    wf_values = incidence(values["Wordform_ID"], values["Value_ID"], wf_codes, value_codes)
+
+    stats = {
+        "morph_frequencies": pd.DataFrame(
+            {
+                "Morph_ID": morph_codes.labels,
+                "Count": np.asarray((wf_morphs.T @ wf_tokens)).ravel(),
+            }
+        ),
+        "stem_frequencies": pd.DataFrame(
+            {
+                "Stem_ID": stem_codes.labels,
+                "Count": np.asarray((wf_stems.T @ wf_tokens)).ravel(),
+            }
+        ),
+        "morph_texts": long_table(
+            wf_morphs.T @ wf_texts, morph_codes, text_codes, "Morph_ID", "Text_ID"
+        ),
+        "morph_speakers": long_table(
+            wf_morphs.T @ wf_speakers, morph_codes, speaker_codes, "Morph_ID", "Speaker_ID"
+        ),
+        "stem_texts": long_table(
+            wf_stems.T @ wf_texts, stem_codes, text_codes, "Stem_ID", "Text_ID"
+        ),
+        "stem_speakers": long_table(
+            wf_stems.T @ wf_speakers, stem_codes, speaker_codes, "Stem_ID", "Speaker_ID"
+        ),
+        "morph_stems": long_table(
+            wf_morphs.T @ tokens @ wf_stems, morph_codes, stem_codes, "Morph_ID", "Stem_ID"
+        ),
+        "value_pos": long_table(
+            wf_values.T @ tokens @ wf_pos,
+            value_codes,
+            pos_codes,
+            "Value_ID",
+            "Part_Of_Speech",
+        ),
+    }
+    for name in ["morph_frequencies", "stem_frequencies"]:
+        df = stats[name]
+        stats[name] = df[df["Count"] > 0].sort_values(
+            ["Count", df.columns[0]], ascending=[False, True], ignore_index=True
+        )
+    return stats
+
+
+def write_statistics(stats, path):
+    # one Parquet file per table (CSV without pyarrow) and a JSON summary
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    try:
+        import pyarrow  # noqa: F401
+
+        suffix = "parquet"
+    except ImportError:
+        suffix = "csv"
+    summary = {}
+    for name, df in stats.items():
+        if suffix == "parquet":
+            df.to_parquet(path / f"{name}.parquet", index=False)
+        else:
+            df.to_csv(path / f"{name}.csv", index=False)
+        summary[name] = {
+            "file": f"{name}.{suffix}",
+            "rows": len(df),
+            "total": int(df["Count"].sum()),
+        }
+    with open(path / "statistics.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    log.info(f"Wrote corpus statistics to {path}")
+    return path
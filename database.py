@@ -0,0 +1,114 @@
+# An SQLite database of the written dataset, for corpus queries
+# the tables are those of `cldf createdb` (pycldf.db), inserted in one transaction,
+# plus an index on every foreign key column (SQLite does not index them by itself) and
+# FTS5 full-text tables for the text columns in FULLTEXT, e.g.
+# SELECT ID FROM translations_fts WHERE translations_fts MATCH 'Translated_Text: fish'
+# which also finds "fished", as the translations are stemmed (irregular forms like
+# "grew" are not reduced to "grow", though)
+import logging
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+# diacritics are distinctive in Yawarana (e and ë), so they are kept
+FTS_TOKENIZER = "unicode61 remove_diacritics 0"
+# the English and Spanish translations are also stemmed (the Porter stemmer is for
+# English, but it only strips common suffixes)
+STEMMING_TOKENIZER = f"porter {FTS_TOKENIZER}"
+# name -> table URL, columns indexed for full-text search and their tokenizer;
+# the FTS5 table is <name>_fts
+FULLTEXT = {
+    "examples": ("examples.csv", ["Primary_Text", "Gloss"], FTS_TOKENIZER),
+    "translations": (
+        "examples.csv",
+        ["Translated_Text", "Original_Translation"],
+        STEMMING_TOKENIZER,
+    ),
+    "glosses": ("glosses.csv", ["Name"], FTS_TOKENIZER),
+}
+
+
+def quoted(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def add_indexes(conn):
+    # an index on every column referencing another table, including the association
+    # tables of list-valued references
+    tables = [
+        row[0]
+        for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND sql NOT LIKE 'CREATE VIRTUAL%'"
+        )
+    ]
+    count = 0
+    for table in tables:
+        columns = {row[3] for row in conn.execute(f"PRAGMA foreign_key_list({quoted(table)})")}
+        for col in sorted(columns):
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {quoted(f'{table}_{col}_index')} "
+                f"ON {quoted(table)} ({quoted(col)})"
+            )
+            count += 1
+    return count
+
+
+def add_fulltext(conn, db, ds):
+    # db: the pycldf Database, for the table and column names
+    for name, (url, columns, tokenizer) in FULLTEXT.items():
+        table = ds.get(url)
+        if table is None:
+            continue
+        columns = [col for col in columns if col in {c.name for c in table.tableSchema.columns}]
+        fts = quoted(f"{name}_fts")
+        conn.execute(
+            f"CREATE VIRTUAL TABLE {fts} USING fts5("
+            f"ID UNINDEXED, {', '.join(quoted(col) for col in columns)}, "
+            f"tokenize = '{tokenizer}')"
+        )
+        source = [db.translate(url, "ID")] + [db.translate(url, col) for col in columns]
+        conn.execute(
+            f"INSERT INTO {fts} SELECT {', '.join(quoted(col) for col in source)} "
+            f"FROM {quoted(db.translate(url))}"
+        )
+
+
+def write_database(ds, path):
+    # ds: a written pycldf Dataset; the database is built next to path, then moved there
+    from pycldf.db import Database
+
+    path = Path(path)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    if tmp.exists():
+        tmp.unlink()
+    db = Database(ds, fname=tmp)
+    db.write_from_tg()
+    conn = sqlite3.connect(tmp)
+    try:
+        with conn:
+            indexes = add_indexes(conn)
+            add_fulltext(conn, db, ds)
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    tmp.replace(path)
+    log.info(f"Wrote {path} ({indexes} foreign key indexes)")
+    return path
+
+
+def search(path, query, table="examples"):
+    # full-text search in an FTS5 table (see FULLTEXT), best matches first, e.g.
+    # search("cldf.sqlite", "fish", table="translations")
+    conn = sqlite3.connect(path)
+    try:
+        return pd.read_sql_query(
+            f"SELECT * FROM {quoted(f'{table}_fts')} WHERE {quoted(f'{table}_fts')} MATCH ? "
+            "ORDER BY rank",
+            conn,
+            params=[query],
+        )
+    finally:
+        conn.close()
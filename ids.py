@@ -0,0 +1,86 @@
+# Minting IDs like humidifier.humidify, with batches and faster lookups
+# all IDs are registered in the global humidifier (og_humidifier), so the two can
+# be mixed, and get_values() and the stage cache see every ID minted here.
+# humidifier checks candidate IDs against a list; here, a set mirrors every list.
+from functools import lru_cache
+
+from humidifier import og_humidifier
+from profiling import count
+from slugify import slugify as _slugify
+
+# key -> (the humidifier's ID list, the set of its IDs, how many IDs of the list are
+# in the set, the last suffix handed out per slug)
+_taken = {}
+
+
+@lru_cache(maxsize=None)
+def slugify(text):
+    return _slugify(text) or "null"
+
+
+def taken_ids(key):
+    # the IDs in use for key, brought up to date with the humidifier's list
+    humids = og_humidifier.humids.setdefault(key, [])
+    og_humidifier.humdict.setdefault(key, {})
+    lst, taken, seen, counters = _taken.get(key, (None, None, 0, None))
+    if lst is not humids or seen > len(humids):  # the list was replaced, e.g. restored from the cache
+        lst, taken, seen, counters = humids, set(), 0, {}
+    taken.update(humids[seen:])
+    _taken[key] = (lst, taken, len(humids), counters)
+    return taken, counters
+
+
+def _register(key, text, _id, taken):
+    og_humidifier.humids[key].append(_id)
+    og_humidifier.humdict[key][text] = _id
+    taken.add(_id)
+    lst, _, seen, counters = _taken[key]
+    _taken[key] = (lst, taken, seen + 1, counters)
+
+
+def _mint(key, text, taken, counters):
+    first_drop = slugify(text)
+    if first_drop not in taken:
+        return first_drop
+    # suffixes up to the last one handed out for this slug are all taken
+    i = counters.get(first_drop, 1)
+    candidate = f"{first_drop}-{i}"
+    while candidate in taken:
+        i += 1
+        candidate = f"{first_drop}-{i}"
+    counters[first_drop] = i
+    return candidate
+
+
+def humidify(text, key="default", unique=False):
+    # same result as humidifier.humidify
+    humdict = og_humidifier.humdict.setdefault(key, {})
+    if not unique and text in humdict:
+        count("humidify.hit")
+        return humdict[text]
+    count("humidify.minted")
+    taken, counters = taken_ids(key)
+    _id = _mint(key, text, taken, counters)
+    _register(key, text, _id, taken)
+    return _id
+
+
+def humidify_series(texts, key="default", unique=False):
+    # IDs for a Series of texts, the same as calling humidify on one after the other
+    taken, counters = taken_ids(key)
+    humdict = og_humidifier.humdict[key]
+    res = []
+    hits = 0
+    for text in texts:
+        if not unique and text in humdict:
+            res.append(humdict[text])
+            hits += 1
+            continue
+        _id = _mint(key, text, taken, counters)
+        _register(key, text, _id, taken)
+        res.append(_id)
+    count("humidify.minted", len(res) - hits)
+    count("humidify.hit", hits)
+    import pandas as pd
+
+    return pd.Series(res, index=texts.index, dtype=object)
@@ -0,0 +1,132 @@
+# Checking the tables of the dataset in memory, before they are written
+# every foreign key is checked against a set of the referenced IDs, so each check
+# is linear in the size of the two tables. Cells are checked against the schema:
+# list-valued columns need lists, whose items must not contain the separator, and
+# other columns must not get lists (which would be written as "['...']").
+import logging
+import math
+
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+# how many problems of a kind are shown
+MAX_REPORTED = 10
+
+
+def column_values(data, name):
+    # the values of a column, for DataFrames and lists of records; None if absent
+    if isinstance(data, pd.DataFrame):
+        if name not in data.columns:
+            return None
+        return data[name].tolist()
+    if not any(name in row for row in data):
+        return None
+    return [row.get(name) for row in data]
+
+
+def columns(table):
+    return {col.name: col for col in table.tableSchema.columns}
+
+
+def is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def is_empty(value):
+    return is_missing(value) or value == ""
+
+
+def check_cells(url, table, data, problems):
+    ids = column_values(data, "ID")
+    for col in table.tableSchema.columns:
+        values = column_values(data, col.name)
+        if values is None:
+            continue
+        for idx, value in enumerate(values):
+            origin = (url, ids[idx] if ids else idx, col.name)
+            if col.separator:
+                if value is None or value == "":
+                    continue
+                if not isinstance(value, (list, tuple)):
+                    problems.setdefault(f"{url}:{col.name}: expected a list", []).append(
+                        (origin, value)
+                    )
+                    continue
+                for item in value:
+                    if is_missing(item) or (
+                        isinstance(item, str) and col.separator in item
+                    ):
+                        problems.setdefault(
+                            f"{url}:{col.name}: list item is empty or contains '{col.separator}'",
+                            [],
+                        ).append((origin, value))
+                        break
+            elif isinstance(value, (list, tuple, set)) or (
+                isinstance(value, str) and value.startswith("['")
+            ):
+                problems.setdefault(f"{url}:{col.name}: list in single-valued column", []).append(
+                    (origin, value)
+                )
+
+
+def dataset_keys(ds, extra_keys=()):
+    # (table, column, referenced table, referenced column) for the foreign keys of the
+    # dataset schema and for extra keys, given as (table, column, table, column) names
+    keys = []
+    for parent, parent_cols, child, child_cols in ds.tablegroup.foreign_keys():
+        if len(child_cols) == 1:
+            keys.append((child, child_cols[0], parent, parent_cols[0]))
+    for src, src_col, goal, goal_col in extra_keys:
+        src_table, goal_table = ds.get(src), ds.get(goal)
+        if src_table is None or goal_table is None:
+            continue
+        if src_col in columns(src_table) and goal_col in columns(goal_table):
+            keys.append((src_table, src_col, goal_table, goal_col))
+    res = []
+    for key in keys:
+        if key not in res:
+            res.append(key)
+    return res
+
+
+def check_foreign_keys(keys, data, problems):
+    targets = {}
+    for child, col, parent, parent_col in keys:
+        child_url, parent_url = child.url.string, parent.url.string
+        if child_url not in data or parent_url not in data:
+            continue
+        values = column_values(data[child_url], col)
+        if values is None:
+            continue
+        if (parent_url, parent_col) not in targets:
+            targets[(parent_url, parent_col)] = set(
+                column_values(data[parent_url], parent_col) or []
+            )
+        found = targets[(parent_url, parent_col)]
+        ids = column_values(data[child_url], "ID")
+        separator = columns(child)[col].separator
+        for idx, value in enumerate(values):
+            if separator and isinstance(value, (list, tuple)):
+                refs = value
+            else:
+                refs = [value]
+            for ref in refs:
+                if not is_empty(ref) and ref not in found:
+                    problems.setdefault(
+                        f"{child_url}:{col}: dangling references to {parent_url}:{parent_col}",
+                        [],
+                    ).append(((child_url, ids[idx] if ids else idx, col), ref))
+
+
+def check_integrity(ds, data, extra_keys=(), log=log):
+    # ds: a pycldf Dataset with the schema; data: table URL -> DataFrame or records
+    problems = {}
+    for url, table_data in data.items():
+        check_cells(url, ds[url], table_data, problems)
+    check_foreign_keys(dataset_keys(ds, extra_keys), data, problems)
+    for kind, cases in problems.items():
+        log.error(f"{kind} ({len(cases)})")
+        for (url, row_id, col), value in cases[:MAX_REPORTED]:
+            log.error(f"    {row_id} ({col}): {value!r}")
+    return not problems
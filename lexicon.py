@@ -0,0 +1,92 @@
+# Lookup structures over the lexical tables built in cldf_creator.create()
+# the DataFrames are only converted once, to records (see records.py); lookups then
+# are dict accesses
+from records import Lexeme, Morph, Stem, from_frame
+
+
+class MorphIndex:
+    # hash index over a morph table
+    # primary key: the form with affix hyphens stripped; secondary: ID, Morpheme_ID
+    def __init__(self, morphs):
+        self.records = from_frame(Morph, morphs)
+        self.forms = {}  # stripped form -> row positions
+        self.raw_forms = {}  # form as entered -> row positions
+        self.ids = {}
+        self.morphemes = {}
+        for pos, rec in enumerate(self.records):
+            self.forms.setdefault(rec.Form.strip("-"), []).append(pos)
+            self.raw_forms.setdefault(rec.Form, []).append(pos)
+            self.ids.setdefault(rec.ID, []).append(pos)
+            self.morphemes.setdefault(rec.Morpheme_ID, []).append(pos)
+
+    def _get(self, positions):
+        # return records in table order, like a boolean mask would
+        return [self.records[pos] for pos in sorted(set(positions))]
+
+    def by_form(self, form):
+        return self._get(self.forms.get(form, []))
+
+    def by_id(self, _id):
+        return self._get(self.ids.get(_id, []))
+
+    def by_morpheme(self, morpheme_id):
+        return self._get(self.morphemes.get(morpheme_id, []))
+
+    def match(self, ids=(), form=None):
+        # rows with any of the IDs or the exact (unstripped) form
+        positions = []
+        for _id in ids:
+            if isinstance(_id, str):
+                positions.extend(self.ids.get(_id, []))
+        if form is not None:
+            positions.extend(self.raw_forms.get(form, []))
+        return self._get(positions)
+
+    def __contains__(self, _id):
+        return _id in self.ids
+
+
+def is_detrz(morph):
+    return morph.Parameter_ID == ["DETRZ"]
+
+
+def filter_id(cands, _id):
+    return [x for x in cands if x.ID == _id]
+
+
+class LexiconIndex:
+    # multi-maps over lexemes and stems, kept up to date while stems are added
+    def __init__(self):
+        self.names = {}  # Name -> Lexeme records
+        self.lexeme_ids = {}  # ID -> Lexeme records
+        self.lexeme_stems = {}  # Lexeme_ID -> {stem ID: Stem record}
+        self.stem_ids = set()
+
+    def add_lexemes(self, lexemes):
+        # lexemes: a DataFrame or a list of dicts
+        for rec in from_frame(Lexeme, lexemes):
+            self.names.setdefault(rec.Name, []).append(rec)
+            self.lexeme_ids.setdefault(rec.ID, []).append(rec)
+
+    def add_stems(self, stems, searchable=True):
+        # stems: a DataFrame or a list of dicts
+        # re-adding a stem replaces the stored record (e.g. after new columns were added)
+        # stems that are not searchable only count as known stem IDs
+        if not searchable:
+            self.stem_ids.update(rec["ID"] for rec in stems)
+            return
+        for rec in from_frame(Stem, stems):
+            self.stem_ids.add(rec.ID)
+            self.lexeme_stems.setdefault(rec.Lexeme_ID, {})[rec.ID] = rec
+
+    def by_name(self, name):
+        return self.names.get(name, [])
+
+    def by_id(self, lex_id):
+        return self.lexeme_ids.get(lex_id, [])
+
+    def stems_of(self, lex_id):
+        return list(self.lexeme_stems.get(lex_id, {}).values())
+
+    def has_stem(self, stem_id):
+        return stem_id in self.stem_ids
@@ -0,0 +1,72 @@
+# One-pass index of the files in a media directory
+# every directory is listed once per run, and checking for a file is a set lookup
+# instead of a stat call. The listing can be cached on disk, keyed on the
+# modification time of the directory, which changes when files are added or removed.
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+MEDIA_CACHE_DIR = Path(".cache") / "media"
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+class MediaIndex:
+    def __init__(self, path, names=(), exists=True):
+        self.path = Path(path)
+        self.names = frozenset(names)
+        self.exists = exists  # False if the directory is not there
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(sorted(self.names))
+
+
+def _cache_file(path, pattern):
+    h = hashlib.sha256(f"{Path(path).resolve()}:{pattern}".encode("utf-8"))
+    return MEDIA_CACHE_DIR / f"{h.hexdigest()}.json"
+
+
+def _scan(path, pattern, cache):
+    if not os.path.isdir(path):
+        return MediaIndex(path, exists=False)
+    mtime = os.stat(path).st_mtime_ns
+    cache_file = _cache_file(path, pattern)
+    if cache and cache_file.is_file():
+        with open(cache_file, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached["mtime"] == mtime:
+            return MediaIndex(path, cached["names"])
+    with os.scandir(path) as entries:
+        names = [
+            x.name
+            for x in entries
+            if fnmatch.fnmatchcase(x.name, pattern) and x.is_file()
+        ]
+    log.debug(f"Found {len(names)} files in {path}")
+    if cache:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_file, "w", encoding="utf-8") as f:
+            json.dump({"mtime": mtime, "names": sorted(names)}, f)
+    return MediaIndex(path, names)
+
+
+def media_index(path, pattern="*", cache=False):
+    # the files in path matching pattern; the first call for a directory scans it
+    key = (str(path), pattern)
+    with _lock:
+        if key not in _indexes:
+            _indexes[key] = _scan(path, pattern, cache)
+        return _indexes[key]
@@ -0,0 +1,75 @@
+# Orthography-to-IPA conversion with an orthography profile (etc/phonemes.csv)
+# gives the same results as a segments.Tokenizer with that profile, but the profile is
+# compiled into a single longest-match regex and results are memoized per form.
+import re
+
+from profiling import count
+
+GRAPHEME_COL = "Grapheme"
+REPLACEMENT_MARKER = "�"  # what segments puts in for unknown graphemes
+
+
+class CompiledTokenizer:
+    def __init__(self, profile):
+        # profile: the rows of an orthography profile
+        self.graphemes = {}
+        for spec in profile:
+            spec = dict(spec)
+            grapheme = spec.pop(GRAPHEME_COL)
+            if not grapheme:
+                raise ValueError("Grapheme must not be empty")
+            self.graphemes.setdefault(grapheme, spec)  # the first of duplicates counts
+        # longer graphemes first, so the regex matches the longest grapheme at every
+        # position, like the segments parse tree; anything else is a single unknown character
+        self.pattern = re.compile(
+            "|".join(
+                re.escape(x) for x in sorted(self.graphemes, key=len, reverse=True)
+            )
+            + "|(.)",
+            re.DOTALL,
+        )
+        self.cache = {}
+
+    def parse(self, word):
+        return [
+            REPLACEMENT_MARKER if match.group(1) is not None else match.group()
+            for match in self.pattern.finditer(word)
+        ]
+
+    def transform(self, word, column):
+        word = self.parse(word)
+        if column == GRAPHEME_COL:
+            return word
+        out = []
+        for token in word:
+            target = self.graphemes.get(token, {}).get(column, REPLACEMENT_MARKER)
+            if isinstance(target, (tuple, list)):
+                out.extend(target)
+            elif target is not None:
+                out.append(target)
+        return out
+
+    def __call__(self, string, column=GRAPHEME_COL, segment_separator=" ", separator=" # "):
+        key = (string, column, segment_separator, separator)
+        if key in self.cache:
+            count("tokenizer.hit")
+        else:
+            count("tokenizer.miss")
+            self.cache[key] = separator.join(
+                segment_separator.join(self.transform(word, column)).strip()
+                for word in string.split()
+            )
+        return self.cache[key]
+
+    def tokenize(self, s, column="IPA"):
+        tokens = self(s, column=column).split(" ")
+        if REPLACEMENT_MARKER in tokens:
+            return []
+        return tokens
+
+    def ipaify(self, s, column="IPA"):
+        return self(s, column=column, segment_separator="", separator=" ")
+
+    def tokenize_series(self, forms, column="IPA"):
+        # every distinct form is only segmented once
+        return forms.map(lambda s: self.tokenize(s, column=column))
@@ -0,0 +1,202 @@
+# Declared stages of the CLDF build and a runner for (parts of) the stage DAG
+# a stage reads from and writes to a shared namespace (ctx); what it writes is
+# declared in `provides` and is what gets cached. Stages are keyed on their
+# input files and the keys of the stages they require (see stage_cache.py).
+import logging
+import time
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from humidifier import og_humidifier
+
+log = logging.getLogger(__name__)
+
+
+# snapshot and restore the IDs minted in some humidifier namespaces
+def id_state(keys):
+    return {
+        key: (
+            list(og_humidifier.humids.get(key, [])),
+            dict(og_humidifier.humdict.get(key, {})),
+        )
+        for key in keys
+    }
+
+
+def restore_ids(state):
+    for key, (humids, humdict) in state.items():
+        og_humidifier.humids[key] = list(humids)
+        og_humidifier.humdict[key] = dict(humdict)
+
+
+def _resolve(value, ctx):
+    if callable(value):
+        return list(value(ctx))
+    return list(value)
+
+
+class Stage:
+    def __init__(
+        self,
+        name,
+        func,
+        requires=(),
+        files=(),
+        dirs=(),
+        provides=(),
+        ids=(),
+        outputs=(),
+    ):
+        self.name = name
+        self.func = func
+        self.requires = list(requires)  # names of upstream stages
+        self.files = files  # input files (or a function of ctx returning them)
+        self.dirs = dirs  # input directories; only the listing is hashed
+        self.provides = list(provides)  # ctx attributes created or changed
+        self.ids = list(ids)  # humidifier namespaces the stage mints IDs in
+        self.outputs = outputs  # directories written to
+
+    def __repr__(self):
+        return f"Stage({self.name})"
+
+
+class Pipeline:
+    def __init__(self, code_files=()):
+        self.stages = {}  # in declaration order, which is a topological order
+        self.code_files = list(code_files)
+
+    def stage(self, requires=(), **kwargs):
+        def decorator(func):
+            for req in requires:
+                if req not in self.stages:
+                    raise ValueError(f"Stage {func.__name__} requires unknown stage {req}")
+            self.stages[func.__name__] = Stage(
+                func.__name__, func, requires=requires, **kwargs
+            )
+            return func
+
+        return decorator
+
+    def _check(self, names):
+        for name in names:
+            if name not in self.stages:
+                raise ValueError(
+                    f"Unknown stage {name}, choose from: {', '.join(self.stages)}"
+                )
+
+    def upstream(self, names):
+        # all transitive requirements of the named stages
+        res = set()
+        todo = list(names)
+        while todo:
+            for req in self.stages[todo.pop()].requires:
+                if req not in res:
+                    res.add(req)
+                    todo.append(req)
+        return res
+
+    def downstream(self, names):
+        res = set(names)
+        for name, stage in self.stages.items():
+            if set(stage.requires) & res:
+                res.add(name)
+        return res
+
+    def keys(self, ctx, cache):
+        keys = {}
+        for name, stage in self.stages.items():
+            keys[name] = cache.key(
+                name,
+                *[keys[req] for req in stage.requires],
+                files=self.code_files + _resolve(stage.files, ctx),
+                dirs=_resolve(stage.dirs, ctx),
+            )
+        return keys
+
+    def plan(self, ctx, cache, only=None, start=None):
+        # returns the stages to run and the stages to restore from the cache, in order
+        keys = self.keys(ctx, cache)
+        if only:
+            self._check(only)
+            targets = set(only)
+            forced = set(only)
+        elif start:
+            self._check([start])
+            targets = set(self.stages)
+            forced = self.downstream([start])
+        else:
+            targets = set(self.stages)
+            forced = set()
+        needed = targets | self.upstream(targets)
+        # stages downstream of a rerun stage rerun too, so they see its new state
+        to_run = []
+        for name, stage in self.stages.items():
+            if name in needed and (
+                name in forced
+                or set(stage.requires) & set(to_run)
+                or not cache.hit(name, keys[name])
+            ):
+                to_run.append(name)
+        to_load = [
+            name
+            for name in self.stages
+            if name in self.upstream(to_run) and name not in to_run
+        ]
+        return keys, to_run, to_load
+
+    def _execute(self, stage, ctx, cache, key, observer=None):
+        start = time.perf_counter()
+        log.info(f"Running stage {stage.name}")
+        # observer: called with the stage name, returns a context manager wrapping the stage
+        with (observer or nullcontext)(stage.name):
+            res = stage.func(ctx)
+        for attr in stage.provides:
+            if not hasattr(ctx, attr):
+                raise ValueError(f"Stage {stage.name} did not provide {attr}")
+        # a stage returning False has not produced a cacheable result
+        if res is not False:
+            cache.store(
+                stage.name,
+                key,
+                {
+                    "provides": {attr: getattr(ctx, attr) for attr in stage.provides},
+                    "ids": id_state(stage.ids),
+                },
+                outputs=_resolve(stage.outputs, ctx),
+            )
+        log.info(f"Finished stage {stage.name} in {time.perf_counter() - start:0.2f}s")
+
+    def run(self, ctx, cache, only=None, start=None, workers=4, observer=None):
+        keys, to_run, to_load = self.plan(ctx, cache, only=only, start=start)
+        for name in to_load:
+            log.info(f"Loading stage {name} from cache")
+            state = cache.load(name, keys[name])
+            for attr, value in state["provides"].items():
+                setattr(ctx, attr, value)
+            restore_ids(state["ids"])
+        if not to_run:
+            log.info("Everything is up to date")
+            return
+        # stages run as soon as the stages they require are done
+        done = set(self.stages) - set(to_run)
+        pending = list(to_run)
+        running = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while pending or running:
+                for name in list(pending):
+                    if set(self.stages[name].requires) <= done:
+                        pending.remove(name)
+                        running[
+                            executor.submit(
+                                self._execute,
+                                self.stages[name],
+                                ctx,
+                                cache,
+                                keys[name],
+                                observer,
+                            )
+                        ] = name
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    future.result()
+                    done.add(running.pop(future))
@@ -0,0 +1,191 @@
+# Profiling the CLDF build
+# per stage: wall time, CPU time and peak memory; counters for hot calls; and,
+# optionally, cProfile statistics. Everything is written as one JSON report per build.
+# Stages run in threads, so CPU time is that of the stage's thread (plus finished
+# child processes). Memory is sampled while the stages run: the peak resident memory
+# of this process and, separately, of its child processes (e.g. the analysis pool).
+# Memory is process-wide, so stages running at the same time share their peaks; with
+# cprofile or traced memory, create() runs the stages one at a time.
+import cProfile
+import json
+import logging
+import pstats
+import resource
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+PROFILE_DIR = Path(".cache") / "profiles"
+
+# incremented by the instrumented functions, in this process
+counters = Counter()
+_lock = threading.Lock()
+
+
+def count(name, n=1):
+    with _lock:
+        counters[name] += n
+
+
+def peak_rss():
+    # the peak resident memory of this process over the whole build, in MB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def rss(pid="self"):
+    # the current resident memory of a process, in MB (None where /proc is missing)
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * resource.getpagesize() / 2**20
+
+
+def children_rss():
+    # the current resident memory of the child processes of this process, in MB
+    total = 0
+    for task in Path("/proc/self/task").glob("*"):
+        try:
+            pids = (task / "children").read_text().split()
+        except OSError:
+            continue
+        total += sum(rss(pid) or 0 for pid in pids)
+    return total
+
+
+class MemorySampler:
+    # samples the resident memory in a thread, for the peaks while each stage runs
+    # peaks: stage -> [own peak, children peak] of the running stages
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peaks = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        own, children = rss() or 0, children_rss()
+        with self.lock:
+            for peak in self.peaks.values():
+                peak[0] = max(peak[0], own)
+                peak[1] = max(peak[1], children)
+
+    def begin(self, name):
+        with self.lock:
+            self.peaks[name] = [0, 0]
+        self.sample()
+
+    def end(self, name):
+        # the peaks (MB) of this process and its children while the stage ran
+        self.sample()
+        with self.lock:
+            own, children = self.peaks.pop(name)
+        return own, children
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+def child_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Profiler:
+    def __init__(self, memory=False, cprofile=False):
+        self.memory = memory  # trace Python allocations (slow)
+        self.cprofile = cprofile
+        self.stages = {}
+        self.stats = None
+        self.started = datetime.now()
+        self.start = time.perf_counter()
+        self.sampler = MemorySampler()
+        counters.clear()
+        if memory:
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name):
+        # the observer for Pipeline.run
+        start, cpu, children = time.perf_counter(), time.thread_time(), child_cpu()
+        self.sampler.begin(name)
+        if self.memory:
+            tracemalloc.reset_peak()
+        profile = cProfile.Profile() if self.cprofile else None
+        if profile:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+            own_peak, children_peak = self.sampler.end(name)
+            stats = {
+                "wall_seconds": time.perf_counter() - start,
+                "cpu_seconds": time.thread_time() - cpu,
+                "child_cpu_seconds": child_cpu() - children,
+                "peak_rss_mb": own_peak,
+                "children_peak_rss_mb": children_peak,
+            }
+            if self.memory:
+                stats["peak_traced_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+            with _lock:
+                self.stages[name] = stats
+                if profile:
+                    if self.stats is None:
+                        self.stats = pstats.Stats(profile)
+                    else:
+                        self.stats.add(profile)
+
+    def report(self):
+        return {
+            "started": self.started.isoformat(timespec="seconds"),
+            "wall_seconds": time.perf_counter() - self.start,
+            "peak_rss_mb": peak_rss(),
+            "stages": self.stages,
+            "counters": dict(sorted(counters.items())),
+        }
+
+    def write(self, path=None, name="build"):
+        # writes the JSON report (and the cProfile statistics next to it)
+        if path is None:
+            path = PROFILE_DIR / f"{name}-{self.started:%Y%m%d-%H%M%S}.json"
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.sampler.stop()
+        if self.memory:
+            tracemalloc.stop()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+        log.info(f"Profile written to {path}")
+        if self.stats is not None:
+            self.stats.dump_stats(path.with_suffix(".prof"))
+            log.info(f"cProfile statistics written to {path.with_suffix('.prof')}")
+        return path
+
+
+def combine(*observers):
+    # one observer entering all given observers (None is skipped)
+    observers = [x for x in observers if x]
+
+    @contextmanager
+    def observer(name):
+        with ExitStack() as stack:
+            for x in observers:
+                stack.enter_context(x(name))
+            yield
+
+    return observer
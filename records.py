@@ -0,0 +1,79 @@
+# Records of the lexicon and of the wordforms, for the stem and wordform loops
+# the lexical tables are read into DataFrames and written from them; in between, the
+# lookups (lexicon.py) and the wordform stages work on these slotted records, which
+# only have the fields the loops need. The full rows stay in the DataFrames.
+from dataclasses import asdict, dataclass, fields
+
+
+@dataclass(slots=True)
+class Morph:
+    ID: str
+    Form: str
+    Morpheme_ID: str
+    Parameter_ID: list
+    Gloss: list
+
+
+@dataclass(slots=True)
+class Lexeme:
+    ID: str
+    Name: str
+    Gloss: list
+
+
+@dataclass(slots=True)
+class Stem:
+    ID: str
+    Form: str
+    Lexeme_ID: str
+    Gloss: list
+    # derived stems only
+    Base_Stem: str = ""
+    Base_Root: str = ""
+
+
+@dataclass(slots=True)
+class Wordform:
+    ID: str
+    Form: str
+    Parameter_ID: list
+    Morpho_Segments: list
+    Language_ID: str = "yab"
+    # not all wordforms have these
+    Part_Of_Speech: str = None
+    Source: list = None
+    Media_ID: str = None
+
+    def to_dict(self):
+        # the row of the wordforms table
+        return {k: v for k, v in asdict(self).items() if v is not None}
+
+
+@dataclass(slots=True)
+class WordformPart:
+    # a part of a wordform: its index, gloss and the IDs of the morph and/or stem
+    Index: int
+    Gloss: str
+    Parts: dict
+
+
+def from_frame(cls, df):
+    # records of the rows of df (a DataFrame or a list of dicts); missing columns get
+    # the defaults of the record type
+    if isinstance(df, list):
+        import pandas as pd
+
+        df = pd.DataFrame(df)
+    if len(df) == 0:
+        return []
+    names = [f.name for f in fields(cls) if f.name in df.columns]
+    return [
+        cls(**dict(zip(names, row))) for row in zip(*[df[name] for name in names])
+    ]
+
+
+def to_frame(records):
+    # for printing lists of records
+    import pandas as pd
+
+    return pd.DataFrame([asdict(x) for x in records])
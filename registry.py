@@ -0,0 +1,112 @@
+# Working tables with interned values
+# the part tables built row by row (wordform parts and stems, inflections, example
+# parts, stem parts) repeat the same IDs and lists (e.g. Gloss_ID) in many rows. A
+# CodedTable keeps every distinct value once, in its Registry, and stores the rows as
+# integer codes, in one array per column. Values are decoded when the table is written.
+# A SplitTable keeps the list columns of a table as joined strings, which take much
+# less memory than lists of strings; the lists are made for one row at a time.
+from array import array
+
+import numpy as np
+import pandas as pd
+
+
+class Registry:
+    # distinct values and their integer codes; lists are kept as tuples
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def code(self, value):
+        if isinstance(value, list):
+            key = (list, tuple(value))
+        else:
+            key = (type(value), value)
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = len(self.values)
+            self.values.append(key)
+        return code
+
+    def decode(self, code):
+        kind, value = self.values[code]
+        if kind is list:
+            return list(value)
+        return value
+
+    def __len__(self):
+        return len(self.values)
+
+
+# reference columns become categoricals in to_frame()
+def is_reference(name):
+    return name.endswith("_ID")
+
+
+class CodedTable:
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.registry = Registry()
+        self.data = {col: array("i") for col in self.columns}
+
+    def append(self, row):
+        # row: a dict with (some of) the columns; missing ones are None
+        unknown = set(row) - set(self.data)
+        if unknown:
+            raise ValueError(f"Unknown columns {', '.join(sorted(unknown))}")
+        for col, codes in self.data.items():
+            codes.append(self.registry.code(row.get(col)))
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def __len__(self):
+        return len(self.data[self.columns[0]])
+
+    def __iter__(self):
+        # the decoded rows
+        decode = self.registry.decode
+        for codes in zip(*self.data.values()):
+            yield {col: decode(code) for col, code in zip(self.columns, codes)}
+
+    def to_frame(self):
+        # a DataFrame with decoded values; references are categoricals
+        res = {}
+        for col, codes in self.data.items():
+            codes = np.array(codes, dtype=np.int32)
+            found, inverse = np.unique(codes, return_inverse=True)
+            values = [self.registry.decode(code) for code in found]
+            if is_reference(col) and all(isinstance(x, str) for x in values):
+                res[col] = pd.Categorical.from_codes(inverse, categories=values)
+            elif values and all(type(x) is int for x in values):
+                res[col] = np.array(values, dtype=np.int64)[inverse]
+            elif any(isinstance(x, list) for x in values):
+                # every row gets its own list
+                res[col] = [self.registry.decode(code) for code in codes]
+            else:
+                column = np.empty(len(values), dtype=object)
+                column[:] = values
+                res[col] = column[inverse]
+        return pd.DataFrame(res, columns=self.columns)
+
+
+class SplitTable:
+    # df: a DataFrame with the list columns joined by sep; iterating gives the rows,
+    # with these columns split into lists
+    def __init__(self, df, columns, sep="; "):
+        self.df = df
+        self.columns = list(columns)
+        self.sep = sep
+
+    def __len__(self):
+        return len(self.df)
+
+    def __iter__(self):
+        names = list(self.df.columns)
+        split = [col for col in self.columns if col in names]
+        for values in self.df.itertuples(index=False, name=None):
+            row = dict(zip(names, values))
+            for col in split:
+                row[col] = row[col].split(self.sep)
+            yield row
@@ -0,0 +1,108 @@
+# On-disk cache for the stages of cldf_creator.create()
+# every stage is keyed on the content hashes of its input files and the key of
+# the stage before it, so changing an input invalidates that stage and all
+# downstream stages, while unchanged upstream stages are loaded from disk.
+import hashlib
+import json
+import logging
+import pickle
+from pathlib import Path
+
+from media_index import media_index
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR = Path(".cache") / "stages"
+
+
+def hash_file(path):
+    path = Path(path)
+    if not path.is_file():
+        return "missing"
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_dir(path, pattern="*", cache=False):
+    # only the listing: stages check whether files exist, not their content
+    index = media_index(path, pattern, cache=cache)
+    if not index.exists:
+        return "missing"
+    return hashlib.sha256("\n".join(index).encode("utf-8")).hexdigest()
+
+
+def hash_outputs(path):
+    path = Path(path)
+    if not path.is_dir():
+        return {}
+    return {
+        str(x.relative_to(path)): hash_file(x)
+        for x in sorted(path.rglob("*"))
+        if x.is_file()
+    }
+
+
+class StageCache:
+    def __init__(self, path=CACHE_DIR, enabled=True):
+        self.path = Path(path)
+        self.enabled = enabled
+
+    def key(self, *parts, files=(), dirs=()):
+        # parts: upstream keys and parameters; files: hashed by content; dirs: by listing
+        h = hashlib.sha256()
+        for part in parts:
+            h.update(f"{part}\n".encode("utf-8"))
+        for file in files:
+            h.update(f"{file}:{hash_file(file)}\n".encode("utf-8"))
+        for directory in dirs:
+            if isinstance(directory, tuple):
+                directory, pattern = directory
+            else:
+                pattern = "*"
+            h.update(
+                f"{directory}:{hash_dir(directory, pattern, cache=self.enabled)}\n".encode(
+                    "utf-8"
+                )
+            )
+        return h.hexdigest()
+
+    def _info(self, stage):
+        info_path = self.path / f"{stage}.json"
+        if not info_path.is_file():
+            return None
+        with open(info_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def hit(self, stage, key):
+        if not self.enabled:
+            return False
+        info = self._info(stage)
+        if not info or info["key"] != key:
+            return False
+        for output_dir, hashes in info.get("outputs", {}).items():
+            if hash_outputs(output_dir) != hashes:
+                log.info(f"Outputs of stage {stage} in {output_dir} have changed")
+                return False
+        return True
+
+    def load(self, stage, key):
+        if not self.hit(stage, key):
+            return None
+        with open(self.path / f"{stage}.pickle", "rb") as f:
+            return pickle.load(f)
+
+    def store(self, stage, key, state=None, outputs=()):
+        if not self.enabled:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / f"{stage}.pickle", "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        info = {
+            "key": key,
+            "outputs": {str(x): hash_outputs(x) for x in outputs},
+        }
+        with open(self.path / f"{stage}.json", "w", encoding="utf-8") as f:
+            json.dump(info, f, indent=2)
@@ -1,5 +1,6 @@
+import sys
+
 from invoke import task
-from cldf_creator import create
 from writio import load
 # VERSION = $(shell yq -p=props .bumpversion.cfg | yq eval ".current_version"  )
 # .PHONY: cldf full
@@ -7,14 +8,57 @@ version = load("etc/metadata.yaml")
 
 
 @task
-def cldf(c):
+def cldf(c, no_cache=False):
+    from cldf_creator import create
+
     load(c)
-    create()
+    create(use_cache=not no_cache)
 
 @task
-def full(c):
+def full(c, no_cache=False, processes=1):
+    from cldf_creator import create
+
     load(c)
-    create(full=True)
+    create(full=True, use_cache=not no_cache, processes=int(processes))
+
+@task(optional=["profile", "sqlite"])
+def run(
+    c,
+    only=None,
+    from_=None,
+    full=False,
+    no_cache=False,
+    workers=4,
+    processes=1,
+    profile=None,
+    cprofile=False,
+    trace_memory=False,
+    sqlite=None,
+):
+    # run a part of the pipeline, e.g. invoke run --only=bibliography,texts or --from=examples
+    # stages that are not run are loaded from the cache
+    # --profile writes a JSON profile of the build (to .cache/profiles or the given path)
+    # --sqlite writes an SQLite database with full-text search (to cldf.sqlite or the given path)
+    from cldf_creator import create
+
+    create(
+        full=full,
+        use_cache=not no_cache,
+        only=only.split(",") if only else None,
+        start=from_,
+        workers=int(workers),
+        processes=int(processes),
+        profile=profile,
+        cprofile=cprofile,
+        trace_memory=trace_memory,
+        sqlite=sqlite,
+    )
+
+@task
+def clean(c):
+    # remove all caches: pipeline stages, media and bibliography indexes, validation
+    # state, rendered chapters, profiles and benchmark corpora
+    c.run("rm -rf .cache")
 
 @task
 def load(c):
@@ -38,6 +82,54 @@ def load(c):
 #     bump2version patch
 #     git commit -am "bump"; git push
 
+@task
+def benchmark(c, sizes="1000,10000,100000,1000000", processes=1, baseline=None):
+    # build synthetic corpora of these sizes, see var/benchmark.py
+    cmd = f"{sys.executable} var/benchmark.py run --sizes {sizes} --processes {processes}"
+    if baseline:
+        cmd += f" --baseline {baseline}"
+    c.run(cmd)
+
+
+@task
+def importtime(c):
+    # check that importing tasks.py and cldf_creator.py stays fast, see
+    # tests/test_importtime.py
+    c.run(f"{sys.executable} -m pytest -q tests/test_importtime.py")
+
+
+@task
+def variants(c, threshold=1.0, all_meanings=False, query=None):
+    # likely unmerged variants in cldf/ by weighted edit distance, see variants.py;
+    # --query looks up space-separated forms instead
+    cmd = f"{sys.executable} variants.py --threshold {threshold}"
+    if all_meanings:
+        cmd += " --all-meanings"
+    if query:
+        cmd += f" --query {query}"
+    c.run(cmd)
+
+
+@task
+def search(c, query, table="examples", db="cldf.sqlite"):
+    # full-text search in the database written by run --sqlite,
+    # e.g. invoke search fish --table=translations
+    from database import search
+
+    print(search(db, query, table=table).to_string())
+
+
+@task
+def concordance(c, query, context=5, gap=0, cldf="cldf", limit=0):
+    # keyword-in-context lines for a query, see concordance.py, e.g.
+    # invoke concordance "morpheme:keprop AND NOT value:pert"
+    from concordance import Concordance, format_kwic
+
+    lines = Concordance(cldf).kwic(query, context=int(context), gap=int(gap))
+    print(format_kwic(lines.head(int(limit)) if int(limit) else lines))
+    print(f"{len(lines)} hits")
+
+
 @task
 def readme(c):
     c.run("cldf markdown cldf/metadata.json > cldf/README.md")
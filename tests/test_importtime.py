@@ -0,0 +1,44 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parents[1]
+# seconds; pandas alone takes longer than this
+BUDGET = 0.3
+
+
+def import_time(module):
+    # seconds spent importing module in a fresh interpreter, or None if it cannot be
+    # imported; lines look like "import time: self [us] | cumulative | imported package",
+    # the package indented by its nesting depth
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if res.returncode != 0:
+        return None
+    total = 0
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not name[1:].startswith(" "):
+            total += int(cumulative) / 1e6
+    return total
+
+
+def test_tasks():
+    # invoke imports tasks.py for every command, including invoke --list
+    assert import_time("tasks") < BUDGET
+
+
+def test_cldf_creator():
+    # the stages import pandas and the writing modules themselves
+    seconds = import_time("cldf_creator")
+    if seconds is None:
+        pytest.skip("cldf_creator cannot be imported here")
+    assert seconds < BUDGET
@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip("cldf_ldd")
+
+from cldf_ldd.components import tables as ldd_tables  # noqa: E402
+from pycldf import Generic  # noqa: E402
+
+from integrity import check_integrity  # noqa: E402
+
+
+@pytest.fixture
+def stems_schema(tmp_path):
+    ds = Generic.in_dir(tmp_path)
+    ds.add_component([x for x in ldd_tables if x["url"] == "stems.csv"][0])
+    return ds
+
+
+def stem(id, name, segments):
+    return {
+        "ID": id,
+        "Language_ID": "yab",
+        "Name": name,
+        "Lexeme_ID": id,
+        "Parameter_ID": ["good"],
+        "Morpho_Segments": segments,
+    }
+
+
+def test_productive_stem(stems_schema):
+    # a root stem and a productive stem as built by resolve_productive_stem
+    stems = [
+        stem("nop-good", "nop", ["nop"]),
+        stem("nopano-good-nmlz", "nop-ano", ["nop", "ano"]),
+    ]
+    assert check_integrity(stems_schema, {"stems.csv": stems})
+
+
+def test_joined_segments(stems_schema):
+    # segments joined with the separator would be split up when reading the table
+    stems = [stem("nopano-good-nmlz", "nop-ano", ["nop ano"])]
+    assert not check_integrity(stems_schema, {"stems.csv": stems})
@@ -0,0 +1,50 @@
+import pickle
+
+import pandas as pd
+
+from lexicon import LexiconIndex, MorphIndex
+from records import Stem, Wordform, WordformPart, from_frame
+
+
+def test_from_frame_defaults():
+    stems = pd.DataFrame(
+        [{"ID": "s", "Form": "f", "Lexeme_ID": "l", "Gloss": ["g"], "Base_Root": "r"}]
+    )
+    assert from_frame(Stem, stems) == [Stem("s", "f", "l", ["g"], Base_Root="r")]
+    assert from_frame(Stem, []) == []
+
+
+def test_wordform_row():
+    wf = Wordform("w", "ajpë", ["go-PST"], ["aj", "pë"], Part_Of_Speech=None)
+    assert wf.to_dict() == {
+        "ID": "w",
+        "Form": "ajpë",
+        "Parameter_ID": ["go-PST"],
+        "Morpho_Segments": ["aj", "pë"],
+        "Language_ID": "yab",
+    }
+
+
+def test_pickle():
+    # analyses are sent back from the analysis processes
+    part = WordformPart(0, "go", {"stem": "s"})
+    assert pickle.loads(pickle.dumps(part)) == part
+
+
+def test_indexes():
+    morphs = pd.DataFrame(
+        [
+            {"ID": "m1", "Form": "-pë", "Morpheme_ID": "pst", "Parameter_ID": ["PST"], "Gloss": ["PST"]},
+            {"ID": "m2", "Form": "pë", "Morpheme_ID": "loc", "Parameter_ID": ["LOC"], "Gloss": ["LOC"]},
+        ]
+    )
+    index = MorphIndex(morphs)
+    assert [x.ID for x in index.by_form("pë")] == ["m1", "m2"]
+    assert [x.ID for x in index.match(form="-pë")] == ["m1"]
+    lexicon = LexiconIndex()
+    lexicon.add_lexemes([{"ID": "l", "Name": "aj", "Gloss": ["go"]}])
+    lexicon.add_stems([{"ID": "s", "Form": "aj", "Lexeme_ID": "l", "Gloss": ["go"]}])
+    lexicon.add_stems([{"ID": "p"}], searchable=False)
+    assert [x.ID for x in lexicon.stems_of("l")] == ["s"]
+    assert lexicon.by_name("aj")[0].ID == "l"
+    assert lexicon.has_stem("p")
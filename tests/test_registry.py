@@ -0,0 +1,52 @@
+import tracemalloc
+
+import pandas as pd
+
+from registry import CodedTable, SplitTable
+
+
+def examples(n):
+    return pd.DataFrame(
+        {
+            "ID": [f"ex-{i}" for i in range(n)],
+            "Analyzed_Word": ["wïrë\ttawara\trë\tentë"] * n,
+            "Gloss": ["1PRO\ttoo\tEMP\there.LOC"] * n,
+        }
+    )
+
+
+def test_split_rows():
+    columns = ["Analyzed_Word", "Gloss", "Part_Of_Speech"]
+    table = SplitTable(examples(2), columns, sep="\t")
+    rows = list(table)
+    assert len(table) == 2
+    assert rows[1] == {
+        "ID": "ex-1",
+        "Analyzed_Word": ["wïrë", "tawara", "rë", "entë"],
+        "Gloss": ["1PRO", "too", "EMP", "here.LOC"],
+    }
+    # the table is not changed
+    assert table.df["Gloss"][0] == "1PRO\ttoo\tEMP\there.LOC"
+
+
+def iteration_peak(table):
+    # the peak of the memory allocated while the rows are read, as by the writer
+    tracemalloc.start()
+    try:
+        for _ in table:
+            pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_flat_memory():
+    # reading the rows one at a time does not need memory for all rows
+    columns = ["Analyzed_Word", "Gloss"]
+    small = iteration_peak(SplitTable(examples(1000), columns, sep="\t"))
+    big = iteration_peak(SplitTable(examples(20000), columns, sep="\t"))
+    assert big < 2 * small
+    parts = CodedTable(["ID", "Example_ID", "Index"])
+    for i in range(20000):
+        parts.append({"ID": f"ex-{i}", "Example_ID": f"ex-{i // 5}", "Index": i % 5})
+    assert iteration_peak(parts) < 2 * small
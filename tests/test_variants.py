@@ -0,0 +1,42 @@
+import pandas as pd
+
+from variants import check
+
+COSTS = {("e", "i"): 0.5}
+
+
+def table(rows, group):
+    return pd.DataFrame(
+        [
+            {"ID": id, "Name": name, "Segments": segments, group: g, "Parameter_ID": meaning}
+            for id, name, segments, g, meaning in rows
+        ]
+    )
+
+
+def test_stems_and_morphs():
+    stems = table(
+        [
+            ("pet-grab", "pet", "p e t", "pet-grab", "grab"),
+            ("ka-say", "ka", "k a", "ka-say", "say"),
+        ],
+        "Lexeme_ID",
+    )
+    morphs = table(
+        [
+            ("pit", "pit", "p i t", "pit-grab", "grab"),
+            ("pet", "pet", "p e t", "pet", "grab"),
+            ("ta", "ta", "t a", "ta-say", "say"),
+            ("ki", "ki", "k i", "ki-eat", "eat"),
+        ],
+        "Morpheme_ID",
+    )
+    # the stem pet-grab consists of the morph pet
+    stemparts = pd.DataFrame([{"Stem_ID": "pet-grab", "Morph_ID": "pet"}])
+    res = check(
+        {"stems": stems, "morphs": morphs, "stemparts": stemparts}, cost=COSTS
+    )["stems-morphs"]
+    assert list(zip(res["Lexeme_ID"], res["Morpheme_ID"], res["Distance"])) == [
+        ("pet-grab", "pit-grab", 0.5),
+        ("ka-say", "ta-say", 1),
+    ]
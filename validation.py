@@ -0,0 +1,315 @@
+# Validating a written CLDF dataset, table by table
+# runs the checks of pycldf's Dataset.validate, but the data checks (row validators,
+# primary keys, foreign keys) are done per table, in parallel, and skipped for tables
+# whose file and schema have not changed since the last successful validation.
+import hashlib
+import json
+import logging
+import pathlib
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from stage_cache import hash_file
+
+log = logging.getLogger(__name__)
+
+VALIDATION_CACHE_DIR = pathlib.Path(".cache") / "validation"
+
+
+class MessageLog:
+    # stands in for a logger in worker processes; the parent logs the messages
+    def __init__(self):
+        self.messages = []
+
+    def log(self, level, msg, *args):
+        self.messages.append((level, msg % args if args else str(msg)))
+
+    def debug(self, msg, *args):
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg, *args):
+        self.log(logging.INFO, msg, *args)
+
+    def warning(self, msg, *args):
+        self.log(logging.WARNING, msg, *args)
+
+    def error(self, msg, *args):
+        self.log(logging.ERROR, msg, *args)
+
+
+def table_path(table):
+    return pathlib.Path(table.url.resolve(table._parent.base))
+
+
+def table_exists(table):
+    # csvw also reads zipped tables
+    fname = table_path(table)
+    return fname.exists() or fname.parent.joinpath(f"{fname.name}.zip").exists()
+
+
+def table_hash(table):
+    h = hashlib.sha256()
+    h.update(json.dumps(table.asdict(), sort_keys=True, default=str).encode("utf-8"))
+    h.update(hash_file(table_path(table)).encode("utf-8"))
+    return h.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def load_dataset(metadata):
+    from pycldf import Dataset
+
+    return Dataset.from_metadata(metadata)
+
+
+def get_table(ds, url):
+    for table in ds.tables:
+        if table.url.string == url:
+            return table
+    raise KeyError(url)
+
+
+def check_schema(ds, log):
+    # the checks of Dataset.validate that do not read any data
+    from clldutils.misc import log_or_raise
+    from csvw.metadata import TableGroup
+    from pycldf.dataset import MD_SUFFIX
+    from pycldf.terms import TERMS
+    from pycldf.util import iter_uritemplates, pkg_path
+
+    success = True
+    default_tg = TableGroup.from_file(pkg_path("modules", f"{ds.module}{MD_SUFFIX}"))
+    for default_table in default_tg.tables:
+        dtable_uri = default_table.common_props["dc:conformsTo"]
+        try:
+            table = ds[dtable_uri]
+        except KeyError:
+            success = False
+            log_or_raise(f"{ds.module} requires {dtable_uri}", log=log)
+            continue
+        default_cols = {
+            c.propertyUrl.uri: c for c in default_table.tableSchema.columns
+        }
+        required_default_cols = {
+            c.propertyUrl.uri
+            for c in default_table.tableSchema.columns
+            if c.required or c.common_props.get("dc:isRequiredBy")
+        }
+        cols = {
+            c.propertyUrl.uri: c for c in table.tableSchema.columns if c.propertyUrl
+        }
+        table_uri = table.common_props["dc:conformsTo"]
+        for col in required_default_cols - set(cols.keys()):
+            success = False
+            log_or_raise(f"{table_uri} requires column {col}", log=log)
+        for uri, col in cols.items():
+            default = default_cols.get(uri)
+            if default:
+                cardinality = default.common_props.get("dc:extent")
+                if not cardinality:
+                    cardinality = TERMS.by_uri[uri].cardinality
+                if (cardinality == "multivalued" and not col.separator) or (
+                    cardinality == "singlevalued" and col.separator
+                ):
+                    success = False
+                    log_or_raise(f"{table_uri} {uri} must be {cardinality}", log=log)
+
+    for table in ds.tables:
+        names = set(col.name for col in table.tableSchema.columns)
+        for obj, prop, tmpl in iter_uritemplates(table):
+            if not {
+                n for n in tmpl.variable_names if not n.startswith("_")
+            }.issubset(names):
+                log.warning(f"Unknown variables in URI template: {obj}:{prop}:{tmpl}")
+        type_uri = table.common_props.get("dc:conformsTo")
+        if type_uri:
+            try:
+                TERMS.is_cldf_uri(type_uri)
+            except ValueError:
+                success = False
+                log_or_raise(f"invalid CLDF URI: {type_uri}", log=log)
+        if not table.tableSchema.primaryKey:
+            log.warning(
+                f'Table without primary key: {table.url} - This may cause problems with "cldf createdb"'
+            )
+        elif len(table.tableSchema.primaryKey) > 1:
+            log.warning(
+                f'Table with composite primary key: {table.url} - This may cause problems with "cldf createdb"'
+            )
+        property_urls, colnames = set(), set()
+        for col in table.tableSchema.columns:
+            if col.header in colnames:
+                success = False
+                log_or_raise(
+                    f"Duplicate column name in table schema: {table.url} {col.header}",
+                    log=log,
+                )
+            colnames.add(col.header)
+            if col.propertyUrl:
+                col_uri = col.propertyUrl.uri
+                try:
+                    TERMS.is_cldf_uri(col_uri)
+                    if col_uri in property_urls:
+                        success = False
+                        log_or_raise(
+                            f"Duplicate CLDF property in table schema: {table.url} {col_uri}",
+                            log=log,
+                        )
+                    property_urls.add(col_uri)
+                except ValueError:
+                    success = False
+                    log_or_raise(f"invalid CLDF URI: {col_uri}", log=log)
+        if not table_exists(table):
+            success = False
+            log_or_raise(f"{table_path(table)} does not exist", log=log)
+    try:
+        ds.tablegroup.validate_schema()
+    except ValueError as e:
+        success = False
+        log_or_raise(str(e), log=log, level="error")
+    return success
+
+
+def check_table(metadata, url):
+    # row validators and the primary key of a table
+    from clldutils.misc import log_or_raise
+    from pycldf.validators import VALIDATORS
+
+    start = time.perf_counter()
+    messages = MessageLog()
+    ds = load_dataset(metadata)
+    table = get_table(ds, url)
+    success = True
+    validators = []
+    for col in table.tableSchema.columns:
+        for table_, col_, validator in VALIDATORS:
+            if (not table_ or table is ds.get(table_)) and col is ds.get((table, col_)):
+                validators.append((col, validator))
+    if table_exists(table):  # a missing file is reported by check_schema
+        for fname, lineno, row in table.iterdicts(log=messages, with_metadata=True):
+            for col, validate in validators:
+                try:
+                    validate(ds, table, col, row)
+                except ValueError as e:
+                    success = False
+                    log_or_raise(f"{fname.name}:{lineno}:{col.name} {e}", log=messages)
+        if not table.check_primary_key(log=messages):
+            success = False
+    return success, messages.messages, time.perf_counter() - start
+
+
+def check_foreign_keys(metadata, parent):
+    # all foreign keys pointing to the table with the local name parent
+    # (what csvw's TableGroup.check_referential_integrity does for one table)
+    import operator
+    from itertools import groupby
+
+    from clldutils.misc import log_or_raise
+
+    start = time.perf_counter()
+    messages = MessageLog()
+    ds = load_dataset(metadata)
+    success = True
+    fkeys = sorted(
+        [x for x in ds.tablegroup.foreign_keys() if x[0].local_name == parent],
+        key=lambda x: (x[0].local_name, x[1], x[2].local_name),
+    )
+    table = fkeys[0][0]
+    t_fkeys = [
+        (key, [(child, ref) for _, _, child, ref in kgrp])
+        for key, kgrp in groupby(fkeys, lambda x: x[1])
+    ]
+    get_seen = [(operator.itemgetter(*key), set()) for key, _ in t_fkeys]
+    for row in table.iterdicts(log=messages):
+        for get, seen in get_seen:
+            seen.add(get(row))
+    for (key, children), (_, seen) in zip(t_fkeys, get_seen):
+        single_column = len(key) == 1
+        for child, ref in children:
+            get_ref = operator.itemgetter(*ref)
+            for fname, lineno, item in child.iterdicts(log=messages, with_metadata=True):
+                colref = get_ref(item)
+                if colref is None:
+                    continue
+                elif single_column and isinstance(colref, list):
+                    colrefs = colref
+                else:
+                    colrefs = [colref]
+                for colref in colrefs:
+                    if not single_column and None in colref:
+                        continue
+                    elif colref not in seen:
+                        log_or_raise(
+                            f"{fname}:{lineno} Key `{colref}` not found in table {table.url.string}",
+                            log=messages,
+                        )
+                        success = False
+    return success, messages.messages, time.perf_counter() - start
+
+
+def validate(ds, log=log, processes=1, cache=True):
+    # validate ds (a pycldf Dataset), checking the data of changed tables in processes
+    from pycldf.dataset import ComponentWithValidation
+    from pycldf.media import MediaTable
+    from pycldf.trees import TreeTable
+
+    assert MediaTable and TreeTable  # imported to be found as ComponentWithValidation
+    load_dataset.cache_clear()
+    metadata = str(ds.tablegroup._fname)
+    key = str(pathlib.Path(metadata).resolve())
+    state_file = (
+        VALIDATION_CACHE_DIR / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.json"
+    )
+    state = {"tables": {}, "foreign_keys": {}}
+    if cache and state_file.is_file():
+        with open(state_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+
+    success = check_schema(ds, log)
+    hashes = {table.url.string: table_hash(table) for table in ds.tables}
+    changed = [url for url, h in hashes.items() if state["tables"].get(url) != h]
+    for url in hashes:
+        if url not in changed:
+            log.info(f"Skipping unchanged table {url}")
+    # foreign keys are checked per referenced table, with all tables referencing it
+    fk_hashes = {}
+    for parent, _, child, _ in ds.tablegroup.foreign_keys():
+        fk_hashes.setdefault(parent.local_name, set()).update(
+            [hashes[parent.url.string], hashes[child.url.string]]
+        )
+    fk_hashes = {k: "-".join(sorted(v)) for k, v in fk_hashes.items()}
+    changed_fks = [
+        k for k, h in fk_hashes.items() if state["foreign_keys"].get(k) != h
+    ]
+
+    jobs = [(check_table, url) for url in changed] + [
+        (check_foreign_keys, parent) for parent in changed_fks
+    ]
+    if processes > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [executor.submit(func, metadata, arg) for func, arg in jobs]
+            results = [future.result() for future in futures]
+    else:
+        results = [func(metadata, arg) for func, arg in jobs]
+    for (func, arg), (ok, messages, seconds) in zip(jobs, results):
+        for level, msg in messages:
+            log.log(level, msg)
+        what = "foreign keys to" if func is check_foreign_keys else "table"
+        log.info(f"Validated {what} {arg} in {seconds:0.2f}s")
+        success = success and ok
+
+    # components with their own checks, e.g. media files
+    changed_components = [
+        get_table(ds, url).common_props.get("dc:conformsTo") or "" for url in changed
+    ]
+    for cls in ComponentWithValidation.__subclasses__():
+        if cls.__name__ in ds and any(
+            x.endswith(cls.__name__) for x in changed_components
+        ):
+            success = cls(ds).validate(success, log=log)
+
+    if success and cache:
+        VALIDATION_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(state_file, "w", encoding="utf-8") as f:
+            json.dump({"tables": hashes, "foreign_keys": fk_hashes}, f, indent=2)
+    return success
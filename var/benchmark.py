@@ -0,0 +1,373 @@
+# Benchmark of the CLDF build on synthetic corpora of different sizes
+# the corpora are made from the wordforms in the real lexicon inputs, and the inputs
+# from other repositories are replaced by fixtures made from the files in raw/.
+# Every size is built in a fresh process, recording wall time and peak memory
+# per stage, so super-linear stages and regressions show up. Memory is sampled while
+# each stage runs (see profiling.MemorySampler): the peak of the build process, and
+# separately that of its child processes (the analysis and validation pools).
+#   python var/benchmark.py run --sizes 1000,10000 [--baseline results.json]
+#   python var/benchmark.py generate --size 1000 --workdir .cache/benchmark/1000
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+REPO = Path(__file__).resolve().parents[1]
+BENCH_DIR = REPO / ".cache" / "benchmark"
+SIZES = [1000, 10000, 100000, 1000000]
+# stages slowing down by more than this factor (or scaling worse than with this
+# exponent) are reported
+REGRESSION = 1.2
+SUPERLINEAR = 1.2
+EXAMPLE_COLUMNS = [
+    "Primary_Text",
+    "Original_Translation",
+    "Text_ID",
+    "Record_Number",
+    "Speaker_ID",
+    "Comments",
+    "ID",
+    "Translated_Text",
+    "Comment",
+    "Tokenized",
+    "Analyzed_Word",
+    "Gloss",
+    "Lexeme_IDs",
+    "Gramm",
+    "Morpheme_IDs",
+    "Part_Of_Speech",
+    "Wordform_ID",
+]
+SENTENCES_PER_TEXT = 200
+DERIVATION_FILES = ["kavbz", "tavbz", "detrz", "macaus", "misc_derivations"]
+
+
+def read(path):
+    return pd.read_csv(REPO / path, keep_default_na=False, dtype=str)
+
+
+## Synthetic corpus
+def vocabulary():
+    # (form, analysis, gloss, lexeme IDs, gramm, morpheme IDs) of known wordforms
+    words = []
+    for rec in read("raw/parsed_forms.csv").to_dict("records"):
+        if "=" not in rec["Gloss"]:
+            words.append(
+                (
+                    rec["Form"],
+                    rec["Segmented"],
+                    rec["Gloss"],
+                    rec["Lexeme_ID"],
+                    rec["Gramm"],
+                    rec["Morpheme_IDs"],
+                )
+            )
+    for rec in read("raw/derivations.csv").to_dict("records"):
+        form = rec["Form"].split("; ")[0]  # the main variant
+        words.append((form, form, rec["Gloss"], rec["ID"], rec["POS"], rec["ID"]))
+    # the words of the real examples
+    for rec in read("raw/examples.csv").to_dict("records"):
+        cols = [
+            rec[x].split("\t")
+            for x in [
+                "Tokenized",
+                "Analyzed_Word",
+                "Gloss",
+                "Lexeme_IDs",
+                "Gramm",
+                "Morpheme_IDs",
+            ]
+        ]
+        if len(set(len(x) for x in cols)) == 1:
+            words.extend(zip(*cols))
+    return [x for x in dict.fromkeys(words) if x[0] and x[2]]
+
+
+def generate(size, workdir, seed=0):
+    # writes raw/examples.csv with size sentences; returns the text IDs
+    rng = random.Random(seed)
+    words = vocabulary()
+    rng.shuffle(words)
+    # Zipf-distributed word frequencies, as in real text
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    speakers = list(read("etc/speakers.csv")["Name"])
+    text_ids = []
+    path = Path(workdir) / "raw" / "examples.csv"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(EXAMPLE_COLUMNS)
+        for i in range(size):
+            text_id = f"synth{i // SENTENCES_PER_TEXT}"
+            if i % SENTENCES_PER_TEXT == 0:
+                text_ids.append(text_id)
+            number = i % SENTENCES_PER_TEXT + 1
+            sentence = rng.choices(words, weights=weights, k=rng.randint(2, 10))
+            forms, analyses, glosses, lexemes, gramms, morphemes = zip(*sentence)
+            writer.writerow(
+                [
+                    " ".join(forms),
+                    "",
+                    text_id,
+                    number,
+                    rng.choice(speakers),
+                    "",
+                    f"{text_id}-{number}",
+                    " ".join(glosses),
+                    "",
+                    "\t".join(forms),
+                    "\t".join(analyses),
+                    "\t".join(glosses),
+                    "\t".join(lexemes),
+                    "\t".join(gramms),
+                    "\t".join(morphemes),
+                    "",
+                    "",
+                ]
+            )
+    return text_ids
+
+
+## Fixtures for the inputs from other repositories
+def fixture_env(workdir):
+    fixtures = Path(workdir).resolve() / "fixtures"
+    return {
+        "YAWARANA_UP_DIR": str(fixtures / "uniparser" / "data"),
+        "YAWARANA_AUDIO_PATH": str(fixtures / "audio"),
+        "YAWARANA_DICTIONARY_DIR": str(fixtures / "dictionary"),
+        "YAWARANA_CORPUS_DIR": str(fixtures / "corpus"),
+    }
+
+
+def write_fixtures(workdir, text_ids):
+    env = fixture_env(workdir)
+    up_dir = Path(env["YAWARANA_UP_DIR"])
+    (up_dir / "derivations").mkdir(parents=True, exist_ok=True)
+    (up_dir.parent / "annotation").mkdir(parents=True, exist_ok=True)
+    (Path(env["YAWARANA_AUDIO_PATH"]) / "wordforms").mkdir(parents=True, exist_ok=True)
+    Path(env["YAWARANA_DICTIONARY_DIR"]).mkdir(parents=True, exist_ok=True)
+    Path(env["YAWARANA_CORPUS_DIR"]).mkdir(parents=True, exist_ok=True)
+
+    # the derivations, split by the derivational process
+    derivations = read("raw/derivations.csv")
+    kinds = {
+        "kavbz": derivations["Affix_ID"] == "kavbz",
+        "tavbz": derivations["Affix_ID"] == "tavbz",
+        "detrz": derivations["Affix_ID"].str.startswith("dt"),
+        "macaus": derivations["Affix_ID"] == "macaus",
+    }
+    kinds["misc_derivations"] = ~pd.concat(kinds.values(), axis=1).any(axis=1)
+    for name in DERIVATION_FILES:
+        derivations[kinds[name]].to_csv(up_dir / "derivations" / f"{name}.csv", index=False)
+
+    # roots, as in the annotated dictionary
+    roots = read("raw/dictionary_roots.csv")
+    roots["Translation_Root"] = roots["Translation"]
+    roots["Variants"] = ""
+    roots["Tags"] = ""
+    roots.to_csv(
+        Path(env["YAWARANA_DICTIONARY_DIR"]) / "annotated_dictionary.csv", index=False
+    )
+    bound_roots = roots[["ID", "Form", "Translation"]].head(5).copy()
+    bound_roots["Name"] = bound_roots["Form"].str.split("; ").str[0]
+    bound_roots["ID"] = ""
+    bound_roots.to_csv(up_dir / "bound_roots.csv", index=False)
+
+    wordforms = read("raw/parsed_forms.csv")
+    wordforms["Analysis"] = wordforms["Segmented"]
+    wordforms.to_csv(
+        up_dir.parent / "annotation" / "parsed_dictionary_wordforms.csv", index=False
+    )
+
+    pd.DataFrame(
+        [
+            {
+                "id": x,
+                "title_es": x,
+                "summary": "",
+                "genre": "narrative",
+                "tags": "",
+            }
+            for x in text_ids
+        ]
+    ).to_csv(Path(env["YAWARANA_CORPUS_DIR"]) / "texts.csv", index=False)
+
+
+def prepare(size, workdir, seed=0):
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    etc = workdir / "etc"
+    if not etc.exists():
+        etc.symlink_to(REPO / "etc", target_is_directory=True)
+    text_ids = generate(size, workdir, seed=seed)
+    write_fixtures(workdir, text_ids)
+
+
+## Running the build
+def run_one(workdir, processes=1):
+    # build the dataset in workdir, in this process; returns the measurements
+    os.chdir(workdir)
+    os.environ.update(fixture_env(workdir))
+    sys.path.insert(0, str(REPO))
+    from cldf_creator import create
+    from profiling import MemorySampler
+
+    stages = {}
+    sampler = MemorySampler()
+
+    @contextmanager
+    def observer(name):
+        start = time.perf_counter()
+        sampler.begin(name)
+        try:
+            yield
+        finally:
+            own, children = sampler.end(name)
+            stages[name] = {
+                "seconds": time.perf_counter() - start,
+                "peak_memory_mb": own,
+                "children_peak_memory_mb": children,
+            }
+
+    start = time.perf_counter()
+    sampler.begin("total")
+    # stages run one after the other, so the memory peaks are theirs
+    create(use_cache=False, workers=1, processes=processes, observer=observer)
+    own, children = sampler.end("total")
+    sampler.stop()
+    return {
+        "seconds": time.perf_counter() - start,
+        "peak_memory_mb": own,
+        "children_peak_memory_mb": children,
+        "stages": stages,
+    }
+
+
+def scaling(results):
+    # the exponent of the growth of the stage times between consecutive sizes
+    res = {}
+    sizes = sorted(results, key=int)
+    for small, big in zip(sizes, sizes[1:]):
+        factor = math.log(int(big) / int(small))
+        for stage, stats in results[big]["stages"].items():
+            before = results[small]["stages"].get(stage)
+            if before and before["seconds"] > 0 and stats["seconds"] > 0:
+                res.setdefault(stage, {})[f"{small}-{big}"] = (
+                    math.log(stats["seconds"] / before["seconds"]) / factor
+                )
+    return res
+
+
+def report(results, baseline=None):
+    sizes = sorted(results, key=int)
+    stages = list(dict.fromkeys(x for size in sizes for x in results[size]["stages"]))
+    # seconds, peak memory of the build process and of its child processes
+    print("stage".ljust(24) + "".join(f"{size:>28}" for size in sizes))
+    for stage in stages + ["total"]:
+        cells = []
+        for size in sizes:
+            stats = results[size] if stage == "total" else results[size]["stages"].get(stage)
+            cells.append(
+                f"{stats['seconds']:8.2f}s {stats['peak_memory_mb']:6.0f}MB "
+                f"{stats.get('children_peak_memory_mb', 0):6.0f}MB"
+                if stats
+                else ""
+            )
+        print(stage.ljust(24) + "".join(f"{x:>28}" for x in cells))
+    for stage, exponents in scaling(results).items():
+        for sizes_, exponent in exponents.items():
+            if exponent > SUPERLINEAR:
+                print(f"Super-linear: {stage} grows with n^{exponent:.2f} ({sizes_})")
+    if baseline:
+        for size in sizes:
+            if size not in baseline:
+                continue
+            for stage, stats in results[size]["stages"].items():
+                before = baseline[size]["stages"].get(stage)
+                if before and stats["seconds"] > before["seconds"] * REGRESSION:
+                    print(
+                        f"Regression: {stage} at {size} took {stats['seconds']:.2f}s (was {before['seconds']:.2f}s)"
+                    )
+
+
+def run(sizes, processes=1, seed=0, baseline=None, out=None):
+    results = {}
+    for size in sizes:
+        workdir = BENCH_DIR / str(size)
+        if workdir.exists():
+            shutil.rmtree(workdir)
+        print(f"Generating {size} sentences")
+        prepare(size, workdir, seed=seed)
+        print(f"Building {size} sentences")
+        subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                "run-one",
+                "--workdir",
+                str(workdir),
+                "--processes",
+                str(processes),
+                "--out",
+                str(workdir / "result.json"),
+            ],
+            check=True,
+        )
+        with open(workdir / "result.json", "r", encoding="utf-8") as f:
+            results[str(size)] = json.load(f)
+    out = Path(out or BENCH_DIR / f"results-{datetime.now():%Y%m%d-%H%M%S}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    if baseline:
+        with open(baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    print(f"Results written to {out}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the CLDF build")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="generate, build and report")
+    run_parser.add_argument("--sizes", default=",".join(str(x) for x in SIZES))
+    run_parser.add_argument("--processes", type=int, default=1)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--baseline", help="earlier results to compare to")
+    run_parser.add_argument("--out", help="where to write the results")
+    gen_parser = subparsers.add_parser("generate", help="only generate a corpus")
+    gen_parser.add_argument("--size", type=int, required=True)
+    gen_parser.add_argument("--workdir", required=True)
+    gen_parser.add_argument("--seed", type=int, default=0)
+    one_parser = subparsers.add_parser("run-one", help="build in a prepared workdir")
+    one_parser.add_argument("--workdir", required=True)
+    one_parser.add_argument("--processes", type=int, default=1)
+    one_parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+    if args.command == "run":
+        run(
+            [int(x) for x in args.sizes.split(",")],
+            processes=args.processes,
+            seed=args.seed,
+            baseline=args.baseline,
+            out=args.out,
+        )
+    elif args.command == "generate":
+        prepare(args.size, args.workdir, seed=args.seed)
+    else:
+        out = Path(args.out).resolve()
+        result = run_one(args.workdir, processes=args.processes)
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
@@ -0,0 +1,323 @@
+# Finding likely unmerged variants by weighted edit distance
+# forms are compared as segment lists (the Segments columns of morphs and stems), with
+# the costs in etc/variant_costs.csv: substituting, inserting or deleting (empty
+# Segment_B) the listed segments is cheaper than the default of 1, e.g. for vowel
+# alternations, ch ~ s or j-insertion. The distinct forms are kept in a BK-tree, so a
+# query only computes the distances to forms that the triangle inequality does not
+# rule out, instead of comparing every pair of forms.
+# Variants are searched within the morphs (reported by morpheme), within the stems (by
+# lexeme), and between stems and morphs: every stem form is queried against the tree of
+# the morph forms, and the lexeme-morpheme pairs not already linked by stemparts are
+# reported.
+import csv
+from collections import defaultdict
+from pathlib import Path
+
+import pandas as pd
+
+from consistency_check import flatten
+
+COST_FILE = Path("etc") / "variant_costs.csv"
+DEFAULT_COST = 1
+THRESHOLD = 1
+# tables with segmented forms, and the column with the morpheme or lexeme they belong to
+GROUPS = {"morphs": "Morpheme_ID", "stems": "Lexeme_ID"}
+# stems and morphs of the same meaning in different lexemes and morphemes
+CROSS = ("stems", "morphs")
+
+
+def load_costs(path=COST_FILE):
+    costs = {}
+    with open(path, encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            costs[(row["Segment_A"], row["Segment_B"])] = float(row["Cost"])
+    return costs
+
+
+class CostMatrix:
+    # symmetric costs between segments, "" being insertion or deletion; pairs that are
+    # not listed cost the default. The costs are closed under composition (replacing a
+    # by b can not cost more than replacing a by c and c by b), which makes the edit
+    # distance a metric, as the BK-tree needs.
+    def __init__(self, costs=None, default=DEFAULT_COST):
+        if costs is None:
+            costs = load_costs()
+        self.default = default
+        symbols = sorted({""} | {x for pair in costs for x in pair})
+        cost = {(a, b): 0 if a == b else default for a in symbols for b in symbols}
+        for (a, b), value in costs.items():
+            if a == b or value <= 0:
+                raise ValueError(f"Invalid cost for {a!r} ~ {b!r}: {value}")
+            cost[(a, b)] = cost[(b, a)] = min(value, cost[(a, b)])
+        for via in symbols:
+            for a in symbols:
+                for b in symbols:
+                    cost[(a, b)] = min(cost[(a, b)], cost[(a, via)] + cost[(via, b)])
+        self.costs = {pair: value for pair, value in cost.items() if value != default}
+
+    def __call__(self, a, b):
+        if a == b:
+            return 0
+        return self.costs.get((a, b), self.default)
+
+
+def distance(a, b, cost):
+    # weighted Levenshtein distance between two segment sequences
+    inserts = [cost("", y) for y in b]
+    prev = [0]
+    for insert in inserts:
+        prev.append(prev[-1] + insert)
+    for x in a:
+        delete = cost(x, "")
+        row = [prev[0] + delete]
+        for j, y in enumerate(b):
+            row.append(min(prev[j + 1] + delete, row[j] + inserts[j], prev[j] + cost(x, y)))
+        prev = row
+    # costs are fractions, rounding keeps equal distances equal
+    return round(prev[-1], 6)
+
+
+class BKTree:
+    # nodes are (item, {distance: child node})
+    def __init__(self, distance):
+        self.distance = distance
+        self.root = None
+
+    def add(self, item):
+        if self.root is None:
+            self.root = (item, {})
+            return
+        node = self.root
+        while True:
+            dist = self.distance(item, node[0])
+            if dist == 0:
+                return
+            if dist not in node[1]:
+                node[1][dist] = (item, {})
+                return
+            node = node[1][dist]
+
+    def query(self, item, threshold):
+        # (item, distance) for all items within the threshold
+        res = []
+        stack = [self.root] if self.root else []
+        while stack:
+            value, children = stack.pop()
+            dist = self.distance(item, value)
+            if dist <= threshold:
+                res.append((value, dist))
+            for key, child in children.items():
+                if dist - threshold <= key <= dist + threshold:
+                    stack.append(child)
+        return res
+
+
+def segments(value):
+    # lists in memory, space-separated in the written tables
+    if isinstance(value, str):
+        return tuple(value.split())
+    return tuple(value)
+
+
+class VariantIndex:
+    # an index of IDs by their segmented forms
+    def __init__(self, cost=None):
+        self.cost = cost if isinstance(cost, CostMatrix) else CostMatrix(cost)
+        self.tree = BKTree(self.distance)
+        self.ids = defaultdict(list)  # form -> IDs, in order of addition
+
+    def distance(self, a, b):
+        return distance(a, b, self.cost)
+
+    def add(self, id, form):
+        form = segments(form)
+        if not form:
+            return
+        if form not in self.ids:
+            self.tree.add(form)
+        self.ids[form].append(id)
+
+    def __len__(self):
+        return sum(len(ids) for ids in self.ids.values())
+
+    def query(self, form, threshold=THRESHOLD):
+        # (ID, form, distance) of the indexed forms within the threshold, closest first
+        res = []
+        for found, dist in self.tree.query(segments(form), threshold):
+            res.extend((id, " ".join(found), dist) for id in self.ids[found])
+        return sorted(res, key=lambda x: (x[2], x[1], x[0]))
+
+    def pairs(self, threshold=THRESHOLD):
+        # (ID, ID, distance) for all pairs of indexed IDs within the threshold;
+        # every distinct form is queried against the ones before it
+        tree = BKTree(self.distance)
+        res = []
+        for form, ids in self.ids.items():
+            for i, id in enumerate(ids):
+                res.extend((other, id, 0) for other in ids[:i])
+            for found, dist in tree.query(form, threshold):
+                res.extend((other, id, dist) for other in self.ids[found] for id in ids)
+            tree.add(form)
+        return res
+
+
+def find_variants(df, group, threshold=THRESHOLD, same_meaning=True, cost=None):
+    # forms of different morphemes or lexemes (group) within the threshold, by default
+    # only those with the same meaning; one row per pair of groups, closest first
+    index = VariantIndex(cost)
+    for id, form in zip(df["ID"], df["Segments"]):
+        index.add(id, form)
+    rows = df.set_index("ID")
+    found = {}
+    for a, b, dist in index.pairs(threshold):
+        group_a, group_b = rows.at[a, group], rows.at[b, group]
+        if group_a == group_b:
+            continue
+        meaning_a = flatten(rows.at[a, "Parameter_ID"])
+        meaning_b = flatten(rows.at[b, "Parameter_ID"])
+        if same_meaning and meaning_a != meaning_b:
+            continue
+        if group_a > group_b:
+            a, b = b, a
+            group_a, group_b = group_b, group_a
+            meaning_a, meaning_b = meaning_b, meaning_a
+        key = (group_a, group_b)
+        if key in found and found[key]["Distance"] <= dist:
+            continue
+        found[key] = {
+            f"{group}_A": group_a,
+            f"{group}_B": group_b,
+            "Name_A": flatten(rows.at[a, "Name"]),
+            "Name_B": flatten(rows.at[b, "Name"]),
+            "Parameter_ID_A": meaning_a,
+            "Parameter_ID_B": meaning_b,
+            "Distance": dist,
+        }
+    res = pd.DataFrame(found.values())
+    if len(res) > 0:
+        res = res.sort_values(["Distance", f"{group}_A", f"{group}_B"], ignore_index=True)
+    return res
+
+
+def index_forms(df, cost):
+    index = VariantIndex(cost)
+    for id, form in zip(df["ID"], df["Segments"]):
+        index.add(id, form)
+    return index
+
+
+def linked_groups(stemparts, stems, morphs):
+    # (Lexeme_ID, Morpheme_ID) of the lexemes and the morphemes of their stems' parts
+    lexemes = dict(zip(stems["ID"], stems["Lexeme_ID"]))
+    morphemes = dict(zip(morphs["ID"], morphs["Morpheme_ID"]))
+    return {
+        (lexemes.get(stem), morphemes.get(morph))
+        for stem, morph in zip(stemparts["Stem_ID"], stemparts["Morph_ID"])
+    }
+
+
+def find_cross_variants(
+    df_a,
+    group_a,
+    df_b,
+    group_b,
+    threshold=THRESHOLD,
+    same_meaning=True,
+    cost=None,
+    linked=(),
+):
+    # forms of df_a within the threshold of forms of df_b, e.g. stems and morphs; every
+    # distinct form of df_a is queried against the tree of df_b. One row per pair of
+    # groups (e.g. lexeme and morpheme), closest first; linked: pairs of groups that
+    # are not variants, e.g. a lexeme and the morphemes its stems consist of
+    cost = cost if isinstance(cost, CostMatrix) else CostMatrix(cost)
+    index_a, index_b = index_forms(df_a, cost), index_forms(df_b, cost)
+    rows_a, rows_b = df_a.set_index("ID"), df_b.set_index("ID")
+    linked = set(linked)
+    found = {}
+    for form, ids in index_a.ids.items():
+        for other, dist in index_b.tree.query(form, threshold):
+            for a in ids:
+                for b in index_b.ids[other]:
+                    key = (rows_a.at[a, group_a], rows_b.at[b, group_b])
+                    if key in linked or (key in found and found[key]["Distance"] <= dist):
+                        continue
+                    meaning_a = flatten(rows_a.at[a, "Parameter_ID"])
+                    meaning_b = flatten(rows_b.at[b, "Parameter_ID"])
+                    if same_meaning and meaning_a != meaning_b:
+                        continue
+                    found[key] = {
+                        group_a: key[0],
+                        group_b: key[1],
+                        "Name_A": flatten(rows_a.at[a, "Name"]),
+                        "Name_B": flatten(rows_b.at[b, "Name"]),
+                        "Parameter_ID_A": meaning_a,
+                        "Parameter_ID_B": meaning_b,
+                        "Distance": dist,
+                    }
+    res = pd.DataFrame(found.values())
+    if len(res) > 0:
+        res = res.sort_values(["Distance", group_a, group_b], ignore_index=True)
+    return res
+
+
+# tables: table name -> DataFrame (in memory or written); returns table name (or
+# "stems-morphs") -> variants
+def check(tables, threshold=THRESHOLD, same_meaning=True, cost=None):
+    cost = cost if isinstance(cost, CostMatrix) else CostMatrix(cost)
+    res = {
+        name: find_variants(tables[name], group, threshold, same_meaning, cost)
+        for name, group in GROUPS.items()
+        if name in tables
+    }
+    if all(name in tables for name in CROSS):
+        a, b = CROSS
+        linked = ()
+        if "stemparts" in tables:
+            linked = linked_groups(tables["stemparts"], tables[a], tables[b])
+        res["-".join(CROSS)] = find_cross_variants(
+            tables[a],
+            GROUPS[a],
+            tables[b],
+            GROUPS[b],
+            threshold,
+            same_meaning,
+            cost,
+            linked,
+        )
+    return res
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from orthography import CompiledTokenizer
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--all-meanings", action="store_true")
+    parser.add_argument("--query", nargs="*", help="forms to look up instead")
+    args = parser.parse_args()
+    tables = {
+        name: pd.read_csv(f"cldf/{name}.csv", keep_default_na=False, dtype=str)
+        for name in [*GROUPS, "stemparts"]
+    }
+    if args.query:
+        with open("etc/phonemes.csv", encoding="utf-8") as f:
+            tokenizer = CompiledTokenizer(list(csv.DictReader(f)))
+        cost = CostMatrix()
+        indices = {}
+        for name in GROUPS:
+            indices[name] = index_forms(tables[name], cost)
+        for form in args.query:
+            for name, index in indices.items():
+                for id, found, dist in index.query(tokenizer.tokenize(form), args.threshold):
+                    print(f"{form}\t{name}\t{id}\t{found}\t{dist}")
+    else:
+        for name, variants in check(
+            tables, args.threshold, same_meaning=not args.all_meanings
+        ).items():
+            print(f"Potential variants in {name} ({len(variants)}):")
+            if len(variants) > 0:
+                print(variants.to_string())
+            print("")